@@ -1,16 +1,19 @@
 """Админ-панель для управления товарами и акциями."""
 
 import json
+import logging
 import os
 import re
-import shutil
-from datetime import date
+import tempfile
+from dataclasses import dataclass
+from datetime import date, datetime
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
+from urllib.parse import urlencode, urlsplit
 
-from fastapi import APIRouter, Depends, Form, HTTPException, Request, UploadFile, File
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter, BackgroundTasks, Depends, Form, HTTPException, Query, Request, UploadFile, File
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, StreamingResponse
+from sqlalchemy import bindparam, func, insert, select, update
 from sqlalchemy.orm import Session, joinedload
 
 from .auth import (
@@ -20,28 +23,41 @@ from .auth import (
     set_session_cookie,
     verify_password,
 )
-from .database import get_db
-from .models import Category, Product, Promotion, Subcategory
+from .cache import bump_generation
+from .catalog_io import (
+    COLUMNS,
+    FORMATS,
+    ImportJob,
+    create_job,
+    csv_stream,
+    file_chunks,
+    file_format,
+    load_job,
+    read_rows,
+    write_xlsx,
+)
+from .database import IS_SQLITE, async_engine, db_session, engine, get_db
+from .fragments import fragments
+from .image_store import normalize_extension, release_image, store_stream
+from .models import (
+    AuditEntry,
+    Category,
+    Product,
+    ProductSize,
+    Promotion,
+    Subcategory,
+    compute_discount,
+    discount_expression,
+)
+from .search import build_match_query, index_product, index_rows, matching_ids, remove_product
+from .sqlite_profile import metrics as lock_metrics
+from .stats import load_catalog_stats
+from .templating import templates
 
 router = APIRouter(prefix="/admin", tags=["admin"])
+logger = logging.getLogger("uvicorn.error")
 
 BASE_DIR = Path(__file__).resolve().parent
-templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
-
-# Добавляем фильтр from_json для шаблонов
-def _from_json(value: str | None) -> list | dict:
-    """Парсинг JSON."""
-    if not value:
-        return []
-    try:
-        return json.loads(value)
-    except (json.JSONDecodeError, TypeError):
-        return []
-
-templates.env.filters["from_json"] = _from_json
-
-# Путь для загрузки фото товаров
-UPLOAD_DIR = BASE_DIR.parent / "static" / "images" / "products"
 
 
 def slugify(text: str) -> str:
@@ -69,35 +85,47 @@ def slugify(text: str) -> str:
     return slug
 
 
-def save_uploaded_image(
-    file: UploadFile,
-    category_slug: str,
-    subcategory_slug: str,
-    product_slug: str,
-) -> str:
+def save_uploaded_image(file: UploadFile) -> str:
     """
-    Сохранить загруженное изображение.
+    Сохранить загруженное изображение в хранилище (app/image_store.py).
     
     Returns:
         URL изображения относительно static
     """
-    # Создаём директорию если не существует
-    upload_path = UPLOAD_DIR / category_slug / subcategory_slug
-    upload_path.mkdir(parents=True, exist_ok=True)
-    
-    # Генерируем имя файла
-    ext = Path(file.filename).suffix.lower() if file.filename else ".jpg"
-    if ext not in (".jpg", ".jpeg", ".png", ".webp"):
-        ext = ".jpg"
-    filename = f"{product_slug}{ext}"
-    
-    # Сохраняем файл
-    file_path = upload_path / filename
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Возвращаем URL
-    return f"/static/images/products/{category_slug}/{subcategory_slug}/{filename}"
+    return store_stream(file.file, normalize_extension(file.filename))
+
+
+def parse_form_sizes(sizes: list[str]) -> list[int]:
+    """Размеры из чекбоксов формы: только числа, без повторов, по возрастанию."""
+    return sorted({int(s) for s in sizes if s.isdigit()})
+
+
+def apply_product_sizes(product: Product, sizes: list[int]) -> None:
+    """Синхронизировать product_sizes и sizes_json с выбранными размерами.
+
+    Существующие строки сохраняют свой остаток, снятые размеры удаляются,
+    новые добавляются с quantity=1.
+    """
+    wanted = set(sizes)
+    for row in list(product.sizes):
+        if row.size not in wanted:
+            product.sizes.remove(row)
+    present = {row.size for row in product.sizes}
+    for size in sorted(wanted - present):
+        product.sizes.append(ProductSize(size=size, quantity=1))
+    product.sizes_json = json.dumps(sorted(wanted)) if wanted else None
+
+
+def _catalog_changed(product_id: Optional[int] = None) -> None:
+    """Вызывается после каждой записи в каталог или акции.
+
+    Увеличивает поколение каталога: во всех воркерах устаревают снимок
+    навигации и кэш страниц. product_id — изменённый товар, его карточки
+    убираются из кэша фрагментов.
+    """
+    bump_generation()
+    if product_id is not None:
+        fragments.invalidate(product_id)
 
 
 def image_exists(image_url: str | None) -> bool:
@@ -163,20 +191,21 @@ def dashboard(
     db: Session = Depends(get_db),
 ) -> HTMLResponse:
     """Главная страница админки."""
-    # Статистика
+    # Счётчики товаров ведут триггеры (app/stats.py) — без COUNT(*) по каталогу
+    catalog_stats = load_catalog_stats(db)
     stats = {
-        "products_count": db.query(Product).filter(Product.is_active.is_(True)).count(),
-        "new_count": db.query(Product).filter(
-            Product.is_active.is_(True), Product.is_new.is_(True)
-        ).count(),
-        "sale_count": db.query(Product).filter(
-            Product.is_active.is_(True),
-            Product.old_price.isnot(None),
-            Product.old_price > Product.price,
-        ).count(),
+        "products_count": catalog_stats.active,
+        "new_count": catalog_stats.new,
+        "sale_count": catalog_stats.sale,
+        "featured_count": catalog_stats.featured,
         "promotions_count": db.query(Promotion).filter(Promotion.is_active.is_(True)).count(),
-        "categories_count": db.query(Category).count(),
     }
+    categories = (
+        db.query(Category)
+        .options(joinedload(Category.subcategories))
+        .order_by(Category.sort_order, Category.id)
+        .all()
+    )
     
     # Последние товары
     recent_products = (
@@ -193,6 +222,8 @@ def dashboard(
             "request": request,
             "admin": admin,
             "stats": stats,
+            "catalog_stats": catalog_stats,
+            "categories": categories,
             "recent_products": recent_products,
         },
     )
@@ -203,32 +234,181 @@ def dashboard(
 # =============================================================================
 
 
-def get_products_with_filters(
-    db: Session,
+def _optional_id(value: Optional[str]) -> Optional[int]:
+    """id из фильтра GET-формы: пустой выбор («Все категории») приходит как ''."""
+    return int(value) if value and value.isdigit() else None
+
+
+def product_filters(
     category_id: Optional[int] = None,
     subcategory_id: Optional[int] = None,
     search: Optional[str] = None,
     show_deleted: Optional[str] = None,
-) -> tuple[list[Product], list[Category]]:
-    """Возвращает отфильтрованные товары и список категорий для фильтров."""
-    query = db.query(Product).options(
-        joinedload(Product.subcategory).joinedload(Subcategory.category)
-    )
-    
+) -> list:
+    """Условия фильтров списка товаров — общие для таблицы и массовых операций."""
+    conditions = []
     # По умолчанию показываем только активные товары
     if not show_deleted:
-        query = query.filter(Product.is_active.is_(True))
-    
+        conditions.append(Product.is_active.is_(True))
     if category_id:
-        query = query.join(Subcategory).filter(Subcategory.category_id == category_id)
+        # EXISTS, а не JOIN: то же условие годится для UPDATE, а список
+        # по-прежнему читается по индексу в порядке created_at
+        conditions.append(Product.subcategory.has(Subcategory.category_id == category_id))
     if subcategory_id:
-        query = query.filter(Product.subcategory_id == subcategory_id)
+        conditions.append(Product.subcategory_id == subcategory_id)
     if search:
-        query = query.filter(Product.name.ilike(f"%{search}%"))
-    
-    products = query.order_by(Product.created_at.desc()).all()
-    categories = db.query(Category).options(joinedload(Category.subcategories)).all()
-    return products, categories
+        # Тот же полнотекстовый индекс, что и публичный /search
+        match = build_match_query(search)
+        if match:
+            conditions.append(Product.id.in_(matching_ids(match)))
+    return conditions
+
+
+ADMIN_PAGE_SIZE = 50
+# Сортировки таблицы: колонка и направление по умолчанию. Вторым ключом
+# идёт id в том же направлении — порядок однозначен, OFFSET не теряет строки.
+# Под каждую колонку есть индекс (колонка, id), см. app/models.py.
+ADMIN_SORTS = {
+    "created": (Product.created_at, "desc"),
+    "name": (Product.name, "asc"),
+    "price": (Product.price, "asc"),
+}
+DEFAULT_SORT = "created"
+LIST_URL = "/admin/products"
+
+
+@dataclass
+class ProductTable:
+    """Одна страница таблицы товаров и параметры, с которыми она построена."""
+
+    items: list[Product]
+    total: int
+    page: int
+    pages: int
+    sort: str
+    direction: str
+    filters: dict
+
+    @property
+    def first(self) -> int:
+        return (self.page - 1) * ADMIN_PAGE_SIZE + 1 if self.total else 0
+
+    @property
+    def last(self) -> int:
+        return self.first + len(self.items) - 1 if self.items else 0
+
+    def query(self, **overrides) -> str:
+        """Строка запроса с текущими фильтрами, сортировкой и страницей поверх overrides.
+
+        Значения по умолчанию (первая страница, сортировка по дате) не пишутся.
+        """
+        params = {**self.filters, "sort": self.sort, "dir": self.direction, "page": self.page, **overrides}
+        if params["sort"] == DEFAULT_SORT and params["dir"] == ADMIN_SORTS[DEFAULT_SORT][1]:
+            params["sort"] = params["dir"] = None
+        if params["page"] == 1:
+            params["page"] = None
+        return urlencode({key: value for key, value in params.items() if value not in (None, "")})
+
+    def sort_query(self, column: str) -> str:
+        """Клик по заголовку: своя колонка меняет направление, чужая — с первой страницы."""
+        if column == self.sort:
+            direction = "asc" if self.direction == "desc" else "desc"
+        else:
+            direction = ADMIN_SORTS[column][1]
+        return self.query(sort=column, dir=direction, page=1)
+
+    def page_numbers(self, around: int = 2) -> list[Optional[int]]:
+        """Номера для пагинатора: первая, последняя и соседи текущей; None — пропуск."""
+        shown = {1, self.pages, *range(self.page - around, self.page + around + 1)}
+        numbers: list[Optional[int]] = []
+        for number in sorted(n for n in shown if 1 <= n <= self.pages):
+            if numbers and number - numbers[-1] > 1:
+                numbers.append(None)
+            numbers.append(number)
+        return numbers
+
+    @property
+    def url(self) -> str:
+        query = self.query()
+        return f"{LIST_URL}?{query}" if query else LIST_URL
+
+
+def get_products_with_filters(
+    db: Session,
+    category_id: Optional[int] = None,
+    subcategory_id: Optional[int] = None,
+    search: Optional[str] = None,
+    show_deleted: Optional[str] = None,
+    sort: Optional[str] = None,
+    direction: Optional[str] = None,
+    page: int = 1,
+) -> ProductTable:
+    """Страница отфильтрованных товаров: LIMIT/OFFSET и общее число по фильтру."""
+    sort = sort if sort in ADMIN_SORTS else DEFAULT_SORT
+    column, default_direction = ADMIN_SORTS[sort]
+    direction = direction if direction in ("asc", "desc") else default_direction
+    conditions = product_filters(category_id, subcategory_id, search, show_deleted)
+
+    total = db.execute(select(func.count()).select_from(Product).where(*conditions)).scalar_one()
+    pages = max(1, -(-total // ADMIN_PAGE_SIZE))
+    page = min(max(page, 1), pages)
+
+    items = []
+    if total:
+        order = (column, Product.id) if direction == "asc" else (column.desc(), Product.id.desc())
+        items = (
+            db.query(Product)
+            .options(joinedload(Product.subcategory).joinedload(Subcategory.category))
+            .filter(*conditions)
+            .order_by(*order)
+            .offset((page - 1) * ADMIN_PAGE_SIZE)
+            .limit(ADMIN_PAGE_SIZE)
+            .all()
+        )
+
+    filters = {
+        "category_id": category_id,
+        "subcategory_id": subcategory_id,
+        "search": search,
+        "show_deleted": show_deleted,
+    }
+    return ProductTable(items, total, page, pages, sort, direction, filters)
+
+
+def safe_list_url(url: Optional[str]) -> str:
+    """Адрес списка товаров для возврата после правки.
+
+    Берутся только путь /admin/products и параметры: ни чужой хост,
+    ни другой раздел через return_to не подставить.
+    """
+    if url:
+        parts = urlsplit(url)
+        if parts.path == LIST_URL:
+            return f"{LIST_URL}?{parts.query}" if parts.query else LIST_URL
+    return LIST_URL
+
+
+def _is_htmx(request: Request) -> bool:
+    return request.headers.get("HX-Request") == "true"
+
+
+def _product_row(request: Request, db: Session, product_id: int) -> HTMLResponse:
+    """Одна строка таблицы — ответ HTMX на удаление и восстановление."""
+    product = (
+        db.query(Product)
+        .options(joinedload(Product.subcategory).joinedload(Subcategory.category))
+        .filter(Product.id == product_id)
+        .one()
+    )
+    return templates.TemplateResponse(
+        "admin/_product_row.html",
+        {
+            "request": request,
+            "product": product,
+            # Страница, с которой пришёл запрос: туда вернёт ссылка «Редактировать»
+            "list_url": safe_list_url(request.headers.get("HX-Current-URL")),
+        },
+    )
 
 
 @router.get("/products", response_class=HTMLResponse)
@@ -236,31 +416,46 @@ def products_list(
     request: Request,
     admin: str = Depends(require_admin),
     db: Session = Depends(get_db),
-    category_id: Optional[int] = None,
-    subcategory_id: Optional[int] = None,
+    category_id: Optional[str] = None,
+    subcategory_id: Optional[str] = None,
     search: Optional[str] = None,
     show_deleted: Optional[str] = None,
+    sort: Optional[str] = None,
+    direction: Optional[str] = Query(None, alias="dir"),
+    page: int = 1,
+    bulk: Optional[str] = None,
+    count: Optional[int] = None,
 ) -> HTMLResponse:
     """Список товаров."""
-    products, categories = get_products_with_filters(
+    category_id, subcategory_id = _optional_id(category_id), _optional_id(subcategory_id)
+    table = get_products_with_filters(
         db=db,
         category_id=category_id,
         subcategory_id=subcategory_id,
         search=search,
         show_deleted=show_deleted,
+        sort=sort,
+        direction=direction,
+        page=page,
     )
+    categories = db.query(Category).options(joinedload(Category.subcategories)).all()
     
     return templates.TemplateResponse(
         "admin/products.html",
         {
             "request": request,
             "admin": admin,
-            "products": products,
+            "table": table,
+            "list_url": table.url,
             "categories": categories,
             "selected_category_id": category_id,
             "selected_subcategory_id": subcategory_id,
             "search": search or "",
             "show_deleted": bool(show_deleted),
+            "bulk_actions": BULK_ACTIONS,
+            # Итог массовой операции после редиректа из products_bulk
+            "bulk_done": BULK_ACTIONS.get(bulk),
+            "bulk_count": count,
         },
     )
 
@@ -270,32 +465,41 @@ def products_table_partial(
     request: Request,
     admin: str = Depends(require_admin),
     db: Session = Depends(get_db),
-    category_id: Optional[int] = None,
-    subcategory_id: Optional[int] = None,
+    category_id: Optional[str] = None,
+    subcategory_id: Optional[str] = None,
     search: Optional[str] = None,
     show_deleted: Optional[str] = None,
+    sort: Optional[str] = None,
+    direction: Optional[str] = Query(None, alias="dir"),
+    page: int = 1,
 ) -> HTMLResponse:
-    """Фрагмент таблицы товаров для AJAX-поиска/фильтров."""
-    products, _ = get_products_with_filters(
+    """Фрагмент таблицы товаров для HTMX: фильтры, сортировка, страницы."""
+    category_id, subcategory_id = _optional_id(category_id), _optional_id(subcategory_id)
+    table = get_products_with_filters(
         db=db,
         category_id=category_id,
         subcategory_id=subcategory_id,
         search=search,
         show_deleted=show_deleted,
+        sort=sort,
+        direction=direction,
+        page=page,
     )
 
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         "admin/_products_table.html",
         {
             "request": request,
             "admin": admin,
-            "products": products,
-            "selected_category_id": category_id,
-            "selected_subcategory_id": subcategory_id,
+            "table": table,
+            "list_url": table.url,
             "search": search or "",
-            "show_deleted": bool(show_deleted),
         },
     )
+    if _is_htmx(request):
+        # Адресная строка повторяет фильтры: обновление страницы и «Назад» их не теряют
+        response.headers["HX-Push-Url"] = table.url
+    return response
 
 
 @router.get("/products/add", response_class=HTMLResponse)
@@ -350,9 +554,6 @@ def product_add(
     # Генерируем slug
     slug = slugify(name)
     
-    # Обрабатываем размеры
-    sizes_json = json.dumps([int(s) for s in sizes if s.isdigit()]) if sizes else None
-    
     # Обрабатываем старую цену
     if old_price is not None and old_price <= 0:
         old_price = None
@@ -360,21 +561,13 @@ def product_add(
     # Сохраняем изображение если есть
     image_url = None
     if image and image.filename:
-        image_url = save_uploaded_image(
-            image,
-            subcategory.category.slug,
-            subcategory.slug,
-            slug,
-        )
+        image_url = save_uploaded_image(image)
     
     # Создаём товар
     product = Product(
         name=name,
         slug=slug,
         description=description or None,
-        price=price,
-        old_price=old_price,
-        sizes_json=sizes_json,
         color=color or None,
         image_url=image_url,
         is_new=is_new,
@@ -382,9 +575,13 @@ def product_add(
         is_active=is_active,
         subcategory_id=subcategory_id,
     )
+    product.set_prices(price, old_price)
+    apply_product_sizes(product, parse_form_sizes(sizes))
     
     db.add(product)
+    index_product(db, product, subcategory.name)
     db.commit()
+    _catalog_changed(product.id)
     
     return RedirectResponse(url="/admin/products", status_code=302)
 
@@ -395,6 +592,7 @@ def product_edit_form(
     request: Request,
     admin: str = Depends(require_admin),
     db: Session = Depends(get_db),
+    return_to: Optional[str] = None,
 ) -> HTMLResponse:
     """Форма редактирования товара."""
     product = (
@@ -427,6 +625,7 @@ def product_edit_form(
             "has_image": has_image,
             "form_action": f"/admin/products/edit/{product_id}",
             "form_title": "Редактировать товар",
+            "return_to": safe_list_url(return_to),
         },
     )
 
@@ -447,6 +646,7 @@ def product_edit(
     is_featured: bool = Form(False),
     is_active: bool = Form(True),
     image: UploadFile = File(None),
+    return_to: Optional[str] = Form(None),
 ) -> RedirectResponse:
     """Обновление товара."""
     product = db.query(Product).filter(Product.id == product_id).first()
@@ -465,36 +665,39 @@ def product_edit(
     product.name = name
     product.slug = slugify(name)
     product.description = description or None
-    product.price = price
-    product.old_price = old_price if old_price and old_price > 0 else None
-    product.sizes_json = json.dumps([int(s) for s in sizes if s.isdigit()]) if sizes else None
+    product.set_prices(price, old_price if old_price and old_price > 0 else None)
+    apply_product_sizes(product, parse_form_sizes(sizes))
     product.color = color or None
     product.is_new = is_new
     product.is_featured = is_featured
     product.is_active = is_active
     product.subcategory_id = subcategory_id
+    # Размеры меняют только product_sizes — отмечаем изменение товара явно
+    product.updated_at = datetime.utcnow()
     
     # Обновляем изображение если загружено новое
+    previous_image = product.image_url
     if image and image.filename:
-        product.image_url = save_uploaded_image(
-            image,
-            subcategory.category.slug,
-            subcategory.slug,
-            product.slug,
-        )
+        product.image_url = save_uploaded_image(image)
     
+    index_product(db, product, subcategory.name)
     db.commit()
+    _catalog_changed(product.id)
+    if previous_image != product.image_url:
+        release_image(db, previous_image)
     
-    return RedirectResponse(url="/admin/products", status_code=302)
+    # Назад на ту же страницу списка, к строке товара
+    return RedirectResponse(url=f"{safe_list_url(return_to)}#product-{product_id}", status_code=302)
 
 
 @router.post("/products/delete/{product_id}")
 def product_delete(
     product_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     admin: str = Depends(require_admin),
-) -> RedirectResponse:
-    """Логическое удаление товара (soft delete)."""
+) -> Response:
+    """Логическое удаление товара (soft delete). Из таблицы (HTMX) — в ответ только обновлённая строка."""
     product = db.query(Product).filter(Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Товар не найден")
@@ -502,24 +705,31 @@ def product_delete(
     # Логическое удаление - просто деактивируем
     product.is_active = False
     db.commit()
+    _catalog_changed(product_id)
     
+    if _is_htmx(request):
+        return _product_row(request, db, product_id)
     return RedirectResponse(url="/admin/products", status_code=302)
 
 
 @router.post("/products/restore/{product_id}")
 def product_restore(
     product_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     admin: str = Depends(require_admin),
-) -> RedirectResponse:
-    """Восстановление удалённого товара."""
+) -> Response:
+    """Восстановление удалённого товара. Из таблицы (HTMX) — в ответ только обновлённая строка."""
     product = db.query(Product).filter(Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Товар не найден")
     
     product.is_active = True
     db.commit()
+    _catalog_changed(product_id)
     
+    if _is_htmx(request):
+        return _product_row(request, db, product_id)
     return RedirectResponse(url="/admin/products", status_code=302)
 
 
@@ -534,18 +744,512 @@ def product_hard_delete(
     if not product:
         raise HTTPException(status_code=404, detail="Товар не найден")
     
-    # Удаляем файл изображения если есть
-    if product.image_url:
-        image_path = BASE_DIR.parent / product.image_url.lstrip("/")
-        if image_path.exists():
-            image_path.unlink()
-    
+    image_url = product.image_url
+    remove_product(db, product.id)
     db.delete(product)
     db.commit()
+    _catalog_changed(product_id)
+    
+    # Файл удаляется, только если он не нужен другим товарам
+    release_image(db, image_url)
     
     return RedirectResponse(url="/admin/products", status_code=302)
 
 
+# =============================================================================
+# МАССОВЫЕ ОПЕРАЦИИ
+# =============================================================================
+
+BULK_ACTIONS = {
+    "discount": "Скидка N% от старой цены",
+    "clear_discount": "Убрать скидку",
+    "price_change": "Изменить цены на N%",
+    "activate": "Вернуть в продажу",
+    "deactivate": "Снять с продажи",
+    "new_on": "Отметить новинками",
+    "new_off": "Снять отметку «Новинка»",
+    "featured_on": "Отметить актуальными",
+    "featured_off": "Снять отметку «Актуальный»",
+    "move": "Перенести в подгруппу",
+}
+
+
+def bulk_values(action: str, percent: Optional[float], subcategory_id: Optional[int]) -> dict:
+    """SET-часть UPDATE для действия: выражения над колонками, без загрузки товаров."""
+    if action in ("discount", "price_change") and percent is None:
+        raise ValueError("Укажите процент")
+    if action == "discount":
+        if not 0 < percent < 100:
+            raise ValueError("Скидка — от 1 до 99%")
+        # Скидка считается от старой цены, если она уже есть: повторная скидка не складывается
+        base = func.coalesce(Product.old_price, Product.price)
+        price = func.round(base * (100 - percent) / 100)
+        return {"price": price, "old_price": base, "discount_percent": discount_expression(price, base)}
+    if action == "clear_discount":
+        return {"price": func.coalesce(Product.old_price, Product.price), "old_price": None, "discount_percent": 0}
+    if action == "price_change":
+        if percent <= -100 or percent == 0:
+            raise ValueError("Изменение цены — ненулевой процент больше −100")
+        factor = (100 + percent) / 100
+        price = func.round(Product.price * factor)
+        old_price = func.round(Product.old_price * factor)
+        return {"price": price, "old_price": old_price, "discount_percent": discount_expression(price, old_price)}
+    if action == "move":
+        if not subcategory_id:
+            raise ValueError("Выберите подгруппу")
+        return {"subcategory_id": subcategory_id}
+    flags = {
+        "activate": ("is_active", True),
+        "deactivate": ("is_active", False),
+        "new_on": ("is_new", True),
+        "new_off": ("is_new", False),
+        "featured_on": ("is_featured", True),
+        "featured_off": ("is_featured", False),
+    }
+    if action not in flags:
+        raise ValueError("Неизвестное действие")
+    column, value = flags[action]
+    return {column: value}
+
+
+@router.post("/products/bulk")
+def products_bulk(
+    db: Session = Depends(get_db),
+    admin: str = Depends(require_admin),
+    action: str = Form(...),
+    ids: list[int] = Form(default=[]),
+    scope: str = Form("selected"),
+    percent: Optional[float] = Form(None),
+    target_subcategory_id: Optional[int] = Form(None),
+    category_id: Optional[int] = Form(None),
+    subcategory_id: Optional[int] = Form(None),
+    search: Optional[str] = Form(None),
+    show_deleted: Optional[str] = Form(None),
+) -> RedirectResponse:
+    """Действие над выбранными товарами или над всеми по фильтру — одним UPDATE."""
+    try:
+        values = bulk_values(action, percent, target_subcategory_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    filters = {"category_id": category_id, "subcategory_id": subcategory_id, "search": search, "show_deleted": show_deleted}
+    if scope == "filter":
+        conditions = product_filters(**filters)
+        selection = {"filter": {key: value for key, value in filters.items() if value}}
+    elif ids:
+        conditions = [Product.id.in_(ids)]
+        selection = {"ids": ids}
+    else:
+        raise HTTPException(status_code=400, detail="Не выбрано ни одного товара")
+
+    subcategory = None
+    if action == "move":
+        subcategory = db.query(Subcategory).filter(Subcategory.id == target_subcategory_id).first()
+        if not subcategory:
+            raise HTTPException(status_code=400, detail="Подкатегория не найдена")
+
+    statement = (
+        update(Product)
+        .where(*conditions)
+        .values(**values, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if subcategory is not None:
+        # Подгруппа входит в поисковый индекс — перенесённые товары переиндексируются
+        moved = db.execute(statement.returning(Product.id, Product.name, Product.description, Product.color)).all()
+        index_rows(db, [{**row._asdict(), "subcategory": subcategory.name} for row in moved])
+        count = len(moved)
+    else:
+        count = db.execute(statement).rowcount
+
+    details = {"percent": percent, "subcategory_id": target_subcategory_id, **selection}
+    db.add(AuditEntry(
+        admin=admin,
+        action=action,
+        product_count=count,
+        details=json.dumps({key: value for key, value in details.items() if value is not None}, ensure_ascii=False),
+    ))
+    db.commit()
+    _catalog_changed()
+
+    params = urlencode({**{key: value for key, value in filters.items() if value}, "bulk": action, "count": count})
+    return RedirectResponse(url=f"/admin/products?{params}", status_code=302)
+
+
+# =============================================================================
+# ИМПОРТ И ЭКСПОРТ
+# =============================================================================
+
+IMPORT_BATCH = 500
+EXPORT_YIELD_PER = 1000
+
+_TRUE = {"1", "true", "yes", "y", "да", "+"}
+_FALSE = {"0", "false", "no", "n", "нет", "-"}
+_FLAGS = ("is_active", "is_new", "is_featured")
+
+
+def _parse_flag(value: str, column: str) -> bool:
+    text = value.strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValueError(f"{column}: «{value}» — ожидается да/нет или 1/0")
+
+
+def _parse_price(value: str, column: str) -> Optional[float]:
+    text = value.strip().replace(" ", "").replace("\u00a0", "").replace(",", ".")
+    if not text:
+        return None
+    try:
+        price = float(text)
+    except ValueError:
+        raise ValueError(f"{column}: «{value}» — не число") from None
+    if price < 0:
+        raise ValueError(f"{column}: отрицательная цена")
+    return price
+
+
+def parse_cell_sizes(value: str) -> list[int]:
+    """Размеры из ячейки «36, 37 38;39» — так же, как из чекбоксов формы."""
+    tokens = [token for token in re.split(r"[\s,;/]+", value) if token]
+    # В XLSX размер может прийти числом с плавающей точкой: 37.0
+    tokens = [token[:-2] if token.endswith(".0") else token for token in tokens]
+    invalid = [token for token in tokens if not token.isdigit()]
+    if invalid:
+        raise ValueError(f"sizes: «{invalid[0]}» — не размер")
+    return parse_form_sizes(tokens)
+
+
+class SubcategoryLookup:
+    """Подгруппа по slug или названию; категория нужна, только если подгруппы с таким именем есть в нескольких."""
+
+    def __init__(self, db: Session) -> None:
+        self.names: dict[int, str] = {}
+        self._by_key: dict[str, list[Subcategory]] = {}
+        for subcategory in db.query(Subcategory).options(joinedload(Subcategory.category)).all():
+            self.names[subcategory.id] = subcategory.name
+            for key in {subcategory.slug, subcategory.name.strip().lower()}:
+                self._by_key.setdefault(key, []).append(subcategory)
+
+    def resolve(self, category: str, subcategory: str) -> int:
+        candidates = self._by_key.get(subcategory.strip().lower(), [])
+        category = category.strip().lower()
+        if category:
+            candidates = [
+                item for item in candidates
+                if category in (item.category.slug, item.category.name.strip().lower())
+            ]
+        if not candidates:
+            raise ValueError(f"подгруппа «{subcategory}» не найдена")
+        if len(candidates) > 1:
+            raise ValueError(f"подгруппа «{subcategory}» есть в нескольких категориях — заполните category")
+        return candidates[0].id
+
+
+def parse_import_row(row: dict, lookup: SubcategoryLookup) -> dict:
+    """Значения из строки файла; в результат попадают только колонки, которые в файле есть."""
+    values: dict = {}
+    if row.get("id", "").strip():
+        try:
+            values["id"] = int(float(row["id"]))
+        except ValueError:
+            raise ValueError(f"id: «{row['id']}» — не число") from None
+    if "name" in row:
+        values["name"] = row["name"].strip()
+        if not values["name"]:
+            raise ValueError("пустое название")
+    if "subcategory" in row:
+        if not row["subcategory"].strip():
+            raise ValueError("не указана подгруппа")
+        values["subcategory_id"] = lookup.resolve(row.get("category", ""), row["subcategory"])
+    if "price" in row:
+        values["price"] = _parse_price(row["price"], "price")
+        if values["price"] is None:
+            raise ValueError("не указана цена")
+    if "old_price" in row:
+        old_price = _parse_price(row["old_price"], "old_price")
+        values["old_price"] = old_price if old_price and old_price > 0 else None
+    if "sizes" in row:
+        values["sizes"] = parse_cell_sizes(row["sizes"])
+    for column in ("color", "description", "image_url"):
+        if column in row:
+            values[column] = row[column].strip() or None
+    for column in _FLAGS:
+        if column in row and row[column].strip():
+            values[column] = _parse_flag(row[column], column)
+    return values
+
+
+_IMPORT_COLUMNS = (
+    Product.id, Product.name, Product.description, Product.price, Product.old_price,
+    Product.sizes_json, Product.color, Product.image_url, Product.subcategory_id,
+    Product.is_active, Product.is_new, Product.is_featured,
+)
+_NEW_PRODUCT = {
+    "description": None, "old_price": None, "sizes": [], "color": None, "image_url": None,
+    "is_active": True, "is_new": False, "is_featured": False,
+}
+
+
+def import_batch(db: Session, batch: list[tuple[int, dict]], lookup: SubcategoryLookup, job: ImportJob) -> None:
+    """Записать пачку строк: обновления и вставки executemany, размеры и поисковый индекс — тоже пачкой.
+
+    Строка с id обновляет товар (колонки, которых нет в файле, не трогаются),
+    без id — добавляет новый. Пачка — одна транзакция.
+    """
+    ids = [values["id"] for _, values in batch if "id" in values]
+    existing = {
+        row.id: row._asdict()
+        for row in db.execute(select(*_IMPORT_COLUMNS).where(Product.id.in_(ids)))
+    } if ids else {}
+
+    now = datetime.utcnow()
+    updates: list[dict] = []
+    inserts: list[dict] = []
+    sizes: list[tuple[dict, Optional[list[int]]]] = []
+    for line, values in batch:
+        if "id" in values:
+            current = existing.get(values["id"])
+            if current is None:
+                job.error(line, f"товар id={values['id']} не найден")
+                continue
+            merged = {**current, **values}
+            if "sizes" not in values:
+                merged["sizes"] = json.loads(current["sizes_json"] or "[]")
+        else:
+            missing = [column for column in ("name", "subcategory_id", "price") if column not in values]
+            if missing:
+                job.error(line, "для нового товара нужны name, subcategory и price")
+                continue
+            merged = {**_NEW_PRODUCT, **values}
+
+        record = {
+            "name": merged["name"],
+            "slug": slugify(merged["name"]),
+            "description": merged["description"],
+            "price": merged["price"],
+            "old_price": merged["old_price"],
+            "discount_percent": compute_discount(merged["price"], merged["old_price"]),
+            "sizes_json": json.dumps(merged["sizes"]) if merged["sizes"] else None,
+            "color": merged["color"],
+            "image_url": merged["image_url"],
+            "subcategory_id": merged["subcategory_id"],
+            "is_active": merged["is_active"],
+            "is_new": merged["is_new"],
+            "is_featured": merged["is_featured"],
+            "updated_at": now,
+        }
+        if "id" in values:
+            record["id"] = values["id"]
+            updates.append(record)
+            sizes.append((record, merged["sizes"] if "sizes" in values else None))
+        else:
+            record["created_at"] = now
+            inserts.append(record)
+            sizes.append((record, merged["sizes"]))
+
+    if updates:
+        db.execute(update(Product), updates)
+    if inserts:
+        new_ids = db.scalars(insert(Product).returning(Product.id, sort_by_parameter_order=True), inserts).all()
+        for record, product_id in zip(inserts, new_ids):
+            record["id"] = product_id
+    _import_sizes(db, sizes)
+    index_rows(db, [
+        {**record, "subcategory": lookup.names.get(record["subcategory_id"])}
+        for record in (*updates, *inserts)
+    ])
+    db.commit()
+
+    job.created += len(inserts)
+    job.updated += len(updates)
+
+
+def _import_sizes(db: Session, items: list[tuple[dict, Optional[list[int]]]]) -> None:
+    """product_sizes как в apply_product_sizes: остаток сохраняется, снятые размеры удаляются."""
+    wanted = {record["id"]: set(sizes) for record, sizes in items if sizes is not None}
+    if not wanted:
+        return
+    present: dict[int, set[int]] = {}
+    for product_id, size in db.execute(
+        select(ProductSize.product_id, ProductSize.size).where(ProductSize.product_id.in_(list(wanted)))
+    ):
+        present.setdefault(product_id, set()).add(size)
+
+    removed = [
+        {"b_product_id": product_id, "b_size": size}
+        for product_id, sizes in present.items()
+        for size in sizes - wanted[product_id]
+    ]
+    added = [
+        {"product_id": product_id, "size": size, "quantity": 1}
+        for product_id, sizes in wanted.items()
+        for size in sorted(sizes - present.get(product_id, set()))
+    ]
+    if removed:
+        table = ProductSize.__table__
+        db.execute(
+            table.delete().where(
+                table.c.product_id == bindparam("b_product_id"), table.c.size == bindparam("b_size")
+            ),
+            removed,
+        )
+    if added:
+        db.execute(insert(ProductSize), added)
+
+
+def run_import(job_id: str) -> None:
+    """Фоновая задача: прочитать файл и записать его пачками по IMPORT_BATCH строк."""
+    job = load_job(job_id)
+    if job is None:
+        return
+    job.state = "running"
+    job.save()
+    try:
+        with db_session() as db:
+            lookup = SubcategoryLookup(db)
+            batch: list[tuple[int, dict]] = []
+            for line, row, progress in read_rows(job.upload_path):
+                if job.processed == 0 and not {"id", "name"} & row.keys():
+                    raise ValueError("в заголовке нет колонок id и name")
+                job.processed += 1
+                try:
+                    batch.append((line, parse_import_row(row, lookup)))
+                except ValueError as exc:
+                    job.error(line, str(exc))
+                if len(batch) >= IMPORT_BATCH:
+                    import_batch(db, batch, lookup, job)
+                    batch = []
+                    job.progress = progress
+                    job.save()
+            if batch:
+                import_batch(db, batch, lookup, job)
+        job.finish("done")
+    except Exception as exc:
+        logger.exception("Импорт %s (%s) прерван", job.id, job.filename)
+        job.finish("failed", str(exc))
+    finally:
+        job.upload_path.unlink(missing_ok=True)
+        if job.created or job.updated:
+            _catalog_changed()
+        job.save()
+
+
+def export_rows(db: Session) -> Iterator[dict]:
+    """Товары в колонках COLUMNS по id; через yield_per — без ORM-объектов и всей выборки в памяти."""
+    rows = db.execute(
+        select(
+            Product.id, Product.name, Category.slug.label("category"), Subcategory.slug.label("subcategory"),
+            Product.price, Product.old_price, Product.sizes_json, Product.color, Product.description,
+            Product.image_url, Product.is_active, Product.is_new, Product.is_featured,
+        )
+        .outerjoin(Subcategory, Product.subcategory_id == Subcategory.id)
+        .outerjoin(Category, Subcategory.category_id == Category.id)
+        .order_by(Product.id)
+        .execution_options(yield_per=EXPORT_YIELD_PER)
+    )
+    for row in rows:
+        values = row._asdict()
+        values["sizes"] = ", ".join(str(size) for size in json.loads(values.pop("sizes_json") or "[]"))
+        for column in ("price", "old_price"):
+            if values[column] is not None and values[column].is_integer():
+                values[column] = int(values[column])
+        for column in _FLAGS:
+            values[column] = int(values[column])
+        yield values
+
+
+def _export_csv() -> Iterator[bytes]:
+    # Своя сессия: ответ отдаётся уже после выхода из зависимостей роута
+    with db_session() as db:
+        yield from csv_stream(export_rows(db))
+
+
+@router.get("/import", response_class=HTMLResponse)
+def import_page(
+    request: Request,
+    admin: str = Depends(require_admin),
+    job: Optional[str] = None,
+) -> HTMLResponse:
+    """Импорт и экспорт каталога."""
+    return templates.TemplateResponse(
+        "admin/import.html",
+        {
+            "request": request,
+            "admin": admin,
+            "formats": FORMATS,
+            "columns": COLUMNS,
+            "job": load_job(job) if job else None,
+            "error": None,
+        },
+    )
+
+
+@router.post("/import", response_class=HTMLResponse)
+def catalog_import(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    admin: str = Depends(require_admin),
+    file: UploadFile = File(...),
+) -> HTMLResponse:
+    """Принять файл и запустить импорт в фоне; прогресс опрашивается через HTMX."""
+    if file_format(file.filename) is None:
+        return templates.TemplateResponse(
+            "admin/_import_status.html",
+            {"request": request, "job": None, "error": f"Поддерживаются файлы: {', '.join(FORMATS)}"},
+        )
+
+    job = create_job(file.filename, file.file)
+    background_tasks.add_task(run_import, job.id)
+    if request.headers.get("HX-Request") != "true":
+        return RedirectResponse(url=f"/admin/import?job={job.id}", status_code=303)
+    return templates.TemplateResponse(
+        "admin/_import_status.html",
+        {"request": request, "job": job, "error": None},
+    )
+
+
+@router.get("/import/{job_id}", response_class=HTMLResponse)
+def import_status(
+    job_id: str,
+    request: Request,
+    admin: str = Depends(require_admin),
+) -> HTMLResponse:
+    """Состояние импорта (фрагмент для опроса)."""
+    job = load_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Импорт не найден")
+    return templates.TemplateResponse(
+        "admin/_import_status.html",
+        {"request": request, "job": job, "error": None},
+    )
+
+
+@router.get("/export")
+def catalog_export(
+    admin: str = Depends(require_admin),
+    file_type: str = Query("csv", alias="format"),
+) -> StreamingResponse:
+    """Выгрузка всего каталога в CSV или XLSX."""
+    if file_type not in FORMATS:
+        raise HTTPException(status_code=400, detail="Неизвестный формат выгрузки")
+    filename = f"catalog-{date.today().isoformat()}.{file_type}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if file_type == "csv":
+        return StreamingResponse(_export_csv(), media_type="text/csv; charset=utf-8", headers=headers)
+
+    # XLSX — zip-архив, его нельзя отдавать по мере записи: сначала во временный файл
+    fd, tmp_name = tempfile.mkstemp(prefix="export-", suffix=".xlsx")
+    with os.fdopen(fd, "wb") as target, db_session() as db:
+        write_xlsx(export_rows(db), target)
+    return StreamingResponse(
+        file_chunks(Path(tmp_name)),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers=headers,
+    )
+
+
 # =============================================================================
 # АКЦИИ
 # =============================================================================
@@ -617,6 +1321,7 @@ def promotion_add(
     
     db.add(promotion)
     db.commit()
+    _catalog_changed()
     
     return RedirectResponse(url="/admin/promotions", status_code=302)
 
@@ -671,6 +1376,7 @@ def promotion_edit(
     promotion.is_active = is_active
     
     db.commit()
+    _catalog_changed()
     
     return RedirectResponse(url="/admin/promotions", status_code=302)
 
@@ -688,6 +1394,7 @@ def promotion_delete(
     
     db.delete(promotion)
     db.commit()
+    _catalog_changed()
     
     return RedirectResponse(url="/admin/promotions", status_code=302)
 
@@ -711,3 +1418,17 @@ def get_subcategories(
     )
     return [{"id": s.id, "name": s.name} for s in subcategories]
 
+
+@router.get("/api/metrics/db")
+def db_metrics(admin: str = Depends(require_admin)) -> dict:
+    """Ожидания блокировок SQLite и состояние пулов этого воркера."""
+    result = {
+        "pid": os.getpid(),
+        "dialect": engine.dialect.name,
+        "pools": {"writer": engine.pool.status(), "reader": async_engine.pool.status()},
+    }
+    if IS_SQLITE:
+        with engine.connect() as conn:
+            result["journal_mode"] = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+        result["locks"] = lock_metrics.snapshot()
+    return result
@@ -0,0 +1,268 @@
+"""Сборка статики: минификация, имена с хешем, .gz/.br рядом.
+
+Исходники (static/style.css, static/admin.css, static/vendor/htmx-*.js)
+собираются в static/dist/{имя}.{хеш}.{ext}, а manifest.json хранит
+соответствие «логическое имя -> файл». Шаблоны берут URL через
+asset_url("style.css"), поэтому у каждой версии файла свой адрес и его
+можно кэшировать навсегда (Cache-Control: immutable).
+
+    python -m app.assets build   # собрать
+    python -m app.assets check   # код возврата 1, если сборка устарела
+
+При старте приложения ensure_assets() пересобирает статику, если
+исходники изменились после последней сборки.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # .br не соберутся, nginx и приложение отдадут .gz
+    brotli = None
+
+logger = logging.getLogger("uvicorn.error")
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+STATIC_DIR = BASE_DIR / "static"
+DIST_DIR = STATIC_DIR / "dist"
+MANIFEST_PATH = DIST_DIR / "manifest.json"
+
+# Логическое имя -> исходник (относительно static)
+SOURCES = {
+    "style.css": "style.css",
+    "admin.css": "admin.css",
+    "htmx.js": "vendor/htmx-2.0.3.min.js",
+}
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+_HASH_LENGTH = 10
+
+
+# =============================================================================
+# МИНИФИКАЦИЯ
+# =============================================================================
+
+_CSS_TOKENS = re.compile(
+    r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')"""  # строки не трогаем
+    r"""|(/\*.*?\*/)""",
+    re.DOTALL,
+)
+_CSS_SPACES = re.compile(r"\s+")
+_CSS_PUNCT = re.compile(r"\s*([{};,>])\s*")
+_CSS_COLON = re.compile(r":\s+")
+
+
+def _minify_css_chunk(chunk: str) -> str:
+    chunk = _CSS_SPACES.sub(" ", chunk)
+    chunk = _CSS_PUNCT.sub(r"\1", chunk)
+    # Пробел перед «:» значим в селекторах (div :hover), после — нет
+    chunk = _CSS_COLON.sub(":", chunk)
+    return chunk.replace(";}", "}")
+
+
+def minify_css(source: str) -> str:
+    """Убрать комментарии и лишние пробелы, не меняя строк в кавычках."""
+    out: list[str] = []
+    pending: list[str] = []  # код между строками; комментарии просто пропускаются
+    position = 0
+    for match in _CSS_TOKENS.finditer(source):
+        pending.append(source[position:match.start()])
+        if match.group(1):
+            out.append(_minify_css_chunk("".join(pending)))
+            out.append(match.group(1))
+            pending = []
+        position = match.end()
+    pending.append(source[position:])
+    out.append(_minify_css_chunk("".join(pending)))
+    return "".join(out).strip()
+
+
+# =============================================================================
+# СБОРКА
+# =============================================================================
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def _source_digest(name: str) -> str:
+    return hashlib.sha256((STATIC_DIR / SOURCES[name]).read_bytes()).hexdigest()
+
+
+def _compile(name: str) -> bytes:
+    data = (STATIC_DIR / SOURCES[name]).read_bytes()
+    if name.endswith(".css"):
+        return minify_css(data.decode("utf-8")).encode("utf-8")
+    return data
+
+
+def read_manifest() -> dict:
+    try:
+        return json.loads(MANIFEST_PATH.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def build_assets() -> dict:
+    """Собрать все ассеты и записать manifest.json. Возвращает манифест."""
+    DIST_DIR.mkdir(parents=True, exist_ok=True)
+    previous = read_manifest()
+    manifest: dict[str, dict] = {}
+
+    for name in SOURCES:
+        data = _compile(name)
+        stem, ext = os.path.splitext(name)
+        filename = f"{stem}.{hashlib.sha256(data).hexdigest()[:_HASH_LENGTH]}{ext}"
+        target = DIST_DIR / filename
+        if not target.exists():
+            _write_atomic(target, data)
+            _write_atomic(target.with_name(filename + ".gz"), gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write_atomic(target.with_name(filename + ".br"), brotli.compress(data, quality=11))
+        manifest[name] = {"file": filename, "source": _source_digest(name), "bytes": len(data)}
+
+    _write_atomic(MANIFEST_PATH, json.dumps(manifest, indent=2, sort_keys=True).encode())
+    _remove_old_builds(manifest, previous)
+    return manifest
+
+
+def _remove_old_builds(manifest: dict, previous: dict) -> None:
+    """Оставить текущую и предыдущую версии: закэшированные страницы ещё ссылаются на неё."""
+    keep = {entry["file"] for entry in (*manifest.values(), *previous.values())}
+    for file in DIST_DIR.iterdir():
+        if file.name == MANIFEST_PATH.name or file.name.startswith("."):
+            continue
+        base = file.name.removesuffix(".gz").removesuffix(".br")
+        if base not in keep:
+            file.unlink(missing_ok=True)
+
+
+def stale_assets(manifest: Optional[dict] = None) -> list[str]:
+    """Логические имена, у которых исходник изменился или нет собранного файла."""
+    manifest = read_manifest() if manifest is None else manifest
+    stale = []
+    for name in SOURCES:
+        entry = manifest.get(name)
+        if (
+            entry is None
+            or entry.get("source") != _source_digest(name)
+            or not (DIST_DIR / entry["file"]).is_file()
+        ):
+            stale.append(name)
+    return stale
+
+
+_manifest: dict = {}
+
+
+def ensure_assets() -> None:
+    """Проверка при старте: пересобрать, если сборка устарела."""
+    global _manifest
+    manifest = read_manifest()
+    stale = stale_assets(manifest)
+    if stale:
+        logger.warning("Статика устарела (%s), пересобираю", ", ".join(stale))
+        manifest = build_assets()
+    _manifest = manifest
+
+
+def asset_url(name: str) -> str:
+    """URL собранного файла; без сборки — исходник, чтобы страница не сломалась."""
+    entry = _manifest.get(name)
+    if entry is not None:
+        return f"/static/dist/{entry['file']}"
+    return f"/static/{SOURCES.get(name, name)}"
+
+
+def register_globals(env) -> None:
+    env.globals["asset_url"] = asset_url
+
+
+# =============================================================================
+# ОТДАЧА
+# =============================================================================
+
+class AssetFiles(StaticFiles):
+    """StaticFiles, который отдаёт dist/ навсегда кэшируемым и предсжатым.
+
+    В проде эти файлы отдаёт nginx (gzip_static / brotli_static); здесь то же
+    поведение для запуска без nginx.
+    """
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        path = Path(full_path)
+        if path.parent != DIST_DIR:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        request_headers = Headers(scope=scope)
+        accept = request_headers.get("accept-encoding", "")
+        headers = {"Cache-Control": IMMUTABLE, "Vary": "Accept-Encoding"}
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            variant = path.with_name(path.name + suffix)
+            if encoding in accept and variant.is_file():
+                response = FileResponse(
+                    variant,
+                    status_code=status_code,
+                    stat_result=variant.stat(),
+                    media_type=self._media_type(path),
+                    headers={**headers, "Content-Encoding": encoding},
+                )
+                break
+        else:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+
+        if self.is_not_modified(response.headers, request_headers):
+            kept = ("etag", "cache-control", "vary")
+            return Response(status_code=304, headers={k: v for k, v in response.headers.items() if k in kept})
+        return response
+
+    @staticmethod
+    def _media_type(path: Path) -> str:
+        return "text/css; charset=utf-8" if path.suffix == ".css" else "text/javascript; charset=utf-8"
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("build", "check"))
+    args = parser.parse_args(argv)
+
+    if args.command == "check":
+        stale = stale_assets()
+        if stale:
+            print(f"Статика устарела: {', '.join(stale)}. Запустите python -m app.assets build")
+            sys.exit(1)
+        print("Статика собрана")
+        return
+
+    manifest = build_assets()
+    for name, entry in sorted(manifest.items()):
+        print(f"{name:<10} -> dist/{entry['file']} ({entry['bytes']} байт)")
+    if brotli is None:
+        print("brotli не установлен: .br не собраны")
+
+
+if __name__ == "__main__":
+    main()
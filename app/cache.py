@@ -0,0 +1,343 @@
+"""Кэш готовых публичных страниц и поколение каталога.
+
+Поколение — монотонно растущее число в файле instance/catalog.generation.
+Админка увеличивает его после каждой записи (bump_generation, под
+flock на catalog.generation.lock), и все воркеры uvicorn видят изменение
+через stat() без обращения к БД.
+
+Страницы кэшируются по (поколение, host, path, query, HX-Request).
+Ответ получает сильный ETag по содержимому и Last-Modified по времени
+смены поколения; повторный запрос с If-None-Match/If-Modified-Since
+к закэшированной странице получает 304 прямо из памяти.
+
+Сжатые brotli/gzip варианты хранятся отдельно по хешу содержимого и
+кодировке: каждая версия страницы сжимается один раз, на максимальном
+уровне, а не nginx на каждый запрос.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+from .database import INSTANCE_DIR
+
+try:
+    import brotli
+except ImportError:  # без brotli отдаём только gzip
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # Windows (разработка): блокировка через msvcrt
+    fcntl = None
+    import msvcrt
+
+GENERATION_FILE = INSTANCE_DIR / "catalog.generation"
+GENERATION_LOCK = INSTANCE_DIR / "catalog.generation.lock"
+
+# Что никогда не кэшируем: админка, статика, мониторинг
+_EXCLUDED_PREFIXES = ("/admin", "/static", "/img", "/health")
+_CACHEABLE_TYPES = ("text/html", "application/xml", "text/plain", "application/json")
+
+# Мелкие ответы не сжимаем: заголовки gzip съедят выигрыш
+_MIN_COMPRESS_BYTES = 512
+
+_started_at = time.time()
+_generation_cache: Optional[tuple[tuple[int, int, int], int]] = None
+
+
+def _read_generation() -> tuple[int, float]:
+    global _generation_cache
+    try:
+        st = os.stat(GENERATION_FILE)
+    except FileNotFoundError:
+        return 0, _started_at
+
+    # После деплоя шаблоны могли измениться при том же поколении,
+    # поэтому Last-Modified не бывает раньше старта процесса
+    modified_at = max(st.st_mtime, _started_at)
+    stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _generation_cache
+    if cached is not None and cached[0] == stamp:
+        return cached[1], modified_at
+
+    try:
+        value = int(GENERATION_FILE.read_text().strip() or 0)
+    except (OSError, ValueError):
+        value = 0
+    _generation_cache = (stamp, value)
+    return value, modified_at
+
+
+def current_generation() -> int:
+    """Текущее поколение каталога (0, если админка ещё ничего не меняла)."""
+    return _read_generation()[0]
+
+
+@contextmanager
+def _generation_lock():
+    """Эксклюзивная блокировка между воркерами на время read-increment-write."""
+    with open(GENERATION_LOCK, "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def bump_generation() -> int:
+    """Увеличить поколение — все кэши, завязанные на него, устаревают.
+
+    Два воркера, пишущие одновременно, получают разные номера: чтение и
+    замена файла идут под блокировкой, иначе оба записали бы N + 1 и одна
+    инвалидация потерялась бы.
+    """
+    with _generation_lock():
+        # Сам файл, а не кэш по stat(): mtime мог не смениться за время соседней записи
+        try:
+            value = int(GENERATION_FILE.read_text().strip() or 0) + 1
+        except (OSError, ValueError):
+            value = 1
+        tmp = GENERATION_FILE.with_name(f"{GENERATION_FILE.name}.{os.getpid()}.tmp")
+        tmp.write_text(str(value))
+        os.replace(tmp, GENERATION_FILE)
+    return value
+
+
+@dataclass(frozen=True)
+class CachedPage:
+    status_code: int
+    body: bytes
+    content_type: str
+    etag: str
+    digest: str
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """У каждой кодировки свой сильный ETag: "<etag>-br", "<etag>-gzip"."""
+        if encoding is None:
+            return self.etag
+        return f'{self.etag[:-1]}-{encoding}"'
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=11, mode=brotli.MODE_TEXT)
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """br, если клиент его принимает и brotli установлен, иначе gzip, иначе None."""
+    accepted: dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name] = quality
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+class PageCache:
+    """LRU готовых ответов для текущего поколения каталога."""
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max_entries
+        self._generation: Optional[int] = None
+        self._entries: "OrderedDict[tuple, CachedPage]" = OrderedDict()
+        # (sha256 тела, кодировка) -> сжатое тело; одинаковые страницы делят запись
+        self._compressed: "OrderedDict[tuple[str, str], bytes]" = OrderedDict()
+        self._compressing: dict[tuple[str, str], asyncio.Future] = {}
+
+    @staticmethod
+    def is_cacheable(request: Request) -> bool:
+        if request.method not in ("GET", "HEAD"):
+            return False
+        return not request.url.path.startswith(_EXCLUDED_PREFIXES)
+
+    @staticmethod
+    def key(request: Request) -> tuple:
+        return (
+            request.headers.get("host", ""),
+            request.url.path,
+            request.url.query,
+            request.headers.get("HX-Request") == "true",
+            request.headers.get("HX-Target", ""),
+        )
+
+    def get(self, generation: int, key: tuple) -> Optional[CachedPage]:
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
+            return None
+        page = self._entries.get(key)
+        if page is not None:
+            self._entries.move_to_end(key)
+        return page
+
+    def put(self, generation: int, key: tuple, page: CachedPage) -> None:
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
+        self._entries[key] = page
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._compressed.clear()
+
+    async def encoded_body(self, page: CachedPage, encoding: str) -> bytes:
+        """Сжатое тело страницы; сжимается один раз, вне event loop."""
+        key = (page.digest, encoding)
+        body = self._compressed.get(key)
+        if body is not None:
+            self._compressed.move_to_end(key)
+            return body
+
+        task = self._compressing.get(key)
+        if task is None:
+            task = asyncio.ensure_future(run_in_threadpool(_compress, page.body, encoding))
+            self._compressing[key] = task
+            task.add_done_callback(lambda _: self._compressing.pop(key, None))
+        body = await asyncio.shield(task)
+
+        self._compressed[key] = body
+        self._compressed.move_to_end(key)
+        # Старые версии уходят вместе со страницами: вариантов не больше двух на страницу
+        while len(self._compressed) > 2 * self.max_entries:
+            self._compressed.popitem(last=False)
+        return body
+
+    async def _respond(self, request: Request, page: CachedPage, last_modified: str) -> Response:
+        encoding = self._encoding_for(request, page)
+        body = page.body if encoding is None else await self.encoded_body(page, encoding)
+        return _to_response(page, last_modified, body, encoding)
+
+    @staticmethod
+    def _encoding_for(request: Request, page: Optional[CachedPage]) -> Optional[str]:
+        if page is None or len(page.body) < _MIN_COMPRESS_BYTES:
+            return None
+        return choose_encoding(request.headers.get("accept-encoding", ""))
+
+    async def serve(
+        self,
+        request: Request,
+        call_next: Callable[[Request], Awaitable[Response]],
+    ) -> Response:
+        """Middleware: отдать страницу из кэша или отрендерить и сохранить."""
+        if not self.is_cacheable(request):
+            return await call_next(request)
+
+        generation, modified_at = _read_generation()
+        key = self.key(request)
+        last_modified = formatdate(modified_at, usegmt=True)
+
+        page = self.get(generation, key)
+        etag = page.etag_for(self._encoding_for(request, page)) if page is not None else None
+        if _not_modified(request, page, modified_at):
+            return Response(status_code=304, headers=_validator_headers(etag, last_modified))
+        if page is not None:
+            return await self._respond(request, page, last_modified)
+
+        response = await call_next(request)
+        content_type = response.headers.get("content-type", "")
+        if (
+            response.status_code != 200
+            or getattr(request.state, "skip_page_cache", False)
+            or "set-cookie" in response.headers
+            or not content_type.startswith(_CACHEABLE_TYPES)
+        ):
+            return response
+
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        digest = hashlib.sha256(body).hexdigest()
+        page = CachedPage(
+            status_code=response.status_code,
+            body=body,
+            content_type=content_type,
+            etag=f'"{generation}-{digest[:20]}"',
+            digest=digest,
+        )
+        self.put(generation, key, page)
+        return await self._respond(request, page, last_modified)
+
+
+def _validator_headers(etag: Optional[str], last_modified: str) -> dict[str, str]:
+    headers = {
+        "Last-Modified": last_modified,
+        # Браузер хранит копию, но перепроверяет её при каждом заходе
+        "Cache-Control": "no-cache",
+        "Vary": "HX-Request, HX-Target, Accept-Encoding",
+    }
+    if etag:
+        headers["ETag"] = etag
+    return headers
+
+
+def _to_response(page: CachedPage, last_modified: str, body: bytes, encoding: Optional[str]) -> Response:
+    headers = _validator_headers(page.etag_for(encoding), last_modified)
+    headers["Content-Type"] = page.content_type
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=page.status_code, headers=headers)
+
+
+def _not_modified(request: Request, page: Optional[CachedPage], modified_at: float) -> bool:
+    """Проверка If-None-Match (приоритетно) и If-Modified-Since.
+
+    304 только для страницы, которая лежит в кэше этого воркера с кодом
+    200: ответы, которые не кэшировались (404, ошибки, страницы с cookie),
+    всегда отдаются заново.
+    """
+    if page is None or page.status_code != 200:
+        return False
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        # Тело одно и то же в любой кодировке — подходит ETag любого варианта
+        return any(page.etag_for(encoding) in tags for encoding in (None, "br", "gzip"))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(modified_at) <= since
+    return False
+
+
+page_cache = PageCache()
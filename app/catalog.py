@@ -0,0 +1,141 @@
+"""Снимок дерева категорий в памяти процесса.
+
+Навигация в base.html и разбор URL вида /{category_slug}/{subcategory_slug}
+читают неизменяемый снимок вместо запросов к БД на каждый хит.
+Снимок строится лениво и перестраивается, когда админка увеличивает
+поколение каталога (app/cache.py) — так изменения видят все воркеры.
+"""
+
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+
+from .cache import current_generation
+from .models import Category
+
+
+@dataclass(frozen=True)
+class SubcategoryNode:
+    """Подгруппа в снимке каталога."""
+
+    id: int
+    name: str
+    slug: str
+    sort_order: int
+    category_id: int
+    category_slug: str
+
+
+@dataclass(frozen=True)
+class CategoryNode:
+    """Категория в снимке каталога вместе с подгруппами (по sort_order)."""
+
+    id: int
+    name: str
+    slug: str
+    icon: Optional[str]
+    sort_order: int
+    subcategories: tuple[SubcategoryNode, ...]
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Неизменяемое дерево категорий и индексы для маршрутов."""
+
+    categories: tuple[CategoryNode, ...]
+    by_slug: Mapping[str, CategoryNode]
+    by_subcategory_id: Mapping[int, tuple[CategoryNode, SubcategoryNode]]
+    routes: Mapping[tuple[str, str], tuple[int, int]]
+    first_subcategory_by_slug: Mapping[str, SubcategoryNode]
+
+    def category(self, slug: str) -> Optional[CategoryNode]:
+        return self.by_slug.get(slug)
+
+    def resolve(
+        self, category_slug: str, subcategory_slug: str
+    ) -> Optional[tuple[CategoryNode, SubcategoryNode]]:
+        """(category_slug, subcategory_slug) -> (категория, подгруппа) или None."""
+        ids = self.routes.get((category_slug, subcategory_slug))
+        if ids is None:
+            return None
+        return self.by_subcategory_id[ids[1]]
+
+    def subcategory(self, subcategory_id: Optional[int]) -> Optional[tuple[CategoryNode, SubcategoryNode]]:
+        if subcategory_id is None:
+            return None
+        return self.by_subcategory_id.get(subcategory_id)
+
+
+def build_catalog_snapshot(db: Session) -> CatalogSnapshot:
+    """Построить снимок одним запросом."""
+    rows = (
+        db.query(Category)
+        .options(joinedload(Category.subcategories))
+        .order_by(Category.sort_order, Category.id)
+        .all()
+    )
+
+    categories: list[CategoryNode] = []
+    by_subcategory_id: dict[int, tuple[CategoryNode, SubcategoryNode]] = {}
+    routes: dict[tuple[str, str], tuple[int, int]] = {}
+    first_by_slug: dict[str, SubcategoryNode] = {}
+
+    for cat in rows:
+        subs = tuple(
+            SubcategoryNode(
+                id=sub.id,
+                name=sub.name,
+                slug=sub.slug,
+                sort_order=sub.sort_order,
+                category_id=cat.id,
+                category_slug=cat.slug,
+            )
+            for sub in cat.subcategories
+        )
+        node = CategoryNode(
+            id=cat.id,
+            name=cat.name,
+            slug=cat.slug,
+            icon=cat.icon,
+            sort_order=cat.sort_order,
+            subcategories=subs,
+        )
+        categories.append(node)
+        for sub in subs:
+            by_subcategory_id[sub.id] = (node, sub)
+            routes.setdefault((cat.slug, sub.slug), (cat.id, sub.id))
+
+    # /hx/products/{subcategory_slug} исторически берёт первую подгруппу по id
+    for sub_id in sorted(by_subcategory_id):
+        sub = by_subcategory_id[sub_id][1]
+        first_by_slug.setdefault(sub.slug, sub)
+
+    return CatalogSnapshot(
+        categories=tuple(categories),
+        by_slug=MappingProxyType({c.slug: c for c in categories}),
+        by_subcategory_id=MappingProxyType(by_subcategory_id),
+        routes=MappingProxyType(routes),
+        first_subcategory_by_slug=MappingProxyType(first_by_slug),
+    )
+
+
+_snapshot: Optional[tuple[int, CatalogSnapshot]] = None
+
+
+async def get_catalog(db: AsyncSession) -> CatalogSnapshot:
+    """Снимок для текущего поколения; перестраивается после смены поколения.
+
+    Все вызовы идут из event loop одного воркера, поэтому блокировка не нужна:
+    в худшем случае два конкурентных запроса построят снимок дважды.
+    """
+    global _snapshot
+    generation = current_generation()
+    cached = _snapshot
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+    snapshot = await db.run_sync(build_catalog_snapshot)
+    _snapshot = (generation, snapshot)
+    return snapshot
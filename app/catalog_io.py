@@ -0,0 +1,227 @@
+"""Файлы импорта и экспорта каталога: CSV и XLSX, статус фоновых импортов.
+
+Формат один для обоих направлений — колонки COLUMNS, первая строка
+заголовок. CSV пишется с разделителем «;» и BOM, чтобы Excel открывал
+кириллицу без мастера импорта; при чтении разделитель (; , или табуляция)
+и кодировка (UTF-8 или cp1251) определяются по началу файла.
+
+Строки читаются и пишутся потоком: CSV построчно, XLSX через openpyxl в
+режимах read_only/write_only, так что память не зависит от размера
+каталога. Без openpyxl (requirements.txt) доступен только CSV.
+
+Импорт идёт в фоне, а его состояние лежит в instance/imports/<id>.json:
+опрос прогресса может попасть в любой воркер uvicorn.
+"""
+
+import codecs
+import csv
+import io
+import json
+import os
+import re
+import secrets
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from .database import INSTANCE_DIR
+
+try:
+    import openpyxl
+except ImportError:  # без openpyxl — только CSV
+    openpyxl = None
+
+COLUMNS = (
+    "id", "name", "category", "subcategory", "price", "old_price", "sizes",
+    "color", "description", "image_url", "is_active", "is_new", "is_featured",
+)
+FORMATS = ("csv", "xlsx") if openpyxl is not None else ("csv",)
+
+IMPORT_DIR = INSTANCE_DIR / "imports"
+# Статусы старше недели удаляются при следующем импорте
+JOB_TTL_SECONDS = 7 * 24 * 3600
+MAX_REPORTED_ERRORS = 100
+
+_CSV_DELIMITERS = ";,\t"
+_JOB_ID = re.compile(r"^[0-9a-f]{16}$")
+
+
+def file_format(filename: Optional[str]) -> Optional[str]:
+    """csv/xlsx по расширению; None — формат не поддерживается."""
+    suffix = Path(filename or "").suffix.lower().lstrip(".")
+    return suffix if suffix in FORMATS else None
+
+
+# =============================================================================
+# ЧТЕНИЕ
+# =============================================================================
+
+def _header(values: Iterable) -> list[str]:
+    return [str(value or "").strip().lower() for value in values]
+
+
+def _read_csv(path: Path) -> Iterator[tuple[int, dict, float]]:
+    size = path.stat().st_size or 1
+    with open(path, "rb") as raw:
+        head = raw.read(64 * 1024)
+        try:
+            head.decode("utf-8")
+            encoding = "utf-8-sig"
+        except UnicodeDecodeError as exc:
+            # Обрезанный на границе буфера многобайтный символ — ещё UTF-8
+            encoding = "utf-8-sig" if exc.reason == "unexpected end of data" else "cp1251"
+        first_line = head.split(b"\n", 1)[0].decode(encoding, errors="replace")
+        delimiter = max(_CSV_DELIMITERS, key=first_line.count)
+        raw.seek(0)
+
+        text = io.TextIOWrapper(raw, encoding=encoding, newline="")
+        reader = csv.reader(text, delimiter=delimiter)
+        header = _header(next(reader, []))
+        for values in reader:
+            if not any(value.strip() for value in values):
+                continue
+            # Позиция в байтах — по буферу, с точностью до блока чтения
+            yield reader.line_num, dict(zip(header, values)), min(raw.tell() / size, 1.0)
+
+
+def _read_xlsx(path: Path) -> Iterator[tuple[int, dict, float]]:
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        total = sheet.max_row or 0
+        rows = sheet.iter_rows(values_only=True)
+        header = _header(next(rows, ()))
+        for number, values in enumerate(rows, start=2):
+            if not any(value not in (None, "") for value in values):
+                continue
+            row = {key: "" if value is None else str(value) for key, value in zip(header, values)}
+            yield number, row, min(number / total, 1.0) if total else 0.0
+    finally:
+        workbook.close()
+
+
+def read_rows(path: Path) -> Iterator[tuple[int, dict, float]]:
+    """(номер строки в файле, значения по колонкам, доля прочитанного)."""
+    if file_format(path.name) == "xlsx":
+        return _read_xlsx(path)
+    return _read_csv(path)
+
+
+# =============================================================================
+# ЗАПИСЬ
+# =============================================================================
+
+def csv_stream(rows: Iterable[dict], chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """CSV кусками примерно по chunk_size байт: заголовок, затем строки товаров."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+    buffer.write(codecs.BOM_UTF8.decode())
+    writer.writerow(COLUMNS)
+    for row in rows:
+        writer.writerow(["" if row[key] is None else row[key] for key in COLUMNS])
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def write_xlsx(rows: Iterable[dict], target: BinaryIO) -> None:
+    """XLSX в режиме write_only: строки уходят во временный файл openpyxl, не в память."""
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Товары")
+    sheet.append(COLUMNS)
+    for row in rows:
+        sheet.append([row[key] for key in COLUMNS])
+    workbook.save(target)
+
+
+def file_chunks(path: Path, chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+    """Отдать файл кусками и удалить его после отдачи."""
+    try:
+        with open(path, "rb") as file:
+            while chunk := file.read(chunk_size):
+                yield chunk
+    finally:
+        path.unlink(missing_ok=True)
+
+
+# =============================================================================
+# СТАТУС ИМПОРТА
+# =============================================================================
+
+@dataclass
+class ImportJob:
+    id: str
+    filename: str
+    state: str = "queued"  # queued -> running -> done | failed
+    progress: float = 0.0
+    processed: int = 0
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: list[str] = field(default_factory=list)
+    message: Optional[str] = None
+    started_at: str = field(default_factory=lambda: datetime.now().isoformat(timespec="seconds"))
+    finished_at: Optional[str] = None
+
+    @property
+    def upload_path(self) -> Path:
+        return IMPORT_DIR / f"{self.id}.{file_format(self.filename)}"
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "failed")
+
+    def error(self, line: int, text: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"строка {line}: {text}")
+
+    def finish(self, state: str, message: Optional[str] = None) -> None:
+        self.state = state
+        self.message = message
+        self.finished_at = datetime.now().isoformat(timespec="seconds")
+        if state == "done":
+            self.progress = 1.0
+
+    def save(self) -> None:
+        # Через временный файл: опрос из другого воркера не увидит половину JSON
+        fd, tmp_name = tempfile.mkstemp(dir=IMPORT_DIR, prefix=".job-")
+        with os.fdopen(fd, "w", encoding="utf-8") as tmp:
+            json.dump(asdict(self), tmp, ensure_ascii=False)
+        os.replace(tmp_name, IMPORT_DIR / f"{self.id}.json")
+
+
+def create_job(filename: str, upload: BinaryIO) -> ImportJob:
+    """Сохранить загруженный файл в instance/imports и завести статус."""
+    IMPORT_DIR.mkdir(parents=True, exist_ok=True)
+    _prune_jobs()
+    job = ImportJob(id=secrets.token_hex(8), filename=Path(filename).name)
+    with open(job.upload_path, "wb") as target:
+        while chunk := upload.read(1024 * 1024):
+            target.write(chunk)
+    job.save()
+    return job
+
+
+def load_job(job_id: str) -> Optional[ImportJob]:
+    if not _JOB_ID.match(job_id):
+        return None
+    try:
+        return ImportJob(**json.loads((IMPORT_DIR / f"{job_id}.json").read_text(encoding="utf-8")))
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def _prune_jobs() -> None:
+    cutoff = time.time() - JOB_TTL_SECONDS
+    for path in IMPORT_DIR.iterdir():
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
@@ -16,6 +16,31 @@ class Settings:
     admin_password: str = os.getenv("ADMIN_PASSWORD", "admin123")
     secret_key: str = os.getenv("SECRET_KEY", "change-me-in-production")
     database_url: str = os.getenv("DATABASE_URL", "sqlite:///./instance/shop.db")
+    # Канонический адрес сайта для sitemap.xml и robots.txt (Host запроса не используется)
+    site_url: str = os.getenv("SITE_URL", "http://127.0.0.1:8002").rstrip("/")
+    # production: шаблоны не перепроверяются на диске (auto_reload выключен)
+    environment: str = os.getenv("APP_ENV", "development")
+    # SQLite: профиль соединений (app/sqlite_profile.py)
+    sqlite_journal_mode: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    sqlite_synchronous: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    sqlite_mmap_mb: int = int(os.getenv("SQLITE_MMAP_MB", "256"))
+    sqlite_cache_mb: int = int(os.getenv("SQLITE_CACHE_MB", "32"))
+    sqlite_temp_store: str = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+    sqlite_busy_timeout_ms: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    # Пул соединений на воркер (отдельно для админки и для публичной части)
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    db_pool_timeout: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # PostgreSQL: пересоздавать соединение старше N секунд
+    db_pool_recycle: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    # Лимит дискового кэша уменьшенных фото (instance/img)
+    image_cache_max_bytes: int = int(os.getenv("IMAGE_CACHE_MAX_MB", "256")) * 1024 * 1024
+    # Сколько готовых карточек товаров держать в памяти воркера (0 — без кэша)
+    fragment_cache_size: int = int(os.getenv("FRAGMENT_CACHE_SIZE", "10000"))
+
+    @property
+    def is_production(self) -> bool:
+        return self.environment == "production"
 
 
 @lru_cache
@@ -0,0 +1,387 @@
+"""Фасетный фильтр для /products.
+
+Для активных товаров строится индекс из битовых масок: бит i соответствует
+i-му товару в порядке (created_at DESC, id DESC), у каждого значения фасета
+(размер, цвет, ценовой диапазон, сезон, подгруппа, новинка, скидка) — своя
+маска. Индекс строится двумя запросами в threadpool и живёт до смены
+поколения каталога; пока строится новый, отдаётся индекс прошлого.
+
+Внутри фасета значения объединяются (ИЛИ), между фасетами — пересекаются (И).
+Счётчик значения — число товаров, подходящих под все остальные фасеты и
+это значение, поэтому все счётчики считаются одним проходом по маскам без
+обращений к БД.
+"""
+
+import asyncio
+import bisect
+import functools
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Iterator, Mapping, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+from starlette.concurrency import run_in_threadpool
+
+from .cache import current_generation
+from .catalog import CatalogSnapshot
+from .database import reader_session
+from .models import Product, ProductSize, Subcategory
+from .pagination import PAGE_SIZE, Page, decode_cursor, encode_cursor
+
+logger = logging.getLogger("uvicorn.error")
+
+# (ключ, подпись, нижняя граница включительно, верхняя не включительно)
+PRICE_RANGES = (
+    ("0-5000", "до 5 000 ₽", 0, 5000),
+    ("5000-8000", "5 000 – 8 000 ₽", 5000, 8000),
+    ("8000-12000", "8 000 – 12 000 ₽", 8000, 12000),
+    ("12000-", "от 12 000 ₽", 12000, None),
+)
+
+
+@dataclass(frozen=True)
+class FacetSelection:
+    """Выбранные значения фасетов (из query string /products)."""
+
+    size: frozenset[int] = frozenset()
+    color: frozenset[str] = frozenset()
+    price: frozenset[str] = frozenset()
+    season: frozenset[str] = frozenset()
+    subcategory: frozenset[int] = frozenset()
+    new: bool = False
+    sale: bool = False
+
+    @classmethod
+    def from_params(
+        cls,
+        *,
+        size: Iterable[int] = (),
+        color: Iterable[str] = (),
+        price: Iterable[str] = (),
+        season: Iterable[str] = (),
+        subcategory: Iterable[int] = (),
+        new: bool = False,
+        sale: bool = False,
+    ) -> "FacetSelection":
+        return cls(
+            size=frozenset(size),
+            color=frozenset(_color_key(c) for c in color if c.strip()),
+            price=frozenset(p for p in price if p),
+            season=frozenset(s for s in season if s),
+            subcategory=frozenset(subcategory),
+            new=new,
+            sale=sale,
+        )
+
+    def selected(self, facet: str) -> frozenset:
+        value = getattr(self, facet)
+        if isinstance(value, bool):
+            return frozenset({"1"}) if value else frozenset()
+        return value
+
+    @property
+    def is_empty(self) -> bool:
+        return not any(self.selected(name) for name in FACET_ORDER)
+
+
+@dataclass(frozen=True)
+class FacetValue:
+    value: object
+    label: str
+    count: int
+    selected: bool
+
+
+@dataclass(frozen=True)
+class Facet:
+    name: str
+    title: str
+    values: tuple[FacetValue, ...]
+
+
+FACET_ORDER = ("season", "subcategory", "size", "color", "price", "new", "sale")
+FACET_TITLES = {
+    "season": "Сезон",
+    "subcategory": "Тип обуви",
+    "size": "Размер",
+    "color": "Цвет",
+    "price": "Цена",
+    "new": "Новинки",
+    "sale": "Со скидкой",
+}
+
+
+def _color_key(color: str) -> str:
+    return color.strip().lower().replace("ё", "е")
+
+
+def _price_key(price: float) -> Optional[str]:
+    for key, _label, low, high in PRICE_RANGES:
+        if price >= low and (high is None or price < high):
+            return key
+    return None
+
+
+def _mask(positions: list[int], size: int) -> int:
+    """Битовая маска из номеров битов: через bytearray, без промежуточных int."""
+    buffer = bytearray((size + 7) // 8)
+    for i in positions:
+        buffer[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buffer, "little")
+
+
+@dataclass
+class FacetIndex:
+    """Битовые маски значений фасетов для одного поколения каталога."""
+
+    ids: list[int]
+    created_at: list[datetime]
+    sort_keys: list[tuple[float, int]]
+    masks: dict[str, dict[object, int]]
+    color_labels: dict[str, str]
+    all_bits: int
+
+    @classmethod
+    def build(cls, db: Session, catalog: CatalogSnapshot) -> "FacetIndex":
+        # Запросы через Connection: колонкам не нужна ORM-обработка строк
+        connection = db.connection()
+        rows = connection.execute(
+            select(
+                Product.id,
+                Product.created_at,
+                Product.price,
+                Product.discount_percent,
+                Product.color,
+                Product.is_new,
+                Product.subcategory_id,
+            )
+            .where(Product.is_active.is_(True))
+            .order_by(Product.created_at.desc(), Product.id.desc())
+        ).all()
+
+        # Сначала номера строк по сырым значениям колонок, потом — по значениям
+        # фасетов, и только в конце маски: OR в большое int на каждой строке
+        # копировал бы его целиком, и построение росло бы квадратично
+        by_subcategory: dict[Optional[int], list[int]] = defaultdict(list)
+        by_color: dict[str, list[int]] = defaultdict(list)
+        by_price: dict[Optional[str], list[int]] = defaultdict(list)
+        new: list[int] = []
+        sale: list[int] = []
+        for i, (_id, _created_at, price, discount_percent, color, is_new, subcategory_id) in enumerate(rows):
+            by_subcategory[subcategory_id].append(i)
+            if color:
+                by_color[color].append(i)
+            by_price[_price_key(price)].append(i)
+            if is_new:
+                new.append(i)
+            if discount_percent > 0:
+                sale.append(i)
+
+        positions: dict[str, dict[object, list[int]]] = {name: {} for name in FACET_ORDER}
+        for subcategory_id, indexes in by_subcategory.items():
+            location = catalog.subcategory(subcategory_id)
+            if location:
+                positions["season"].setdefault(location[0].slug, []).extend(indexes)
+                positions["subcategory"][location[1].id] = indexes
+        color_labels: dict[str, str] = {}
+        for color, indexes in by_color.items():
+            if color.strip():
+                key = _color_key(color)
+                color_labels.setdefault(key, color.strip())
+                positions["color"].setdefault(key, []).extend(indexes)
+        positions["price"] = {key: indexes for key, indexes in by_price.items() if key}
+        if new:
+            positions["new"]["1"] = new
+        if sale:
+            positions["sale"]["1"] = sale
+
+        # Только размеры в наличии
+        position = {row.id: i for i, row in enumerate(rows)}
+        for product_id, size in connection.execute(
+            select(ProductSize.product_id, ProductSize.size).where(ProductSize.quantity > 0)
+        ):
+            i = position.get(product_id)
+            if i is not None:
+                positions["size"].setdefault(size, []).append(i)
+
+        masks = {
+            facet: {value: _mask(indexes, len(rows)) for value, indexes in values.items()}
+            for facet, values in positions.items()
+        }
+        return cls(
+            ids=[row.id for row in rows],
+            created_at=[row.created_at for row in rows],
+            sort_keys=[(-row.created_at.timestamp(), -row.id) for row in rows],
+            masks=masks,
+            color_labels=color_labels,
+            all_bits=(1 << len(rows)) - 1,
+        )
+
+    # -------------------------------------------------------------------------
+    def _facet_bits(self, facet: str, selection: FacetSelection) -> int:
+        chosen = selection.selected(facet)
+        if not chosen:
+            return self.all_bits
+        bits = 0
+        for value in chosen:
+            bits |= self.masks[facet].get(value, 0)
+        return bits
+
+    def evaluate(self, selection: FacetSelection, catalog: CatalogSnapshot) -> tuple[int, list[Facet]]:
+        """Маска результата и все фасеты со счётчиками за один проход."""
+        per_facet = {name: self._facet_bits(name, selection) for name in FACET_ORDER}
+        result = self.all_bits
+        for bits in per_facet.values():
+            result &= bits
+
+        facets = []
+        for name in FACET_ORDER:
+            # Пересечение всех фасетов, кроме текущего
+            others = self.all_bits
+            for other, bits in per_facet.items():
+                if other != name:
+                    others &= bits
+            chosen = selection.selected(name)
+            values = [
+                FacetValue(value, self._label(name, value, catalog), (others & mask).bit_count(), value in chosen)
+                for value, mask in self._ordered_values(name, catalog)
+            ]
+            values = [v for v in values if v.count or v.selected]
+            if values:
+                facets.append(Facet(name=name, title=FACET_TITLES[name], values=tuple(values)))
+        return result, facets
+
+    def _ordered_values(self, facet: str, catalog: CatalogSnapshot) -> Iterator[tuple[object, int]]:
+        masks = self.masks[facet]
+        if facet == "season":
+            keys = [c.slug for c in catalog.categories]
+        elif facet == "subcategory":
+            keys = [s.id for c in catalog.categories for s in c.subcategories]
+        elif facet == "price":
+            keys = [key for key, *_ in PRICE_RANGES]
+        elif facet == "color":
+            keys = sorted(masks, key=lambda k: (-masks[k].bit_count(), k))
+        else:
+            keys = sorted(masks)
+        for key in keys:
+            if key in masks:
+                yield key, masks[key]
+
+    def _label(self, facet: str, value: object, catalog: CatalogSnapshot) -> str:
+        if facet == "season":
+            category = catalog.category(value)
+            return f"{category.icon} {category.name}" if category else str(value)
+        if facet == "subcategory":
+            location = catalog.subcategory(value)
+            return f"{location[1].name} ({location[0].name.split()[0].lower()})" if location else str(value)
+        if facet == "color":
+            return self.color_labels.get(value, str(value))
+        if facet == "price":
+            return next(label for key, label, *_ in PRICE_RANGES if key == value)
+        if facet in ("new", "sale"):
+            return FACET_TITLES[facet]
+        return str(value)
+
+    def page_ids(self, result: int, cursor: Optional[str], limit: int = PAGE_SIZE) -> tuple[list[int], int, Optional[str]]:
+        """id товаров страницы в порядке (created_at, id) DESC и курсор следующей."""
+        position = decode_cursor(cursor)
+        start = 0
+        offset = 0
+        if position is not None:
+            start = bisect.bisect_right(self.sort_keys, (-position.created_at.timestamp(), -position.id))
+            offset = position.offset
+
+        picked: list[int] = []
+        remaining = result >> start
+        index = start
+        while remaining and len(picked) <= limit:
+            low = remaining & -remaining
+            shift = low.bit_length() - 1
+            index += shift
+            picked.append(index)
+            remaining >>= shift + 1
+            index += 1
+
+        next_cursor = None
+        if len(picked) > limit:
+            picked = picked[:limit]
+            last = picked[-1]
+            next_cursor = encode_cursor(self.created_at[last], self.ids[last], offset + len(picked))
+        return [self.ids[i] for i in picked], offset, next_cursor
+
+
+_index: Optional[tuple[int, FacetIndex]] = None
+_building: dict[int, asyncio.Future] = {}
+
+
+def _build_index(catalog: CatalogSnapshot) -> FacetIndex:
+    with reader_session() as db:
+        return FacetIndex.build(db, catalog)
+
+
+def _store_index(generation: int, task: asyncio.Future) -> None:
+    global _index
+    _building.pop(generation, None)
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        # Следующий запрос попробует снова; пока отдаётся прежний индекс
+        logger.error("Фасетный индекс поколения %d не построен", generation, exc_info=error)
+        return
+    cached = _index
+    if cached is None or cached[0] < generation:
+        _index = (generation, task.result())
+
+
+async def get_facet_index(catalog: CatalogSnapshot) -> tuple[FacetIndex, bool]:
+    """Индекс для текущего поколения каталога и признак того, что он устарел.
+
+    Строится в threadpool на синхронной сессии, не занимая event loop.
+    Пока новый индекс строится, запросы получают индекс прошлого
+    поколения (признак True); ждёт построения только первый запрос воркера.
+    """
+    generation = current_generation()
+    cached = _index
+    if cached is not None and cached[0] == generation:
+        return cached[1], False
+    task = _building.get(generation)
+    if task is None:
+        task = asyncio.ensure_future(run_in_threadpool(_build_index, catalog))
+        _building[generation] = task
+        task.add_done_callback(functools.partial(_store_index, generation))
+    if cached is not None:
+        return cached[1], True
+    return await asyncio.shield(task), False
+
+
+async def facet_page(
+    db: AsyncSession,
+    catalog: CatalogSnapshot,
+    selection: FacetSelection,
+    cursor: Optional[str],
+) -> tuple[Page, list[Facet], int, bool]:
+    """Страница товаров, фасеты со счётчиками, общее число найденного и
+    признак выборки по устаревшему индексу (такую страницу не кэшируют)."""
+    index, stale = await get_facet_index(catalog)
+    result, facets = index.evaluate(selection, catalog)
+    ids, offset, next_cursor = index.page_ids(result, cursor)
+
+    items: list[Product] = []
+    if ids:
+        loaded = (
+            await db.scalars(
+                select(Product)
+                .options(joinedload(Product.subcategory).joinedload(Subcategory.category))
+                # Устаревший индекс может ещё помнить снятый с продажи товар
+                .where(Product.id.in_(ids), Product.is_active.is_(True))
+            )
+        ).all()
+        by_id: Mapping[int, Product] = {p.id: p for p in loaded}
+        items = [by_id[i] for i in ids if i in by_id]
+
+    return Page(items=items, offset=offset, next_cursor=next_cursor), facets, result.bit_count(), stale
@@ -0,0 +1,107 @@
+"""Кэш готового HTML карточек товаров.
+
+Карточка зависит только от самого товара (и его подгруппы), поэтому
+её HTML хранится по ключу (id товара, вид карточки) вместе с версией —
+products.updated_at и показанными полями подгруппы и категории. Страница списка из 24+ товаров собирается из
+готовых строк, а шаблон карточки рендерится только для изменённых.
+
+В шаблоне:
+
+    {% call cached_card("catalog", product) %} ...разметка... {% endcall %}
+
+То, что зависит от места карточки в списке (позиция, задержка
+анимации), остаётся снаружи блока.
+
+Админка после записи вызывает invalidate(product_id) в своём воркере;
+остальные воркеры увидят новую updated_at и перерисуют карточку сами,
+так что устаревший HTML не отдаётся ни в одном процессе.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+from markupsafe import Markup
+from sqlalchemy import inspect
+
+from .config import settings
+from .models import Product
+
+
+class FragmentCache:
+    """LRU по (id товара, вид карточки) -> (версия, HTML)."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[int, str], tuple[Hashable, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, product_id: int, kind: str, version: Hashable, render: Callable[[], str]) -> Markup:
+        if self.max_entries <= 0:
+            return Markup(render())
+        key = (product_id, kind)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return Markup(cached[1])
+            self.misses += 1
+
+        # Рендер вне блокировки: параллельные промахи просто перерисуют одно и то же
+        html = str(render())
+        with self._lock:
+            self._entries[key] = (version, html)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return Markup(html)
+
+    def invalidate(self, product_id: int) -> None:
+        """Забыть все виды карточек товара."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == product_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# В разработке шаблоны перечитываются с диска, и кэш карточек мешал бы видеть правки
+fragments = FragmentCache(settings.fragment_cache_size if settings.is_production else 0)
+
+
+def _card_version(product: Product) -> tuple:
+    """updated_at товара и то, что карточка показывает из подгруппы и категории.
+
+    Переименование подгруппы или категории и перенос подгруппы не меняют
+    products.updated_at, поэтому их поля входят в версию. Подгруппа
+    учитывается, только если загружена вместе с товаром: без неё карточка
+    её и не показывает, а ленивая загрузка в async-сессии недоступна.
+    """
+    place = None
+    if "subcategory" not in inspect(product).unloaded and product.subcategory is not None:
+        subcategory = product.subcategory
+        category = subcategory.category if "category" not in inspect(subcategory).unloaded else None
+        place = (
+            subcategory.id,
+            subcategory.name,
+            subcategory.slug,
+            (category.id, category.name, category.slug, category.icon) if category is not None else None,
+        )
+    return product.updated_at or product.created_at, place
+
+
+def cached_card(kind: str, product: Product, caller: Callable[[], str]) -> Markup:
+    """Jinja2: {% call cached_card(kind, product) %} — тело блока кэшируется."""
+    return fragments.get_or_render(product.id, kind, _card_version(product), caller)
+
+
+def register_globals(env) -> None:
+    env.globals["cached_card"] = cached_card
@@ -0,0 +1,245 @@
+"""Хранилище фото товаров с адресацией по содержимому.
+
+Загрузка потоком пишется во временный файл и одновременно хешируется
+(SHA-256), затем атомарно переименовывается в
+
+    static/images/store/{первые 2 символа хеша}/{хеш}{ext}
+
+Одинаковые файлы хранятся один раз, имя файла никогда не меняет
+содержимое — такие URL можно кэшировать навсегда (immutable).
+Файл может понадобиться нескольким товарам, поэтому удаляется только
+тогда, когда на него не осталось ссылок в products.image_url и он старше
+GC_GRACE_SECONDS: при освобождении (release_image) или сборщиком мусора
+(collect_garbage). Старые фото вне хранилища не удаляются никогда.
+
+Запуск из консоли:
+
+    python -m app.image_store gc --dry-run
+    python -m app.image_store adopt     # перенести старые фото в хранилище
+"""
+
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .models import Product
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+STORE_DIR = BASE_DIR / "static" / "images" / "store"
+STORE_URL = "/static/images/store/"
+
+ALLOWED_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+CHUNK_SIZE = 1024 * 1024
+
+# Загрузка уже лежит в хранилище, но товар ещё не закоммичен: не трогаем свежие файлы
+GC_GRACE_SECONDS = 3600
+GC_BATCH_SIZE = 500
+
+
+def normalize_extension(filename: Optional[str]) -> str:
+    ext = Path(filename).suffix.lower() if filename else ""
+    if ext == ".jpeg":
+        return ".jpg"
+    return ext if ext in ALLOWED_EXTENSIONS else ".jpg"
+
+
+def store_path(digest: str, ext: str) -> Path:
+    return STORE_DIR / digest[:2] / f"{digest}{ext}"
+
+
+def store_url(digest: str, ext: str) -> str:
+    return f"{STORE_URL}{digest[:2]}/{digest}{ext}"
+
+
+def is_store_url(url: Optional[str]) -> bool:
+    return bool(url) and url.startswith(STORE_URL)
+
+
+def url_to_path(url: str) -> Path:
+    return BASE_DIR / url.lstrip("/")
+
+
+def store_stream(stream: BinaryIO, ext: str) -> str:
+    """Сохранить поток в хранилище и вернуть URL; дубликат не пишется повторно."""
+    STORE_DIR.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_name = tempfile.mkstemp(dir=STORE_DIR, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            while chunk := stream.read(CHUNK_SIZE):
+                digest.update(chunk)
+                tmp.write(chunk)
+        hexdigest = digest.hexdigest()
+        target = store_path(hexdigest, ext)
+        if target.exists():
+            os.unlink(tmp_name)
+            # Ссылка на файл появится только после commit товара: grace period
+            # release_image и collect_garbage должен начаться заново
+            os.utime(target)
+        else:
+            target.parent.mkdir(exist_ok=True)
+            os.chmod(tmp_name, 0o644)
+            os.replace(tmp_name, target)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    return store_url(hexdigest, ext)
+
+
+# =============================================================================
+# ССЫЛКИ И СБОРКА МУСОРА
+# =============================================================================
+
+def reference_count(db: Session, url: str) -> int:
+    return db.execute(select(func.count()).where(Product.image_url == url)).scalar_one()
+
+
+def release_image(db: Session, url: Optional[str], *, grace_seconds: int = GC_GRACE_SECONDS) -> bool:
+    """Удалить файл хранилища, если на него больше не ссылается ни один товар.
+
+    Вызывается после commit, когда ссылка уже снята. Старые фото вне
+    хранилища не трогает. Файл моложе grace_seconds оставляет сборщику
+    мусора, как и collect_garbage: его могла только что записать
+    параллельная загрузка того же содержимого, ещё не закоммиченная.
+    Возвращает True, если файл удалён.
+    """
+    if not is_store_url(url):
+        return False
+    if reference_count(db, url):
+        return False
+    path = url_to_path(url)
+    try:
+        if path.stat().st_mtime >= time.time() - grace_seconds:
+            return False
+    except FileNotFoundError:
+        return False
+    path.unlink(missing_ok=True)
+    return True
+
+
+def _store_files() -> Iterator[Path]:
+    if not STORE_DIR.exists():
+        return
+    for bucket in sorted(STORE_DIR.iterdir()):
+        if bucket.is_dir():
+            yield from sorted(p for p in bucket.iterdir() if p.is_file())
+
+
+def _batches(files: Iterator[Path], size: int) -> Iterator[list[Path]]:
+    batch: list[Path] = []
+    for file in files:
+        batch.append(file)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@dataclass
+class GcResult:
+    scanned: int = 0
+    removed: int = 0
+    freed_bytes: int = 0
+    temp_removed: int = 0
+
+
+def collect_garbage(
+    db: Session,
+    *,
+    batch_size: int = GC_BATCH_SIZE,
+    grace_seconds: int = GC_GRACE_SECONDS,
+    dry_run: bool = False,
+) -> GcResult:
+    """Удалить файлы хранилища без ссылок; ссылки проверяются пачками по batch_size."""
+    result = GcResult()
+    cutoff = time.time() - grace_seconds
+
+    # Брошенные временные файлы от прерванных загрузок
+    if STORE_DIR.exists():
+        for tmp in STORE_DIR.glob(".upload-*"):
+            if tmp.stat().st_mtime < cutoff:
+                result.temp_removed += 1
+                if not dry_run:
+                    tmp.unlink(missing_ok=True)
+
+    for batch in _batches(_store_files(), batch_size):
+        result.scanned += len(batch)
+        urls = {f"{STORE_URL}{p.parent.name}/{p.name}": p for p in batch}
+        referenced = set(
+            db.scalars(select(Product.image_url).where(Product.image_url.in_(urls)).distinct())
+        )
+        for url, path in urls.items():
+            if url in referenced:
+                continue
+            stat = path.stat()
+            if stat.st_mtime >= cutoff:
+                continue
+            result.removed += 1
+            result.freed_bytes += stat.st_size
+            if not dry_run:
+                path.unlink(missing_ok=True)
+    return result
+
+
+def adopt_legacy_images(db: Session) -> tuple[int, int]:
+    """Перевести товары со старыми путями (/static/images/products/...) на хранилище.
+
+    Старые файлы не удаляются: они лежат в репозитории и раскладываются
+    deploy_images.sh. Возвращает (товаров переведено, уникальных файлов).
+    """
+    adopted = 0
+    urls: set[str] = set()
+    products = db.scalars(
+        select(Product).where(Product.image_url.like("/static/images/products/%"))
+    ).all()
+    for product in products:
+        path = url_to_path(product.image_url)
+        if not path.is_file():
+            continue
+        with open(path, "rb") as stream:
+            url = store_stream(stream, normalize_extension(path.name))
+        product.image_url = url
+        urls.add(url)
+        adopted += 1
+    db.commit()
+    return adopted, len(urls)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    from .cache import bump_generation
+    from .database import db_session
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    gc = commands.add_parser("gc", help="удалить фото без ссылок")
+    gc.add_argument("--dry-run", action="store_true")
+    gc.add_argument("--batch-size", type=int, default=GC_BATCH_SIZE)
+    gc.add_argument("--grace", type=int, default=GC_GRACE_SECONDS, help="не трогать файлы моложе, сек.")
+    commands.add_parser("adopt", help="перенести фото со старыми путями в хранилище")
+    args = parser.parse_args(argv)
+
+    with db_session() as db:
+        if args.command == "gc":
+            result = collect_garbage(db, batch_size=args.batch_size, grace_seconds=args.grace, dry_run=args.dry_run)
+            action = "будет удалено" if args.dry_run else "удалено"
+            print(
+                f"Проверено файлов: {result.scanned}, {action}: {result.removed} "
+                f"({result.freed_bytes / 1024:.0f} КБ), временных: {result.temp_removed}"
+            )
+        else:
+            adopted, unique = adopt_legacy_images(db)
+            bump_generation()
+            print(f"Переведено товаров: {adopted}, уникальных файлов: {unique}")
+
+
+if __name__ == "__main__":
+    main()
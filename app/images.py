@@ -0,0 +1,257 @@
+"""Ресайз фото товаров по запросу: /img/{width}/{path}.
+
+Оригиналы лежат в static/images, уменьшенные копии — в instance/img
+по тому же пути, что и URL, с расширением формата на конце:
+
+    /img/320/products/zimnyaya/sapogi/a.jpg -> instance/img/320/products/zimnyaya/sapogi/a.jpg.webp
+
+Формат выбирается по заголовку Accept (AVIF, затем WebP, иначе JPEG),
+поэтому nginx может отдавать готовые файлы сам через try_files, а в
+приложение приходят только промахи. Кэш ограничен по размеру
+(settings.image_cache_max_bytes, на все воркеры вместе) и вытесняет
+давно не запрошенные файлы; при сканировании порядок восстанавливается
+по atime/mtime, так что учитываются и попадания, отданные nginx (если
+ФС ведёт atime).
+"""
+
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+from starlette.concurrency import run_in_threadpool
+
+from .config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+BASE_DIR = Path(__file__).resolve().parent
+IMAGES_ROOT = (BASE_DIR.parent / "static" / "images").resolve()
+CACHE_DIR = BASE_DIR.parent / "instance" / "img"
+
+STATIC_PREFIX = "/static/images/"
+
+# Разрешённые ширины: произвольная ширина из URL не должна раздувать кэш
+WIDTHS = (160, 320, 480, 640, 960)
+CARD_SIZES = "(max-width: 480px) 100vw, (max-width: 768px) 50vw, 260px"
+
+_SOURCE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp")
+
+
+@dataclass(frozen=True)
+class OutputFormat:
+    ext: str
+    media_type: str
+    pil_format: str
+    options: tuple[tuple[str, object], ...]
+
+
+AVIF = OutputFormat("avif", "image/avif", "AVIF", (("quality", 55), ("speed", 8)))
+WEBP = OutputFormat("webp", "image/webp", "WEBP", (("quality", 80), ("method", 4)))
+JPEG = OutputFormat("jpg", "image/jpeg", "JPEG", (("quality", 82), ("optimize", True), ("progressive", True)))
+
+
+class ImageNotFound(Exception):
+    """Нет такого оригинала, ширина не из списка или файл не читается."""
+
+
+def negotiate_format(accept: str) -> OutputFormat:
+    if "image/avif" in accept:
+        return AVIF
+    if "image/webp" in accept:
+        return WEBP
+    return JPEG
+
+
+def resolve_source(path: str) -> Path:
+    """Путь из URL -> файл оригинала внутри static/images."""
+    source = (IMAGES_ROOT / path).resolve()
+    if not source.is_relative_to(IMAGES_ROOT) or source.suffix.lower() not in _SOURCE_SUFFIXES:
+        raise ImageNotFound(path)
+    if not source.is_file():
+        raise ImageNotFound(path)
+    return source
+
+
+def variant_path(width: int, path: str, fmt: OutputFormat) -> Path:
+    return CACHE_DIR / str(width) / f"{path}.{fmt.ext}"
+
+
+# =============================================================================
+# LRU-КЭШ НА ДИСКЕ
+# =============================================================================
+
+class DiskLRU:
+    """Учёт файлов кэша и вытеснение самых старых при превышении лимита.
+
+    Каталог общий для воркеров, а учёт у каждого свой. Поэтому перед
+    вытеснением каталог пересканируется (не чаще RESCAN_SECONDS): лимит
+    соблюдается для всех воркеров вместе, а не для каждого отдельно.
+    Методы обходят диск — вызывать из threadpool.
+    """
+
+    RESCAN_SECONDS = 60
+
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Path, int] = OrderedDict()
+        self._total = 0
+        self._loaded = False
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self) -> None:
+        found = []
+        if self.root.exists():
+            for file in self.root.rglob("*"):
+                if file.is_file() and not file.name.startswith("."):
+                    try:
+                        st = file.stat()
+                    except FileNotFoundError:  # вытеснен другим воркером
+                        continue
+                    found.append((max(st.st_atime, st.st_mtime), file, st.st_size))
+        self._entries.clear()
+        self._total = 0
+        for _used, file, size in sorted(found):
+            self._entries[file] = size
+            self._total += size
+        self._loaded = True
+        self._scanned_at = time.monotonic()
+
+    def touch(self, path: Path) -> None:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if path in self._entries:
+                self._entries.move_to_end(path)
+
+    def add(self, path: Path, size: int) -> None:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self._total += size - self._entries.pop(path, 0)
+            self._entries[path] = size
+            if self._total > self.max_bytes and time.monotonic() - self._scanned_at >= self.RESCAN_SECONDS:
+                # Учесть файлы других воркеров; новый файл уже на диске и попадёт в конец
+                self._load()
+                self._entries.move_to_end(path)
+            evicted = self._evict()
+        for old in evicted:
+            old.unlink(missing_ok=True)
+
+    def _evict(self) -> list[Path]:
+        evicted = []
+        # Только что записанный файл не вытесняем, даже если он один больше лимита
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            old, size = self._entries.popitem(last=False)
+            self._total -= size
+            evicted.append(old)
+        return evicted
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+
+cache = DiskLRU(CACHE_DIR, settings.image_cache_max_bytes)
+
+
+# =============================================================================
+# РЕСАЙЗ
+# =============================================================================
+
+def render_variant(source: Path, target: Path, width: int, fmt: OutputFormat) -> int:
+    """Уменьшить до width (без увеличения), перекодировать и атомарно записать."""
+    try:
+        with Image.open(source) as original:
+            image = ImageOps.exif_transpose(original)
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                image = image.resize((width, height), Image.Resampling.LANCZOS)
+            if fmt is JPEG:
+                image = image.convert("RGB")
+            elif image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "A" in image.mode or "transparency" in image.info else "RGB")
+
+            target.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=target.parent, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as tmp:
+                    image.save(tmp, fmt.pil_format, **dict(fmt.options))
+                os.replace(tmp_name, target)
+            except BaseException:
+                Path(tmp_name).unlink(missing_ok=True)
+                raise
+    except (UnidentifiedImageError, OSError) as exc:
+        logger.warning("Не удалось обработать %s: %s", source, exc)
+        raise ImageNotFound(str(source)) from exc
+    return target.stat().st_size
+
+
+_inflight: dict[Path, asyncio.Future] = {}
+
+
+async def image_variant(width: int, path: str, accept: str) -> tuple[Path, OutputFormat]:
+    """Готовый файл нужной ширины и формата; при промахе рендерит его один раз."""
+    if width not in WIDTHS:
+        raise ImageNotFound(path)
+    source = resolve_source(path)
+    fmt = negotiate_format(accept)
+    target = variant_path(width, source.relative_to(IMAGES_ROOT).as_posix(), fmt)
+
+    try:
+        fresh = target.stat().st_mtime >= source.stat().st_mtime
+    except FileNotFoundError:
+        fresh = False
+    if fresh:
+        # Первое обращение сканирует весь каталог кэша — не в event loop
+        await run_in_threadpool(cache.touch, target)
+        return target, fmt
+
+    # Параллельные промахи по одному файлу ждут один рендер
+    task = _inflight.get(target)
+    if task is None:
+        task = asyncio.ensure_future(run_in_threadpool(render_variant, source, target, width, fmt))
+        _inflight[target] = task
+        task.add_done_callback(lambda _: _inflight.pop(target, None))
+    size = await asyncio.shield(task)
+    await run_in_threadpool(cache.add, target, size)
+    return target, fmt
+
+
+# =============================================================================
+# JINJA2
+# =============================================================================
+
+def _relative(url: Optional[str]) -> Optional[str]:
+    if url and url.startswith(STATIC_PREFIX):
+        return quote(url[len(STATIC_PREFIX):])
+    return None
+
+
+def image_url(url: Optional[str], width: int) -> Optional[str]:
+    """URL уменьшенной копии; внешние и пустые URL возвращаются как есть."""
+    relative = _relative(url)
+    return f"/img/{width}/{relative}" if relative else url
+
+
+def image_srcset(url: Optional[str], widths: tuple[int, ...] = WIDTHS) -> str:
+    relative = _relative(url)
+    if not relative:
+        return ""
+    return ", ".join(f"/img/{w}/{relative} {w}w" for w in widths)
+
+
+def register_filters(env) -> None:
+    env.filters["image_url"] = image_url
+    env.filters["image_srcset"] = image_srcset
+    env.globals["CARD_IMAGE_SIZES"] = CARD_SIZES
@@ -1,18 +1,31 @@
-import json
 import logging
+import time
 from pathlib import Path
 from typing import List
+from urllib.parse import urlencode
 
-from fastapi import Depends, FastAPI, Request
-from fastapi.responses import HTMLResponse, PlainTextResponse, Response
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session, joinedload
+from fastapi import Depends, FastAPI, Query, Request
+from fastapi.responses import FileResponse, HTMLResponse, PlainTextResponse, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from starlette.concurrency import run_in_threadpool
 
 from .admin import router as admin_router
-from .database import get_db, init_db
-from .models import Category, Subcategory, Product, Promotion
-from .seo import generate_sitemap_xml
+from .assets import AssetFiles, ensure_assets
+from .cache import page_cache
+from .catalog import get_catalog
+from .config import settings
+from .database import async_engine, get_async_db
+from .facets import FACET_ORDER, FacetSelection, facet_page
+from .images import ImageNotFound, image_variant
+from .models import Subcategory, Product, Promotion
+from .pagination import SORT_DISCOUNT, SORT_NEW, Page, paginate_products
+from .schema import check_schema
+from .search import build_match_query, ranked_products
+from .seo import get_sitemaps, sitemap_index_xml
+from .stats import get_catalog_stats
+from .templating import precompile_templates, templates
 
 
 BASE_DIR = Path(__file__).resolve().parent
@@ -21,71 +34,60 @@ app = FastAPI(title="Женская кожаная обувь в Перми —
 logger = logging.getLogger("uvicorn.error")
 
 static_dir = BASE_DIR.parent / "static"
-templates_dir = BASE_DIR / "templates"
 
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
-templates = Jinja2Templates(directory=str(templates_dir))
+app.mount("/static", AssetFiles(directory=static_dir), name="static")
 
 
-# Jinja2 фильтры
-def parse_sizes(sizes_json: str | None) -> List[int]:
-    """Парсинг JSON размеров."""
-    if not sizes_json:
-        return []
-    try:
-        return json.loads(sizes_json)
-    except (json.JSONDecodeError, TypeError):
-        return []
-
-
-def from_json(value: str | None) -> list | dict | None:
-    """Универсальный парсинг JSON."""
-    if not value:
-        return []
-    try:
-        return json.loads(value)
-    except (json.JSONDecodeError, TypeError):
-        return []
-
-
-templates.env.filters["parse_sizes"] = parse_sizes
-templates.env.filters["from_json"] = from_json
-
 # Подключаем админ-панель
 app.include_router(admin_router)
 
 
 @app.on_event("startup")
 def on_startup() -> None:
-    init_db()
+    # Только проверка ревизии: миграции применяет деплой (python -m app.schema upgrade)
+    logger.info("Схема БД: ревизия %s", check_schema())
+    ensure_assets()
+    started = time.perf_counter()
+    count = precompile_templates()
+    logger.info("Шаблоны скомпилированы: %d за %.0f мс", count, (time.perf_counter() - started) * 1000)
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    # Соединения asyncpg привязаны к event loop — закрываем их вместе с ним
+    await async_engine.dispose()
+
+
+@app.middleware("http")
+async def cached_pages(request: Request, call_next):
+    """Публичные страницы из кэша, пока не сменилось поколение каталога."""
+    return await page_cache.serve(request, call_next)
 
 
 # =============================================================================
 # ГЛАВНАЯ
 # =============================================================================
 @app.get("/", response_class=HTMLResponse)
-def read_index(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
-    categories = (
-        db.query(Category)
-        .options(joinedload(Category.subcategories))
-        .order_by(Category.sort_order)
-        .all()
-    )
+async def read_index(request: Request, db: AsyncSession = Depends(get_async_db)) -> HTMLResponse:
+    categories = (await get_catalog(db)).categories
+    stats = await get_catalog_stats(db)
 
     # Активные акции для баннера
     promotions = (
-        db.query(Promotion)
-        .filter(Promotion.is_active.is_(True))
-        .order_by(Promotion.start_date.desc())
-        .limit(1)
-        .all()
-    )
+        await db.scalars(
+            select(Promotion)
+            .where(Promotion.is_active.is_(True))
+            .order_by(Promotion.start_date.desc())
+            .limit(1)
+        )
+    ).all()
 
     return templates.TemplateResponse(
         "index.html",
         {
             "request": request,
             "categories": categories,
+            "stats": stats,
             "promotions": promotions,
             "page_title": "Женская кожаная обувь в Перми — ТЦ «Алмаз»",
             "meta_description": "Магазин женской кожаной обуви в Перми. Зимняя, демисезонная и летняя обувь из натуральной кожи. ТЦ «Алмаз», ул. Куйбышева, 37.",
@@ -94,47 +96,72 @@ def read_index(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
 
 
 # =============================================================================
-# ВСЕ ТОВАРЫ / ФИЛЬТР ПО РАЗМЕРУ
+# ВСЕ ТОВАРЫ / ФАСЕТНЫЙ ФИЛЬТР
 # =============================================================================
 @app.get("/products", response_class=HTMLResponse)
-def products_page(
+async def products_page(
     request: Request,
-    size: int | None = None,
-    db: Session = Depends(get_db),
+    size: List[int] = Query([]),
+    color: List[str] = Query([]),
+    price: List[str] = Query([]),
+    season: List[str] = Query([]),
+    subcategory: List[int] = Query([]),
+    new: bool = False,
+    sale: bool = False,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
 ) -> HTMLResponse:
-    all_categories = db.query(Category).options(joinedload(Category.subcategories)).order_by(Category.sort_order).all()
-
-    products = (
-        db.query(Product)
-        .options(joinedload(Product.subcategory).joinedload(Subcategory.category))
-        .filter(Product.is_active.is_(True))
-        .order_by(Product.created_at.desc())
-        .all()
-    )
+    catalog = await get_catalog(db)
+    selection = FacetSelection.from_params(
+        size=size, color=color, price=price, season=season,
+        subcategory=subcategory, new=new, sale=sale,
+    )
+    page, facets, total, stale = await facet_page(db, catalog, selection, cursor)
+    if stale:
+        # Выборка по индексу прошлого поколения: в кэш страниц её не кладём
+        request.state.skip_page_cache = True
+
+    if cursor and _is_htmx(request):
+        return _product_list_fragment(request, page, "catalog")
+
+    context = {
+        "request": request,
+        **_listing_context(request, page, "catalog"),
+        "facets": facets,
+        "selection": selection,
+        "total": total,
+    }
 
-    if size is not None:
-        filtered: list[Product] = []
-        for product in products:
-            sizes = from_json(product.sizes_json)
-            if isinstance(sizes, list) and any(int(s) == size for s in sizes if s is not None):
-                filtered.append(product)
-        products = filtered
-
-    list_title = f"Размер {size}" if size is not None else "Все товары"
-    list_subtitle = "Доступные модели с выбранным размером" if size is not None else "Все модели в наличии"
-    page_title = f"Обувь размера {size} — ТЦ «Алмаз», Пермь" if size is not None else "Каталог обуви — ТЦ «Алмаз», Пермь"
-    meta_description = (
-        f"Женская кожаная обувь размера {size} в наличии. ТЦ «Алмаз», ул. Куйбышева, 37."
-        if size is not None
-        else "Каталог женской кожаной обуви в Перми: зимняя, демисезонная, летняя. ТЦ «Алмаз»."
-    )
+    # Смена фильтра из формы: заменяется только блок фасетов и сетки
+    if _is_htmx(request) and request.headers.get("HX-Target") == "catalog-results":
+        return templates.TemplateResponse("partials/catalog_results.html", context)
+
+    # Ссылки вида /products?size=37 сохраняют прежние заголовки
+    only_size = len(size) == 1 and selection.size and not any(
+        selection.selected(name) for name in FACET_ORDER if name != "size"
+    )
+    if only_size:
+        size_value = size[0]
+        list_title = f"Размер {size_value}"
+        list_subtitle = "Доступные модели с выбранным размером"
+        page_title = f"Обувь размера {size_value} — ТЦ «Алмаз», Пермь"
+        meta_description = f"Женская кожаная обувь размера {size_value} в наличии. ТЦ «Алмаз», ул. Куйбышева, 37."
+    elif selection.is_empty:
+        list_title = "Все товары"
+        list_subtitle = "Все модели в наличии"
+        page_title = "Каталог обуви — ТЦ «Алмаз», Пермь"
+        meta_description = "Каталог женской кожаной обуви в Перми: зимняя, демисезонная, летняя. ТЦ «Алмаз»."
+    else:
+        list_title = "Подбор обуви"
+        list_subtitle = "Модели по выбранным фильтрам"
+        page_title = "Подбор обуви по фильтрам — ТЦ «Алмаз», Пермь"
+        meta_description = "Женская кожаная обувь в наличии: фильтр по сезону, размеру, цвету и цене. ТЦ «Алмаз»."
 
     return templates.TemplateResponse(
         "products_list.html",
         {
-            "request": request,
-            "categories": all_categories,
-            "products": products,
+            **context,
+            "categories": catalog.categories,
             "list_title": list_title,
             "list_subtitle": list_subtitle,
             "list_icon": "📏",
@@ -148,23 +175,28 @@ def products_page(
 # АКТУАЛЬНЫЕ ТОВАРЫ
 # =============================================================================
 @app.get("/featured", response_class=HTMLResponse)
-def featured_page(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
-    all_categories = db.query(Category).options(joinedload(Category.subcategories)).order_by(Category.sort_order).all()
+async def featured_page(
+    request: Request,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+) -> HTMLResponse:
+    all_categories = (await get_catalog(db)).categories
 
-    products = (
-        db.query(Product)
+    query = (
+        select(Product)
         .options(joinedload(Product.subcategory).joinedload(Subcategory.category))
-        .filter(Product.is_active.is_(True), Product.is_featured.is_(True))
-        .order_by(Product.created_at.desc())
-        .all()
+        .where(Product.is_active.is_(True), Product.is_featured.is_(True))
     )
+    page = await paginate_products(db, query, cursor)
+    if cursor and _is_htmx(request):
+        return _product_list_fragment(request, page, "catalog")
 
     return templates.TemplateResponse(
         "products_list.html",
         {
             "request": request,
             "categories": all_categories,
-            "products": products,
+            **_listing_context(request, page, "catalog"),
             "list_title": "Актуальные модели",
             "list_subtitle": "Популярные и рекомендуемые модели сезона",
             "list_icon": "⭐",
@@ -178,23 +210,28 @@ def featured_page(request: Request, db: Session = Depends(get_db)) -> HTMLRespon
 # НОВИНКИ
 # =============================================================================
 @app.get("/new", response_class=HTMLResponse)
-def new_page(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
-    all_categories = db.query(Category).options(joinedload(Category.subcategories)).order_by(Category.sort_order).all()
+async def new_page(
+    request: Request,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+) -> HTMLResponse:
+    all_categories = (await get_catalog(db)).categories
 
-    products = (
-        db.query(Product)
+    query = (
+        select(Product)
         .options(joinedload(Product.subcategory).joinedload(Subcategory.category))
-        .filter(Product.is_active.is_(True), Product.is_new.is_(True))
-        .order_by(Product.created_at.desc())
-        .all()
+        .where(Product.is_active.is_(True), Product.is_new.is_(True))
     )
+    page = await paginate_products(db, query, cursor)
+    if cursor and _is_htmx(request):
+        return _product_list_fragment(request, page, "catalog")
 
     return templates.TemplateResponse(
         "products_list.html",
         {
             "request": request,
             "categories": all_categories,
-            "products": products,
+            **_listing_context(request, page, "catalog"),
             "list_title": "Новинки",
             "list_subtitle": "Новые поступления в нашем магазине",
             "list_icon": "🆕",
@@ -207,63 +244,130 @@ def new_page(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
 # =============================================================================
 # СО СКИДКОЙ
 # =============================================================================
+SALE_SORTS = {SORT_NEW: "Сначала новые", SORT_DISCOUNT: "Большая скидка"}
+
+
 @app.get("/sale", response_class=HTMLResponse)
-def sale_page(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
-    all_categories = db.query(Category).options(joinedload(Category.subcategories)).order_by(Category.sort_order).all()
+async def sale_page(
+    request: Request,
+    sort: str = SORT_NEW,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+) -> HTMLResponse:
+    all_categories = (await get_catalog(db)).categories
+    if sort not in SALE_SORTS:
+        sort = SORT_NEW
 
-    products = (
-        db.query(Product)
+    # Обе сортировки читают частичные индексы по discount_percent (app/models.py)
+    query = (
+        select(Product)
         .options(joinedload(Product.subcategory).joinedload(Subcategory.category))
-        .filter(
-            Product.is_active.is_(True),
-            Product.old_price.isnot(None),
-            Product.old_price > Product.price,
-        )
-        .order_by(Product.created_at.desc())
-        .all()
+        .where(Product.is_active.is_(True), Product.is_on_sale)
     )
+    page = await paginate_products(db, query, cursor, sort=sort)
+    if cursor and _is_htmx(request):
+        return _product_list_fragment(request, page, "catalog")
 
     return templates.TemplateResponse(
         "products_list.html",
         {
             "request": request,
             "categories": all_categories,
-            "products": products,
+            **_listing_context(request, page, "catalog"),
             "list_title": "Со скидкой",
             "list_subtitle": "Выгодные предложения и распродажа",
             "list_icon": "🏷️",
+            "sort_options": [
+                {"label": label, "url": "/sale" if value == SORT_NEW else f"/sale?sort={value}", "active": value == sort}
+                for value, label in SALE_SORTS.items()
+            ],
             "page_title": "Скидки на обувь — женская кожаная обувь | ТЦ «Алмаз», Пермь",
             "meta_description": "Скидки на женскую кожаную обувь в Перми. Выгодные цены в ТЦ «Алмаз».",
         },
     )
 
 
+# =============================================================================
+# ПОИСК
+# =============================================================================
+SEARCH_LIMIT = 48
+
+
+@app.get("/search", response_class=HTMLResponse)
+async def search_page(
+    request: Request,
+    q: str = "",
+    db: AsyncSession = Depends(get_async_db),
+) -> HTMLResponse:
+    all_categories = (await get_catalog(db)).categories
+    products = await _search_products(db, q)
+
+    return templates.TemplateResponse(
+        "search.html",
+        {
+            "request": request,
+            "categories": all_categories,
+            "products": products,
+            "query": q,
+            "card_style": "catalog",
+            "page_title": f"Поиск: {q} — ТЦ «Алмаз», Пермь" if q else "Поиск обуви — ТЦ «Алмаз», Пермь",
+            "meta_description": "Поиск женской кожаной обуви по названию, цвету и описанию. ТЦ «Алмаз», Пермь.",
+        },
+    )
+
+
+# Регистрируется раньше /{category_slug}/{subcategory_slug}, иначе тот перехватит путь
+@app.get("/hx/search", response_class=HTMLResponse)
+async def hx_search(
+    request: Request,
+    q: str = "",
+    db: AsyncSession = Depends(get_async_db),
+) -> HTMLResponse:
+    products = await _search_products(db, q)
+    return templates.TemplateResponse(
+        "partials/search_results.html",
+        {"request": request, "products": products, "query": q, "card_style": "catalog"},
+    )
+
+
+async def _search_products(db: AsyncSession, q: str) -> list[Product]:
+    """Активные товары по полнотекстовому индексу, лучшие совпадения первыми."""
+    match = build_match_query(q)
+    if match is None:
+        return []
+    return (
+        await db.scalars(
+            ranked_products(match)
+            .options(joinedload(Product.subcategory).joinedload(Subcategory.category))
+            .where(Product.is_active.is_(True))
+            .limit(SEARCH_LIMIT)
+        )
+    ).all()
+
+
 # =============================================================================
 # СТРАНИЦА КАТЕГОРИИ (список подгрупп)
 # =============================================================================
 @app.get("/category/{slug}", response_class=HTMLResponse)
-def read_category(slug: str, request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
-    category = (
-        db.query(Category)
-        .options(joinedload(Category.subcategories))
-        .filter(Category.slug == slug)
-        .first()
-    )
+async def read_category(slug: str, request: Request, db: AsyncSession = Depends(get_async_db)) -> HTMLResponse:
+    catalog = await get_catalog(db)
+    category = catalog.category(slug)
+    stats = await get_catalog_stats(db)
     
     if category is None:
-        categories = db.query(Category).options(joinedload(Category.subcategories)).order_by(Category.sort_order).all()
         return templates.TemplateResponse(
             "index.html",
             {
                 "request": request,
-                "categories": categories,
+                "categories": catalog.categories,
+                "stats": stats,
                 "page_title": "Категория не найдена — ТЦ «Алмаз»",
             },
             status_code=404,
         )
     
     # Все категории для навигации
-    all_categories = db.query(Category).options(joinedload(Category.subcategories)).order_by(Category.sort_order).all()
+    all_categories = catalog.categories
     
     # Хлебные крошки
     breadcrumbs = [
@@ -277,6 +381,7 @@ def read_category(slug: str, request: Request, db: Session = Depends(get_db)) ->
             "request": request,
             "categories": all_categories,
             "category": category,
+            "stats": stats,
             "breadcrumbs": breadcrumbs,
             "page_title": f"{category.name} из кожи — купить в Перми | ТЦ «Алмаз»",
             "meta_description": f"{category.name} из натуральной кожи в Перми. Большой выбор моделей в ТЦ «Алмаз». Примерка на месте.",
@@ -288,10 +393,10 @@ def read_category(slug: str, request: Request, db: Session = Depends(get_db)) ->
 # СТРАНИЦА ТОВАРА
 # =============================================================================
 @app.get("/product/{product_id_slug}", response_class=HTMLResponse)
-def read_product(
+async def read_product(
     product_id_slug: str,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> HTMLResponse:
     """Страница товара по URL вида /product/{id}-{slug}."""
     try:
@@ -299,27 +404,29 @@ def read_product(
         product_id = int(id_part)
     except (ValueError, TypeError):
         logger.info("[PRODUCT] bad product_id_slug=%s", product_id_slug)
-        return _not_found_response(request, db)
+        return await _not_found_response(request, db)
 
     product = (
-        db.query(Product)
-        .options(joinedload(Product.subcategory).joinedload(Subcategory.category))
-        .filter(Product.id == product_id, Product.slug == slug_part, Product.is_active.is_(True))
-        .first()
-    )
+        await db.scalars(
+            select(Product)
+            .options(selectinload(Product.sizes))
+            .where(Product.id == product_id, Product.slug == slug_part, Product.is_active.is_(True))
+        )
+    ).first()
 
     if product is None:
         logger.info("[PRODUCT] product not found id=%s slug=%s", product_id, slug_part)
-        return _not_found_response(request, db)
+        return await _not_found_response(request, db)
 
     # Все категории для навигации
-    all_categories = db.query(Category).options(joinedload(Category.subcategories)).order_by(Category.sort_order).all()
+    catalog = await get_catalog(db)
+    all_categories = catalog.categories
 
     # Хлебные крошки
     breadcrumbs = [{"name": "Главная", "url": "/"}]
-    if product.subcategory and product.subcategory.category:
-        cat = product.subcategory.category
-        subcat = product.subcategory
+    location = catalog.subcategory(product.subcategory_id)
+    if location:
+        cat, subcat = location
         breadcrumbs.append({"name": cat.name, "url": f"/category/{cat.slug}"})
         breadcrumbs.append({"name": subcat.name, "url": f"/{cat.slug}/{subcat.slug}"})
     breadcrumbs.append({"name": product.name, "url": f"/product/{product.id}-{product.slug}"})
@@ -338,23 +445,27 @@ def read_product(
 
 
 @app.get("/product-modal/{product_id}", response_class=HTMLResponse)
-def read_product_modal(
+async def read_product_modal(
     product_id: int,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> HTMLResponse:
     """Partial для модального окна товара (используется HTMX)."""
     product = (
-        db.query(Product)
-        .options(joinedload(Product.subcategory).joinedload(Subcategory.category))
-        .filter(Product.id == product_id)
-        .first()
-    )
+        await db.scalars(
+            select(Product)
+            .options(
+                joinedload(Product.subcategory).joinedload(Subcategory.category),
+                selectinload(Product.sizes),
+            )
+            .where(Product.id == product_id)
+        )
+    ).first()
 
     logger.info("[MODAL] product_id=%s, found=%s", product_id, bool(product))
 
     if product is None:
-        return _not_found_response(request, db)
+        return await _not_found_response(request, db)
 
     return templates.TemplateResponse(
         "partials/product_modal.html",
@@ -369,34 +480,29 @@ def read_product_modal(
 # СТРАНИЦА ПОДГРУППЫ (сетка товаров)
 # =============================================================================
 @app.get("/{category_slug}/{subcategory_slug}", response_class=HTMLResponse)
-def read_subcategory(
+async def read_subcategory(
     category_slug: str,
     subcategory_slug: str,
     request: Request,
-    db: Session = Depends(get_db),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
 ) -> HTMLResponse:
-    category = db.query(Category).filter(Category.slug == category_slug).first()
-    if category is None:
-        return _not_found_response(request, db)
-
-    subcategory = (
-        db.query(Subcategory)
-        .filter(Subcategory.category_id == category.id, Subcategory.slug == subcategory_slug)
-        .first()
-    )
-    if subcategory is None:
-        return _not_found_response(request, db)
+    catalog = await get_catalog(db)
+    location = catalog.resolve(category_slug, subcategory_slug)
+    if location is None:
+        return await _not_found_response(request, db)
+    category, subcategory = location
 
     # Все категории для навигации
-    all_categories = db.query(Category).options(joinedload(Category.subcategories)).order_by(Category.sort_order).all()
+    all_categories = catalog.categories
 
     # Товары подгруппы
-    products = (
-        db.query(Product)
-        .filter(Product.subcategory_id == subcategory.id, Product.is_active.is_(True))
-        .order_by(Product.created_at.desc())
-        .all()
+    query = select(Product).where(
+        Product.subcategory_id == subcategory.id, Product.is_active.is_(True)
     )
+    page = await paginate_products(db, query, cursor)
+    if cursor and _is_htmx(request):
+        return _product_list_fragment(request, page, "subcategory")
 
     # Хлебные крошки
     breadcrumbs = [
@@ -421,7 +527,7 @@ def read_subcategory(
             "categories": all_categories,
             "category": category,
             "subcategory": subcategory,
-            "products": products,
+            **_listing_context(request, page, "subcategory"),
             "breadcrumbs": breadcrumbs,
             "page_title": seo_title,
             "meta_description": f"{season_prefix} {subcategory.name.lower()} из натуральной кожи. Купить в Перми, ТЦ «Алмаз». Примерка на месте.",
@@ -433,15 +539,16 @@ def read_subcategory(
 # АКЦИИ
 # =============================================================================
 @app.get("/promotions", response_class=HTMLResponse)
-def promotions_page(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
-    all_categories = db.query(Category).options(joinedload(Category.subcategories)).order_by(Category.sort_order).all()
+async def promotions_page(request: Request, db: AsyncSession = Depends(get_async_db)) -> HTMLResponse:
+    all_categories = (await get_catalog(db)).categories
 
     promotions: List[Promotion] = (
-        db.query(Promotion)
-        .filter(Promotion.is_active.is_(True))
-        .order_by(Promotion.created_at.desc())
-        .all()
-    )
+        await db.scalars(
+            select(Promotion)
+            .where(Promotion.is_active.is_(True))
+            .order_by(Promotion.created_at.desc())
+        )
+    ).all()
 
     return templates.TemplateResponse(
         "promotions.html",
@@ -459,8 +566,8 @@ def promotions_page(request: Request, db: Session = Depends(get_db)) -> HTMLResp
 # КАРТА
 # =============================================================================
 @app.get("/map", response_class=HTMLResponse)
-def map_page(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
-    all_categories = db.query(Category).options(joinedload(Category.subcategories)).order_by(Category.sort_order).all()
+async def map_page(request: Request, db: AsyncSession = Depends(get_async_db)) -> HTMLResponse:
+    all_categories = (await get_catalog(db)).categories
 
     return templates.TemplateResponse(
         "map.html",
@@ -476,72 +583,89 @@ def map_page(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
 # =============================================================================
 # HTMX: ТОВАРЫ ПО ПОДГРУППЕ
 # =============================================================================
-@app.get("/hx/products/{subcategory_slug}", response_class=HTMLResponse)
-def hx_products_by_subcategory(
-    subcategory_slug: str,
-    request: Request,
-    db: Session = Depends(get_db),
-) -> HTMLResponse:
-    subcategory = db.query(Subcategory).filter(Subcategory.slug == subcategory_slug).first()
-
-    if subcategory:
-        products = (
-            db.query(Product)
-            .filter(Product.subcategory_id == subcategory.id, Product.is_active.is_(True))
+@app.get("/hx/products/featured", response_class=HTMLResponse)
+async def hx_featured_products(request: Request, db: AsyncSession = Depends(get_async_db)) -> HTMLResponse:
+    products = (
+        await db.scalars(
+            select(Product)
+            .where(Product.is_active.is_(True), Product.is_featured.is_(True))
             .order_by(Product.created_at.desc())
-            .all()
+            .limit(8)
         )
-    else:
-        products = []
-
+    ).all()
     return templates.TemplateResponse(
         "partials/product_list.html",
         {"request": request, "products": products},
     )
 
 
-@app.get("/hx/products/featured", response_class=HTMLResponse)
-def hx_featured_products(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
+@app.get("/hx/products/new", response_class=HTMLResponse)
+async def hx_new_products(request: Request, db: AsyncSession = Depends(get_async_db)) -> HTMLResponse:
     products = (
-        db.query(Product)
-        .filter(Product.is_active.is_(True), Product.is_featured.is_(True))
-        .order_by(Product.created_at.desc())
-        .limit(8)
-        .all()
-    )
+        await db.scalars(
+            select(Product)
+            .where(Product.is_active.is_(True), Product.is_new.is_(True))
+            .order_by(Product.created_at.desc())
+            .limit(8)
+        )
+    ).all()
     return templates.TemplateResponse(
         "partials/product_list.html",
         {"request": request, "products": products},
     )
 
 
-@app.get("/hx/products/new", response_class=HTMLResponse)
-def hx_new_products(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
+@app.get("/hx/products/sale", response_class=HTMLResponse)
+async def hx_sale_products(request: Request, db: AsyncSession = Depends(get_async_db)) -> HTMLResponse:
     products = (
-        db.query(Product)
-        .filter(Product.is_active.is_(True), Product.is_new.is_(True))
-        .order_by(Product.created_at.desc())
-        .limit(8)
-        .all()
-    )
+        await db.scalars(
+            select(Product)
+            .where(Product.is_active.is_(True), Product.is_on_sale)
+            .order_by(Product.created_at.desc(), Product.id.desc())
+            .limit(8)
+        )
+    ).all()
     return templates.TemplateResponse(
         "partials/product_list.html",
         {"request": request, "products": products},
     )
 
 
-@app.get("/hx/products/sale", response_class=HTMLResponse)
-def hx_sale_products(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
-    products = (
-        db.query(Product)
-        .filter(Product.is_active.is_(True), Product.old_price.isnot(None))
-        .order_by(Product.created_at.desc())
-        .limit(8)
-        .all()
-    )
-    return templates.TemplateResponse(
-        "partials/product_list.html",
-        {"request": request, "products": products},
+# Объявлен после /hx/products/featured|new|sale, иначе перехватывал бы их
+@app.get("/hx/products/{subcategory_slug}", response_class=HTMLResponse)
+async def hx_products_by_subcategory(
+    subcategory_slug: str,
+    request: Request,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+) -> HTMLResponse:
+    subcategory = (await get_catalog(db)).first_subcategory_by_slug.get(subcategory_slug)
+
+    if subcategory:
+        query = select(Product).where(
+            Product.subcategory_id == subcategory.id, Product.is_active.is_(True)
+        )
+        page = await paginate_products(db, query, cursor)
+    else:
+        page = Page(items=[], offset=0, next_cursor=None)
+
+    return _product_list_fragment(request, page, "compact")
+
+
+# =============================================================================
+# УМЕНЬШЕННЫЕ ФОТО
+# =============================================================================
+@app.get("/img/{width}/{path:path}")
+async def resized_image(request: Request, width: int, path: str) -> Response:
+    """Фото нужной ширины в AVIF/WebP/JPEG; готовые копии обычно отдаёт nginx."""
+    try:
+        file, fmt = await image_variant(width, path, request.headers.get("accept", ""))
+    except ImageNotFound:
+        return Response(status_code=404)
+    return FileResponse(
+        file,
+        media_type=fmt.media_type,
+        headers={"Cache-Control": "public, max-age=604800", "Vary": "Accept"},
     )
 
 
@@ -549,26 +673,34 @@ def hx_sale_products(request: Request, db: Session = Depends(get_db)) -> HTMLRes
 # SEO: ROBOTS.TXT, SITEMAP.XML
 # =============================================================================
 @app.get("/robots.txt", response_class=PlainTextResponse)
-def robots_txt(request: Request) -> str:
-    base_url = str(request.base_url).rstrip("/")
+async def robots_txt() -> str:
     return "\n".join([
         "User-agent: *",
         "Allow: /",
-        f"Sitemap: {base_url}/sitemap.xml",
+        f"Sitemap: {settings.site_url}/sitemap.xml",
     ])
 
 
 @app.get("/sitemap.xml")
-def sitemap_xml(request: Request, db: Session = Depends(get_db)) -> Response:
-    xml_body = generate_sitemap_xml(request, db)
-    return Response(content=xml_body, media_type="application/xml")
+async def sitemap_xml() -> Response:
+    sitemaps = await run_in_threadpool(get_sitemaps)
+    return Response(content=sitemap_index_xml(settings.site_url, sitemaps.files), media_type="application/xml")
+
+
+@app.get("/sitemap-{name}.xml.gz")
+async def sitemap_shard(name: str) -> Response:
+    sitemaps = await run_in_threadpool(get_sitemaps)
+    path = sitemaps.path(f"sitemap-{name}.xml.gz")
+    if path is None:
+        return Response(status_code=404)
+    return FileResponse(path, media_type="application/gzip")
 
 
 # =============================================================================
 # HEALTH CHECK
 # =============================================================================
 @app.get("/health")
-def health_check() -> dict:
+async def health_check() -> dict:
     """Health check endpoint for monitoring."""
     return {"status": "ok", "service": "shoe_store"}
 
@@ -576,13 +708,45 @@ def health_check() -> dict:
 # =============================================================================
 # ВСПОМОГАТЕЛЬНЫЕ
 # =============================================================================
-def _not_found_response(request: Request, db: Session) -> HTMLResponse:
-    categories = db.query(Category).options(joinedload(Category.subcategories)).order_by(Category.sort_order).all()
+def _is_htmx(request: Request) -> bool:
+    return request.headers.get("HX-Request") == "true"
+
+
+def _next_page_url(request: Request, page: Page) -> str | None:
+    """Относительный URL следующей страницы с сохранением фильтров."""
+    if page.next_cursor is None:
+        return None
+    params = [(k, v) for k, v in request.query_params.multi_items() if k != "cursor"]
+    params.append(("cursor", page.next_cursor))
+    return f"{request.url.path}?{urlencode(params)}"
+
+
+def _listing_context(request: Request, page: Page, card_style: str) -> dict:
+    """Переменные для partials/product_list.html."""
+    return {
+        "products": page.items,
+        "page": page,
+        "next_url": _next_page_url(request, page),
+        "card_style": card_style,
+    }
+
+
+def _product_list_fragment(request: Request, page: Page, card_style: str) -> HTMLResponse:
+    """Следующая страница списка — только карточки и новый «revealed»-триггер."""
+    return templates.TemplateResponse(
+        "partials/product_list.html",
+        {"request": request, **_listing_context(request, page, card_style)},
+    )
+
+
+async def _not_found_response(request: Request, db: AsyncSession) -> HTMLResponse:
+    categories = (await get_catalog(db)).categories
     return templates.TemplateResponse(
         "index.html",
         {
             "request": request,
             "categories": categories,
+            "stats": await get_catalog_stats(db),
             "featured_products": [],
             "new_products": [],
             "page_title": "Страница не найдена — ТЦ «Алмаз»",
@@ -1,7 +1,11 @@
 from datetime import datetime, date
+from typing import Optional
 
-from sqlalchemy import Boolean, Column, Date, DateTime, Float, ForeignKey, Integer, String, Text
+from sqlalchemy import Boolean, Column, Date, DateTime, Float, ForeignKey, Index, Integer, String, Text, case, literal_column
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql.expression import ColumnElement, FunctionElement
 
 from .database import Base
 
@@ -34,6 +38,36 @@ class Subcategory(Base):
     products = relationship("Product", back_populates="subcategory", order_by="Product.created_at.desc()")
 
 
+def compute_discount(price: float, old_price: Optional[float]) -> int:
+    """Скидка в целых процентах (с округлением вниз); 0 — товар без скидки."""
+    if not old_price or old_price <= price:
+        return 0
+    return int((old_price - price) / old_price * 100)
+
+
+class _truncate(FunctionElement):
+    """Целая часть положительного числа: int() из compute_discount в SQL."""
+
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(_truncate)
+def _compile_truncate(element, compiler, **kw) -> str:
+    return f"CAST(FLOOR({compiler.process(element.clauses, **kw)}) AS INTEGER)"
+
+
+@compiles(_truncate, "sqlite")
+def _compile_truncate_sqlite(element, compiler, **kw) -> str:
+    # CAST в SQLite отбрасывает дробную часть; FLOOR есть не в каждой сборке
+    return f"CAST({compiler.process(element.clauses, **kw)} AS INTEGER)"
+
+
+def discount_expression(price: ColumnElement, old_price: ColumnElement) -> ColumnElement[int]:
+    """compute_discount() в SQL — для массовых UPDATE без загрузки товаров."""
+    return case((old_price > price, _truncate((old_price - price) / old_price * 100)), else_=0)
+
+
 class Product(Base):
     """Товар — привязан к подкатегории"""
     __tablename__ = "products"
@@ -51,10 +85,105 @@ class Product(Base):
     is_new = Column(Boolean, default=False, nullable=False)  # новинка
     is_featured = Column(Boolean, default=False, nullable=False)  # актуальный товар
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Последнее изменение карточки (lastmod в sitemap); админка обновляет явно
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
+    # Скидка в % от old_price — хранится, чтобы /sale читал товары по индексу.
+    # Меняется только вместе с ценами: set_prices()
+    discount_percent = Column(Integer, default=0, server_default="0", nullable=False)
 
     subcategory_id = Column(Integer, ForeignKey("subcategories.id"), nullable=True)
     subcategory = relationship("Subcategory", back_populates="products")
 
+    sizes = relationship(
+        "ProductSize",
+        back_populates="product",
+        order_by="ProductSize.size",
+        cascade="all, delete-orphan",
+    )
+
+    def set_prices(self, price: float, old_price: Optional[float]) -> None:
+        self.price = price
+        self.old_price = old_price
+        self.discount_percent = compute_discount(price, old_price)
+
+    @hybrid_property
+    def is_on_sale(self) -> bool:
+        return self.discount_percent > 0
+
+    @is_on_sale.inplace.expression
+    @classmethod
+    def _is_on_sale_expression(cls):
+        # 0 — литерал, а не параметр: иначе SQLite не сопоставит запрос с частичным индексом
+        return cls.discount_percent > literal_column("0")
+
+    @property
+    def available_sizes(self) -> list[int]:
+        """Размеры в наличии (quantity > 0) по возрастанию."""
+        return [s.size for s in self.sizes if s.quantity > 0]
+
+
+def _partial_index(name: str, *columns, where) -> Index:
+    """Частичный индекс. Условие пишется так же, как в запросах (is_(True)):
+    SQLite берёт частичный индекс, только если WHERE запроса содержит те же термы."""
+    return Index(name, *columns, sqlite_where=where, postgresql_where=where)
+
+
+# Индексы списков товаров. Все списки сортируются по (created_at, id) DESC
+# (keyset-пагинация), поэтому эти колонки — последние в каждом индексе:
+# SQLite идёт по индексу в нужном порядке и останавливается на LIMIT,
+# без временного B-дерева для сортировки. Проверка планов — bench/query_plans.py.
+_active = Product.is_active.is_(True)
+# Админка: все товары, включая скрытые
+Index("ix_products_created", Product.created_at, Product.id)
+# Подгруппа: и публичная сетка, и фильтр админки (там и скрытые товары)
+Index("ix_products_subcategory_created", Product.subcategory_id, Product.created_at, Product.id)
+# Сортировки таблицы админки по названию и цене (id — второй ключ, см. ADMIN_SORTS)
+Index("ix_products_name", Product.name, Product.id)
+Index("ix_products_price", Product.price, Product.id)
+# /products, фасетный индекс, счётчики дашборда
+_partial_index("ix_products_active_created", Product.created_at, Product.id, where=_active)
+_partial_index(
+    "ix_products_featured_created", Product.created_at, Product.id,
+    where=_active & Product.is_featured.is_(True),
+)
+_partial_index(
+    "ix_products_new_created", Product.created_at, Product.id,
+    where=_active & Product.is_new.is_(True),
+)
+_partial_index(
+    "ix_products_sale_created", Product.created_at, Product.id,
+    where=_active & Product.is_on_sale,
+)
+# /sale?sort=discount: сначала самые большие скидки
+_partial_index(
+    "ix_products_sale_discount", Product.discount_percent, Product.created_at, Product.id,
+    where=_active & Product.is_on_sale,
+)
+
+
+class ProductSize(Base):
+    """Остаток товара по размеру — заменяет разбор sizes_json при фильтрации"""
+    __tablename__ = "product_sizes"
+    __table_args__ = (
+        # Фильтр /products?size=N: size = ? AND quantity > 0 -> product_id из индекса
+        Index("ix_product_sizes_size_quantity", "size", "quantity", "product_id"),
+    )
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    size = Column(Integer, primary_key=True)
+    quantity = Column(Integer, default=1, nullable=False)
+
+    product = relationship("Product", back_populates="sizes")
+
+
+class CatalogStat(Base):
+    """Счётчик активных товаров — ведут триггеры БД, см. app/stats.py"""
+    __tablename__ = "catalog_stats"
+
+    scope = Column(String(16), primary_key=True)  # active, new, sale, featured, category, subcategory, size
+    ref_id = Column(Integer, primary_key=True)  # id категории/подгруппы, размер; 0 для общих
+    total = Column(Integer, nullable=False)
+
 
 class Promotion(Base):
     """Акции и спецпредложения"""
@@ -69,3 +198,15 @@ class Promotion(Base):
     end_date = Column(Date, nullable=True)
     is_active = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class AuditEntry(Base):
+    """Журнал массовых операций админки: кто, что и со сколькими товарами"""
+    __tablename__ = "admin_audit"
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    admin = Column(String(255), nullable=False)
+    action = Column(String(64), nullable=False)
+    product_count = Column(Integer, default=0, nullable=False)
+    details = Column(Text, nullable=True)  # JSON: параметры операции и выборка товаров
@@ -0,0 +1,114 @@
+"""Keyset-пагинация списков товаров по (created_at, id).
+
+Курсор непрозрачен для клиента: это base64 от «created_at|id|offset»
+последнего показанного товара. offset нужен только для нумерации
+позиций в микроразметке, в запрос он не попадает.
+
+Сортировка по скидке (SORT_DISCOUNT) идёт по (discount_percent,
+created_at, id), и в курсор дописывается скидка последнего товара.
+"""
+
+import base64
+import binascii
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Product
+
+PAGE_SIZE = 24
+
+SORT_NEW = "new"
+SORT_DISCOUNT = "discount"
+
+
+@dataclass(frozen=True)
+class Cursor:
+    created_at: datetime
+    id: int
+    offset: int
+    discount: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class Page:
+    """Страница товаров и курсор следующей (None — страница последняя)."""
+
+    items: list[Product]
+    offset: int
+    next_cursor: Optional[str]
+
+
+def encode_cursor(created_at: datetime, product_id: int, offset: int, discount: Optional[int] = None) -> str:
+    raw = f"{created_at.isoformat()}|{product_id}|{offset}"
+    if discount is not None:
+        raw += f"|{discount}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Cursor]:
+    """Разобрать курсор; битый курсор трактуется как первая страница."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, product_id, offset, *discount = base64.urlsafe_b64decode(padded).decode().split("|")
+        if len(discount) > 1:
+            return None
+        return Cursor(
+            datetime.fromisoformat(created_at),
+            int(product_id),
+            int(offset),
+            int(discount[0]) if discount else None,
+        )
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        return None
+
+
+async def paginate_products(
+    db: AsyncSession,
+    query: Select,
+    cursor: Optional[str],
+    limit: int = PAGE_SIZE,
+    sort: str = SORT_NEW,
+) -> Page:
+    """Применить keyset-условие и вернуть одну страницу.
+
+    query не должен содержать order_by — порядок задаётся здесь,
+    чтобы совпадать с условием курсора.
+    """
+    by_discount = sort == SORT_DISCOUNT
+    keys = (Product.discount_percent, Product.created_at, Product.id) if by_discount else (Product.created_at, Product.id)
+
+    position = decode_cursor(cursor)
+    # Курсор другой сортировки (скидка есть или нет не там, где нужно) — первая страница
+    if position is not None and (position.discount is not None) != by_discount:
+        position = None
+    if position is not None:
+        values = (position.created_at, position.id)
+        if by_discount:
+            values = (position.discount, *values)
+        # Сравнение пар, а не OR: и SQLite, и PostgreSQL начинают чтение индекса
+        # (..., created_at, id) прямо с позиции курсора, а не с первой страницы
+        query = query.where(tuple_(*keys) < values)
+    offset = position.offset if position else 0
+
+    rows = (
+        await db.scalars(query.order_by(*(key.desc() for key in keys)).limit(limit + 1))
+    ).all()
+    items = rows[:limit]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(
+            last.created_at,
+            last.id,
+            offset + len(items),
+            last.discount_percent if by_discount else None,
+        )
+
+    return Page(items=items, offset=offset, next_cursor=next_cursor)
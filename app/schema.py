@@ -0,0 +1,165 @@
+"""Версия схемы БД: миграции Alembic и проверка при старте.
+
+Схема меняется только миграциями из migrations/versions:
+
+    python -m app.schema upgrade   # применить миграции (deploy.sh, run_dev.bat)
+    python -m app.schema check     # код возврата 1, если схема отстаёт
+    python -m app.schema current   # текущая и последняя ревизии
+
+При старте воркера check_schema() читает одну строку alembic_version и
+сравнивает её с последней ревизией: без DDL, create_all и сидирования.
+Если схема отстаёт, воркер не стартует — миграции запускает деплой, а не
+каждый из воркеров наперегонки.
+
+База, созданная до миграций (create_all при старте), при первом upgrade
+достраивается до ревизии BASELINE тем же, что раньше делал init_db
+(product_sizes, products.updated_at, поисковый индекс), и помечается ею.
+Данные при этом не удаляются.
+"""
+
+import argparse
+import json
+import sys
+from functools import lru_cache
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import DateTime, inspect
+from sqlalchemy.orm import Session
+
+from .database import BASE_DIR, Base, db_session, engine
+
+ALEMBIC_INI = BASE_DIR / "alembic.ini"
+# Ревизия, соответствующая схеме, которую создавал create_all до миграций
+BASELINE = "0001"
+
+
+class SchemaOutOfDate(RuntimeError):
+    """Ревизия базы не совпадает с последней миграцией."""
+
+
+def alembic_config() -> Config:
+    return Config(str(ALEMBIC_INI))
+
+
+@lru_cache
+def head_revision() -> str:
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+def current_revision() -> Optional[str]:
+    with engine.connect() as conn:
+        return MigrationContext.configure(conn).get_current_revision()
+
+
+def check_schema() -> str:
+    """Проверка при старте: одна выборка, без изменений в базе."""
+    current = current_revision()
+    head = head_revision()
+    if current != head:
+        raise SchemaOutOfDate(
+            f"Схема БД на ревизии {current or '(нет)'}, код ждёт {head}. "
+            "Выполните: python -m app.schema upgrade"
+        )
+    return current
+
+
+def upgrade_schema() -> None:
+    """Применить миграции; старую базу без alembic_version сначала принять как BASELINE."""
+    from .search import ensure_search_index
+    from .stats import ensure_catalog_stats
+
+    _adopt_legacy_database()
+    command.upgrade(alembic_config(), "head")
+    # Товары могли добавить в обход админки (SQL-клиентом) — сверить поисковый индекс
+    with db_session() as db:
+        ensure_search_index(db)
+        ensure_catalog_stats(db)
+
+
+# =============================================================================
+# БАЗЫ ДО МИГРАЦИЙ
+# =============================================================================
+
+def _adopt_legacy_database() -> None:
+    from . import models  # noqa: F401
+    from .search import create_search_table
+
+    tables = set(inspect(engine).get_table_names())
+    if "alembic_version" in tables or "categories" not in tables:
+        return
+    if "subcategories" not in tables:
+        raise SchemaOutOfDate(
+            "База создана схемой без подгрупп. Автоматически её не перенести: "
+            "сделайте резервную копию и перенесите данные вручную"
+        )
+
+    Base.metadata.create_all(engine, tables=[Base.metadata.tables["product_sizes"]])
+    _add_products_updated_at()
+    with db_session() as db:
+        create_search_table(db)
+        db.commit()
+        _migrate_sizes_json(db)
+    command.stamp(alembic_config(), BASELINE)
+
+
+def _add_products_updated_at() -> None:
+    """Старые товары получают updated_at = created_at."""
+    columns = {column["name"] for column in inspect(engine).get_columns("products")}
+    if "updated_at" in columns:
+        return
+    column_type = DateTime().compile(dialect=engine.dialect)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"ALTER TABLE products ADD COLUMN updated_at {column_type}")
+        conn.exec_driver_sql("UPDATE products SET updated_at = created_at")
+
+
+def _migrate_sizes_json(db: Session) -> None:
+    """Перенести Product.sizes_json в product_sizes для товаров без строк размеров."""
+    from .models import Product, ProductSize
+
+    pending = (
+        db.query(Product.id, Product.sizes_json)
+        .filter(Product.sizes_json.isnot(None), ~Product.sizes.any())
+        .all()
+    )
+
+    rows = []
+    for product_id, sizes_json in pending:
+        try:
+            sizes = json.loads(sizes_json)
+        except (json.JSONDecodeError, TypeError):
+            continue
+        if not isinstance(sizes, list):
+            continue
+        for size in sorted({int(s) for s in sizes if str(s).isdigit()}):
+            rows.append({"product_id": product_id, "size": size, "quantity": 1})
+
+    if rows:
+        db.execute(ProductSize.__table__.insert(), rows)
+        db.commit()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("upgrade", "check", "current"))
+    args = parser.parse_args(argv)
+
+    if args.command == "upgrade":
+        upgrade_schema()
+        print(f"Схема БД на ревизии {current_revision()}")
+    elif args.command == "check":
+        try:
+            print(f"Схема БД актуальна: {check_schema()}")
+        except SchemaOutOfDate as exc:
+            print(exc)
+            sys.exit(1)
+    else:
+        print(f"Текущая ревизия: {current_revision() or '(нет)'}, последняя: {head_revision()}")
+
+
+if __name__ == "__main__":
+    main()
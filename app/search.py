@@ -0,0 +1,239 @@
+"""Полнотекстовый поиск товаров: SQLite FTS5 или PostgreSQL tsvector.
+
+Таблица product_search (rowid = products.id) хранит уже нормализованный
+текст: нижний регистр, ё -> е и лёгкий русский стемминг. Поэтому запрос
+«чёрные сапоги» находит «Чёрный сапог». Ранжирование учитывает веса
+колонок: название важнее подгруппы, цвета и описания.
+
+На SQLite это виртуальная таблица FTS5 с bm25. На PostgreSQL — обычная
+таблица с генерируемой колонкой document (tsvector с весами A-D,
+конфигурация simple: стемминг уже сделан здесь) и GIN-индексом,
+ранжирование — ts_rank. Снаружи разницы нет: build_match_query,
+matching_ids и ranked_products работают одинаково.
+
+Индекс ведут пути записи админки (index_product / remove_product), а
+ensure_search_index() после миграций (python -m app.schema upgrade)
+сверяет его текст с таблицей products и перестраивает при расхождении.
+"""
+
+import re
+from typing import Optional
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text, func, literal_column, select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ColumnElement
+
+from .database import IS_POSTGRES
+from .models import Product, Subcategory
+
+# Отдельные метаданные: create_all() не должен создавать FTS-таблицу как обычную
+search_metadata = MetaData()
+
+product_search = Table(
+    "product_search",
+    search_metadata,
+    Column("rowid", Integer, primary_key=True),
+    Column("name", Text),
+    Column("description", Text),
+    Column("color", Text),
+    Column("subcategory", Text),
+)
+
+# Веса bm25 в порядке колонок: name, description, color, subcategory
+_BM25_WEIGHTS = (10.0, 1.0, 3.0, 5.0)
+# Те же пропорции для ts_rank, порядок {D, C, B, A}: description, color, subcategory, name
+_TS_RANK_WEIGHTS = "'{0.1, 0.3, 0.5, 1.0}'::float4[]"
+_DOCUMENT = literal_column("product_search.document")
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_CYRILLIC_RE = re.compile(r"[а-я]")
+
+# Окончания прилагательных и существительных, от длинных к коротким
+_ENDINGS = sorted(
+    {
+        "иями", "ями", "ами", "ыми", "ими", "ого", "его", "ому", "ему",
+        "ая", "яя", "ое", "ее", "ые", "ие", "ый", "ий", "ой", "ей", "ую", "юю",
+        "ым", "им", "ом", "ем", "ых", "их", "ах", "ях", "ов", "ев", "ам", "ям",
+        "ию", "ья", "ье", "ьи", "ия", "ии",
+        # беглая гласная: ботинок -> ботин, совпадает с префиксом «ботинк»
+        "ок", "ек",
+        "а", "я", "о", "е", "и", "ы", "у", "ю", "ь", "й",
+    },
+    key=len,
+    reverse=True,
+)
+_MIN_STEM = 3
+
+
+def stem(word: str) -> str:
+    """Лёгкий стемминг: срезать одно окончание, оставив основу от 3 букв."""
+    if not _CYRILLIC_RE.search(word):
+        return word
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[: -len(ending)]
+    return word
+
+
+def tokenize(value: Optional[str]) -> list[str]:
+    """Слова в нижнем регистре, ё -> е, после стемминга."""
+    if not value:
+        return []
+    normalized = value.lower().replace("ё", "е")
+    return [stem(word) for word in _WORD_RE.findall(normalized)]
+
+
+def normalize(value: Optional[str]) -> str:
+    return " ".join(tokenize(value))
+
+
+def build_match_query(query: Optional[str]) -> Optional[str]:
+    """Запрос пользователя -> выражение поиска: все слова, каждое как префикс.
+
+    Для FTS5 каждое слово берётся в кавычки, поэтому операторы из ввода
+    (OR, NEAR, двоеточия) не интерпретируются. Для to_tsquery слова уже
+    состоят только из букв и цифр, операторы в них попасть не могут.
+    """
+    terms = [term for term in tokenize(query) if term]
+    if not terms:
+        return None
+    if IS_POSTGRES:
+        return " & ".join(f"{term}:*" for term in terms)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def match_clause(match: str) -> ColumnElement[bool]:
+    if IS_POSTGRES:
+        return _DOCUMENT.op("@@")(func.to_tsquery("simple", match))
+    return text("product_search MATCH :fts_query").bindparams(fts_query=match)
+
+
+def matching_ids(match: str):
+    """Подзапрос id товаров, подходящих под MATCH (без ранжирования)."""
+    return select(product_search.c.rowid).where(match_clause(match))
+
+
+def ranked_products(match: str):
+    """select(Product), лучшие совпадения первыми."""
+    if IS_POSTGRES:
+        rank = func.ts_rank(literal_column(_TS_RANK_WEIGHTS), _DOCUMENT, func.to_tsquery("simple", match)).desc()
+    else:
+        rank = func.bm25(literal_column("product_search"), *_BM25_WEIGHTS)
+    return (
+        select(Product)
+        .join(product_search, product_search.c.rowid == Product.id)
+        .where(match_clause(match))
+        .order_by(rank)
+    )
+
+
+# =============================================================================
+# ВЕДЕНИЕ ИНДЕКСА
+# =============================================================================
+
+def _row(product: Product, subcategory_name: Optional[str]) -> dict:
+    return {
+        "rowid": product.id,
+        "name": normalize(product.name),
+        "description": normalize(product.description),
+        "color": normalize(product.color),
+        "subcategory": normalize(subcategory_name),
+    }
+
+
+def index_product(db: Session, product: Product, subcategory_name: Optional[str]) -> None:
+    """Добавить или обновить товар в индексе (в текущей транзакции)."""
+    db.flush()
+    db.execute(product_search.delete().where(product_search.c.rowid == product.id))
+    db.execute(product_search.insert().values(**_row(product, subcategory_name)))
+
+
+def index_rows(db: Session, rows: list[dict]) -> None:
+    """Пакетно обновить индекс по словарям id, name, description, color, subcategory.
+
+    Для импорта каталога: строки пишутся executemany, без ORM-объектов.
+    """
+    if not rows:
+        return
+    db.execute(product_search.delete().where(product_search.c.rowid.in_([row["id"] for row in rows])))
+    db.execute(
+        product_search.insert(),
+        [
+            {
+                "rowid": row["id"],
+                "name": normalize(row["name"]),
+                "description": normalize(row["description"]),
+                "color": normalize(row["color"]),
+                "subcategory": normalize(row["subcategory"]),
+            }
+            for row in rows
+        ],
+    )
+
+
+def remove_product(db: Session, product_id: int) -> None:
+    db.execute(product_search.delete().where(product_search.c.rowid == product_id))
+
+
+def create_search_table(db: Session) -> None:
+    """Таблица индекса для баз, созданных до миграций; новые получают её из 0001."""
+    if IS_POSTGRES:
+        db.execute(text(
+            "CREATE TABLE IF NOT EXISTS product_search ("
+            "rowid integer PRIMARY KEY, name text, description text, color text, subcategory text, "
+            "document tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(subcategory, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(color, '')), 'C') || "
+            "setweight(to_tsvector('simple', coalesce(description, '')), 'D')"
+            ") STORED)"
+        ))
+        db.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_product_search_document ON product_search USING gin (document)"
+        ))
+        return
+    db.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5("
+        "name, description, color, subcategory, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    ))
+
+
+def _indexed_rows(db: Session) -> list[dict]:
+    """Строки индекса, посчитанные по products заново."""
+    return [
+        _row(product, subcategory_name)
+        for product, subcategory_name in (
+            db.query(Product, Subcategory.name)
+            .outerjoin(Subcategory, Product.subcategory_id == Subcategory.id)
+            .yield_per(500)
+        )
+    ]
+
+
+def rebuild_search_index(db: Session) -> int:
+    """Переиндексировать все товары. Возвращает число строк в индексе."""
+    db.execute(product_search.delete())
+    rows = _indexed_rows(db)
+    if rows:
+        db.execute(product_search.insert(), rows)
+    db.commit()
+    return len(rows)
+
+
+def ensure_search_index(db: Session) -> None:
+    """Перестроить индекс, если он разошёлся с таблицей products.
+
+    Сверяется содержимое, а не число строк: товар, переименованный
+    SQL-клиентом, иначе так и искался бы по старому названию.
+    """
+    columns = ("name", "description", "color", "subcategory")
+    stored = {
+        row.rowid: tuple(row)[1:]
+        for row in db.execute(select(product_search.c.rowid, *(product_search.c[name] for name in columns)))
+    }
+    expected = {row["rowid"]: tuple(row[name] for name in columns) for row in _indexed_rows(db)}
+    if stored != expected:
+        rebuild_search_index(db)
+    else:
+        db.commit()
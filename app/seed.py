@@ -0,0 +1,280 @@
+"""Начальные данные каталога: категории, подгруппы, демо-товары, акции.
+
+Заполняет пустую базу одной командой после миграций:
+
+    python -m app.schema upgrade
+    python -m app.seed
+
+Каждая таблица вставляется одним executemany (INSERT ... RETURNING для
+id), а не построчными flush(). Если категории уже есть, ничего не
+меняется; --force сначала удаляет весь каталог и акции.
+"""
+
+import argparse
+import json
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from .models import Category, Product, ProductSize, Promotion, Subcategory, compute_discount
+from .search import rebuild_search_index
+
+# === КАТЕГОРИИ ===
+CATEGORIES = [
+    {"name": "Зимняя обувь", "slug": "zimnyaya", "icon": "❄️", "sort_order": 1},
+    {"name": "Демисезонная обувь", "slug": "demisezon", "icon": "🍂", "sort_order": 2},
+    {"name": "Летняя обувь", "slug": "letnyaya", "icon": "☀️", "sort_order": 3},
+]
+
+# === ПОДГРУППЫ ===
+SUBCATEGORIES = [
+    # Зимняя
+    {"name": "Сапоги", "slug": "sapogi", "category_slug": "zimnyaya", "sort_order": 1},
+    {"name": "Ботинки", "slug": "botinki", "category_slug": "zimnyaya", "sort_order": 2},
+    {"name": "Кроссовки", "slug": "krossovki", "category_slug": "zimnyaya", "sort_order": 3},
+    {"name": "Угги", "slug": "uggi", "category_slug": "zimnyaya", "sort_order": 4},
+    # Демисезонная
+    {"name": "Сапоги", "slug": "sapogi", "category_slug": "demisezon", "sort_order": 1},
+    {"name": "Ботинки", "slug": "botinki", "category_slug": "demisezon", "sort_order": 2},
+    {"name": "Кроссовки", "slug": "krossovki", "category_slug": "demisezon", "sort_order": 3},
+    # Летняя
+    {"name": "Туфли", "slug": "tufli", "category_slug": "letnyaya", "sort_order": 1},
+    {"name": "Кроссовки и кеды", "slug": "krossovki", "category_slug": "letnyaya", "sort_order": 2},
+    {"name": "Лоферы", "slug": "lofery", "category_slug": "letnyaya", "sort_order": 3},
+    {"name": "Босоножки", "slug": "bosonozhki", "category_slug": "letnyaya", "sort_order": 4},
+    {"name": "Мокасины и балетки", "slug": "mokasiny", "category_slug": "letnyaya", "sort_order": 5},
+]
+
+# === ДЕМО-ТОВАРЫ ===
+PRODUCTS = [
+    # Зимняя → Сапоги
+    {
+        "name": "Высокие зимние сапоги «Nordic»",
+        "slug": "vysokie-zimnie-sapogi-nordic",
+        "description": "Высокие сапоги из гладкой кожи с утеплённой подкладкой, вдохновлённые скандинавским стилем.",
+        "price": 11900, "old_price": 13400,
+        "sizes_json": "[36, 37, 38, 39, 40]", "color": "шоколадный",
+        "image_url": "/static/images/products/zimnyaya/sapogi/vysokie-zimnie-sapogi-nordic.jpg",
+        "subcategory_key": "zimnyaya/sapogi", "is_featured": True,
+    },
+    {
+        "name": "Кожаные сапоги «Frost Queen»",
+        "slug": "kozhanye-sapogi-frost-queen",
+        "description": "Элегантные зимние сапоги на устойчивом каблуке с натуральным мехом внутри.",
+        "price": 12500, "old_price": None,
+        "sizes_json": "[37, 38, 39]", "color": "чёрный",
+        "image_url": "/static/images/products/zimnyaya/sapogi/kozhanye-sapogi-frost-queen.jpg",
+        "subcategory_key": "zimnyaya/sapogi", "is_new": True,
+    },
+    # Зимняя → Ботинки
+    {
+        "name": "Зимние кожаные ботинки на меху",
+        "slug": "zimnie-kozhanye-botinki-na-mekhu",
+        "description": "Тёплые женские ботинки из натуральной кожи с мехом, устойчивой подошвой и хорошим сцеплением на льду.",
+        "price": 8900, "old_price": None,
+        "sizes_json": "[36, 37, 38, 39]", "color": "чёрный",
+        "image_url": "/static/images/products/zimnyaya/botinki/zimnie-kozhanye-botinki-na-mekhu.jpg",
+        "subcategory_key": "zimnyaya/botinki", "is_featured": True,
+    },
+    {
+        "name": "Зимние ботинки на шнуровке «Oslo»",
+        "slug": "zimnie-botinki-oslo",
+        "description": "Универсальные кожаные ботинки на шнуровке с теплой подкладкой и рельефной подошвой.",
+        "price": 9800, "old_price": None,
+        "sizes_json": "[37, 38, 39, 40]", "color": "тёмный графит",
+        "image_url": "/static/images/products/zimnyaya/botinki/zimnie-botinki-oslo.jpg",
+        "subcategory_key": "zimnyaya/botinki",
+    },
+    # Зимняя → Угги
+    {
+        "name": "Угги из натуральной овчины",
+        "slug": "uggi-iz-naturalnoy-ovchiny",
+        "description": "Классические угги из натуральной овчины — максимальное тепло и комфорт.",
+        "price": 7500, "old_price": 8900,
+        "sizes_json": "[36, 37, 38, 39, 40]", "color": "песочный",
+        "image_url": "/static/images/products/zimnyaya/uggi/uggi-iz-naturalnoy-ovchiny.jpg",
+        "subcategory_key": "zimnyaya/uggi",
+    },
+    # Демисезонная → Сапоги
+    {
+        "name": "Демисезонные сапоги «City Elegance»",
+        "slug": "demisezonnye-sapogi-city-elegance",
+        "description": "Стильные демисезонные сапоги из мягкой кожи на низком каблуке.",
+        "price": 10500, "old_price": None,
+        "sizes_json": "[36, 37, 38, 39]", "color": "коричневый",
+        "image_url": "/static/images/products/demisezon/sapogi/demisezonnye-sapogi-city-elegance.jpg",
+        "subcategory_key": "demisezon/sapogi", "is_new": True,
+    },
+    # Демисезонная → Ботинки
+    {
+        "name": "Демисезонные ботинки «City Walk»",
+        "slug": "demisezonnye-botinki-city-walk",
+        "description": "Городские ботинки из мягкой кожи на низком каблуке для повседневной носки.",
+        "price": 8600, "old_price": None,
+        "sizes_json": "[36, 37, 38, 39]", "color": "чёрный",
+        "image_url": "/static/images/products/demisezon/botinki/demisezonnye-botinki-city-walk.jpg",
+        "subcategory_key": "demisezon/botinki", "is_featured": True,
+    },
+    {
+        "name": "Кожаные ботильоны «Autumn»",
+        "slug": "kozhanye-botilony-autumn",
+        "description": "Элегантные ботильоны из гладкой кожи на среднем каблуке.",
+        "price": 9200, "old_price": 10500,
+        "sizes_json": "[37, 38, 39]", "color": "бордовый",
+        "image_url": "/static/images/products/demisezon/botinki/kozhanye-botilony-autumn.jpg",
+        "subcategory_key": "demisezon/botinki",
+    },
+    # Демисезонная → Кроссовки
+    {
+        "name": "Кожаные кеды «Soft Line»",
+        "slug": "kozhanye-kedy-soft-line",
+        "description": "Лёгкие демисезонные кеды из мягкой кожи с минималистичным дизайном.",
+        "price": 7900, "old_price": 8900,
+        "sizes_json": "[36, 37, 38, 39, 40]", "color": "молочный",
+        "image_url": "/static/images/products/demisezon/krossovki/kozhanye-kedy-soft-line.jpg",
+        "subcategory_key": "demisezon/krossovki",
+    },
+    # Летняя → Туфли
+    {
+        "name": "Кожаные лодочки «Classic»",
+        "slug": "kozhanye-lodochki-classic",
+        "description": "Классические лодочки из натуральной кожи на среднем каблуке.",
+        "price": 6900, "old_price": 7900,
+        "sizes_json": "[36, 37, 38, 39]", "color": "чёрный",
+        "image_url": "/static/images/products/letnyaya/tufli/kozhanye-lodochki-classic.jpg",
+        "subcategory_key": "letnyaya/tufli",
+    },
+    # Летняя → Лоферы
+    {
+        "name": "Демисезонные кожаные лоферы",
+        "slug": "demisezonnye-kozhanye-lofery",
+        "description": "Универсальные кожаные лоферы под джинсы и платье.",
+        "price": 7400, "old_price": 8200,
+        "sizes_json": "[36, 37, 38, 39]", "color": "капучино",
+        "image_url": "/static/images/products/letnyaya/lofery/demisezonnye-kozhanye-lofery.jpg",
+        "subcategory_key": "letnyaya/lofery", "is_featured": True,
+    },
+    # Летняя → Босоножки
+    {
+        "name": "Кожаные босоножки «Summer Breeze»",
+        "slug": "kozhanye-bosonozhki-summer-breeze",
+        "description": "Лёгкие босоножки из натуральной кожи с удобной колодкой.",
+        "price": 5900, "old_price": None,
+        "sizes_json": "[36, 37, 38, 39, 40]", "color": "бежевый",
+        "image_url": "/static/images/products/letnyaya/bosonozhki/kozhanye-bosonozhki-summer-breeze.jpg",
+        "subcategory_key": "letnyaya/bosonozhki", "is_new": True,
+    },
+    # Летняя → Мокасины и балетки
+    {
+        "name": "Кожаные балетки «Comfort»",
+        "slug": "kozhanye-baletki-comfort",
+        "description": "Мягкие балетки из натуральной кожи на плоской подошве.",
+        "price": 4900, "old_price": 5900,
+        "sizes_json": "[36, 37, 38, 39]", "color": "пудровый",
+        "image_url": "/static/images/products/letnyaya/mokasiny/kozhanye-baletki-comfort.jpg",
+        "subcategory_key": "letnyaya/mokasiny",
+    },
+]
+
+
+def _promotions() -> list[dict]:
+    return [
+        dict(
+            title="Скидка на вторую пару",
+            slug="skidka-na-vtoruyu-paru",
+            description="При покупке двух пар демисезонной обуви — скидка 20% на вторую.",
+            discount_text="-20% на вторую пару",
+            start_date=date.today(),
+            end_date=None,
+            is_active=True,
+        ),
+        dict(
+            title="Зимняя распродажа",
+            slug="zimnyaya-rasprodazha",
+            description="Скидки до 30% на зимнюю коллекцию прошлого сезона.",
+            discount_text="до -30%",
+            start_date=date.today(),
+            end_date=None,
+            is_active=True,
+        ),
+    ]
+
+
+def _sizes(sizes_json: Optional[str]) -> list[int]:
+    return sorted({int(s) for s in json.loads(sizes_json)}) if sizes_json else []
+
+
+def seed_catalog(db: Session, *, force: bool = False) -> bool:
+    """Заполнить каталог. Возвращает False, если данные уже были и force не задан."""
+    if db.execute(select(func.count()).select_from(Category)).scalar_one():
+        if not force:
+            return False
+        for model in (ProductSize, Product, Subcategory, Category, Promotion):
+            db.execute(delete(model))
+
+    category_ids = dict(zip(
+        (row["slug"] for row in CATEGORIES),
+        db.scalars(insert(Category).returning(Category.id, sort_by_parameter_order=True), CATEGORIES),
+    ))
+
+    subcategory_rows = [
+        {key: value for key, value in row.items() if key != "category_slug"} | {"category_id": category_ids[row["category_slug"]]}
+        for row in SUBCATEGORIES
+    ]
+    # Ключ = category_slug/subcategory_slug: slug подгруппы уникален только внутри категории
+    subcategory_ids = dict(zip(
+        (f"{row['category_slug']}/{row['slug']}" for row in SUBCATEGORIES),
+        db.scalars(insert(Subcategory).returning(Subcategory.id, sort_by_parameter_order=True), subcategory_rows),
+    ))
+
+    # executemany требует одинаковый набор ключей: недостающие поля — None
+    product_columns = {key for row in PRODUCTS for key in row} - {"subcategory_key", "is_new", "is_featured"}
+    product_rows = [
+        {column: row.get(column) for column in product_columns}
+        | {
+            "subcategory_id": subcategory_ids[row["subcategory_key"]],
+            "is_new": row.get("is_new", False),
+            "is_featured": row.get("is_featured", False),
+            "discount_percent": compute_discount(row["price"], row.get("old_price")),
+        }
+        for row in PRODUCTS
+    ]
+    product_ids = db.scalars(insert(Product).returning(Product.id, sort_by_parameter_order=True), product_rows).all()
+
+    size_rows = [
+        {"product_id": product_id, "size": size, "quantity": 1}
+        for product_id, row in zip(product_ids, PRODUCTS)
+        for size in _sizes(row.get("sizes_json"))
+    ]
+    if size_rows:
+        db.execute(insert(ProductSize), size_rows)
+    db.execute(insert(Promotion), _promotions())
+
+    # Коммитит всю транзакцию вместе с поисковым индексом
+    rebuild_search_index(db)
+    return True
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    from .cache import bump_generation
+    from .database import db_session
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--force", action="store_true", help="удалить текущий каталог и акции перед заполнением")
+    args = parser.parse_args(argv)
+
+    with db_session() as db:
+        if not seed_catalog(db, force=args.force):
+            print("Каталог уже заполнен, ничего не сделано (--force, чтобы перезаписать)")
+            return
+    bump_generation()
+    print(
+        f"Добавлено: категорий {len(CATEGORIES)}, подгрупп {len(SUBCATEGORIES)}, "
+        f"товаров {len(PRODUCTS)}, акций {len(_promotions())}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,48 @@
+"""sitemap.xml: индекс и сжатые шарды.
+
+/sitemap.xml — индекс (sitemapindex) со ссылками на
+/sitemap-pages.xml.gz (главная, акции, карта, категории, подгруппы) и
+/sitemap-products-N.xml.gz (не больше 50 000 товаров в каждом).
+
+Шарды пишутся потоково: товары читаются через yield_per, XML сразу
+сжимается в gzip-файл во временном каталоге, который затем атомарно
+переименовывается в instance/sitemaps/{поколение}-{хеш SITE_URL}.
+Готовые файлы общие для всех воркеров, так что обход сайта поисковиком
+не строит sitemap заново; каталоги прошлых поколений удаляются через
+STALE_GRACE_SECONDS, пока их может отдавать другой воркер. lastmod — реальное время
+изменения (products.updated_at), а не дата создания.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Iterable, List
+from pathlib import Path
+from typing import Iterable, Optional
+from xml.sax.saxutils import escape
 
-from fastapi import Request
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
 
-from .models import Category, Subcategory, Product
+from .cache import current_generation
+from .config import settings
+from .database import INSTANCE_DIR, reader_session
+from .models import Category, Product, Promotion, Subcategory
+
+SITEMAP_DIR = INSTANCE_DIR / "sitemaps"
+URLS_PER_SHARD = 50_000
+_YIELD_PER = 2_000
+_MANIFEST = "manifest.json"
+# Каталоги прошлых поколений и других SITE_URL живут ещё столько, сек.:
+# другой воркер может их ещё отдавать
+STALE_GRACE_SECONDS = 3600
 
 
 def _build_url(base_url: str, path: str) -> str:
@@ -14,99 +52,285 @@ def _build_url(base_url: str, path: str) -> str:
     return f"{base}{path}"
 
 
-def _format_lastmod(dt) -> str:
+def _format_lastmod(dt: Optional[datetime]) -> str:
+    """W3C Datetime; время в БД хранится в UTC без зоны."""
     if not dt:
         return ""
-    if isinstance(dt, datetime):
-        return dt.replace(microsecond=0).isoformat()
-    return str(dt)
-
-
-def generate_sitemap_entries(
-    *,
-    base_url: str,
-    categories: Iterable[Category],
-    subcategories: Iterable[Subcategory],
-    products: Iterable[Product],
-) -> List[dict]:
-    entries: List[dict] = []
-
-    # Главная
-    entries.append({"loc": _build_url(base_url, "/"), "changefreq": "daily", "priority": "1.0"})
-
-    # Статические страницы
-    entries.append({"loc": _build_url(base_url, "/promotions"), "changefreq": "weekly", "priority": "0.7"})
-    entries.append({"loc": _build_url(base_url, "/map"), "changefreq": "monthly", "priority": "0.6"})
-
-    # Категории
-    for cat in categories:
-        entries.append({
-            "loc": _build_url(base_url, f"/category/{cat.slug}"),
-            "changefreq": "daily",
-            "priority": "0.9",
-        })
-
-    # Подкатегории
-    for subcat in subcategories:
-        if subcat.category:
-            entries.append({
-                "loc": _build_url(base_url, f"/{subcat.category.slug}/{subcat.slug}"),
-                "changefreq": "daily",
-                "priority": "0.8",
-            })
-
-    # Товары
-    for product in products:
-        entries.append({
-            "loc": _build_url(base_url, f"/product/{product.id}-{product.slug}"),
-            "lastmod": _format_lastmod(product.created_at),
-            "changefreq": "weekly",
-            "priority": "0.7",
-        })
-
-    return entries
-
-
-def generate_sitemap_xml(request: Request, db: Session) -> str:
-    base_url = str(request.base_url).rstrip("/")
+    if dt.tzinfo is None:
+        return dt.replace(microsecond=0).isoformat() + "+00:00"
+    return dt.replace(microsecond=0).isoformat()
 
-    categories = db.query(Category).order_by(Category.sort_order).all()
-    
-    subcategories = (
-        db.query(Subcategory)
-        .options(joinedload(Subcategory.category))
-        .order_by(Subcategory.sort_order)
-        .all()
+
+def _latest(*values: Optional[datetime]) -> Optional[datetime]:
+    present = [v for v in values if v is not None]
+    return max(present) if present else None
+
+
+@dataclass(frozen=True)
+class SitemapFile:
+    name: str
+    lastmod: Optional[datetime]
+
+
+@dataclass(frozen=True)
+class SitemapSet:
+    """Готовые шарды одного поколения каталога."""
+
+    directory: Path
+    files: tuple[SitemapFile, ...]
+
+    def path(self, name: str) -> Optional[Path]:
+        if any(f.name == name for f in self.files):
+            return self.directory / name
+        return None
+
+
+# =============================================================================
+# ПОТОКОВАЯ ЗАПИСЬ
+# =============================================================================
+
+class _UrlsetWriter:
+    """<urlset> прямо в gzip-файл; на диск попадает атомарно при close()."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.count = 0
+        self.lastmod: Optional[datetime] = None
+        fd, self._tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        self._raw = os.fdopen(fd, "wb")
+        # mtime=0: одинаковое содержимое даёт одинаковые байты
+        self._gzip = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=6, mtime=0)
+        self._out = io.TextIOWrapper(self._gzip, encoding="utf-8", write_through=False)
+        self._out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self._out.write('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+
+    def url(
+        self,
+        loc: str,
+        *,
+        lastmod: Optional[datetime] = None,
+        changefreq: Optional[str] = None,
+        priority: Optional[str] = None,
+    ) -> None:
+        parts = [f"  <url>\n    <loc>{escape(loc)}</loc>\n"]
+        if lastmod:
+            parts.append(f"    <lastmod>{_format_lastmod(lastmod)}</lastmod>\n")
+            self.lastmod = _latest(self.lastmod, lastmod)
+        if changefreq:
+            parts.append(f"    <changefreq>{changefreq}</changefreq>\n")
+        if priority:
+            parts.append(f"    <priority>{priority}</priority>\n")
+        parts.append("  </url>\n")
+        self._out.write("".join(parts))
+        self.count += 1
+
+    def close(self) -> SitemapFile:
+        self._out.write("</urlset>\n")
+        self._out.close()  # закрывает gzip, но не файл под ним
+        self._raw.close()
+        os.replace(self._tmp_name, self.path)
+        return SitemapFile(self.path.name, self.lastmod)
+
+    def abort(self) -> None:
+        self._out.close()
+        self._raw.close()
+        Path(self._tmp_name).unlink(missing_ok=True)
+
+
+def _write_pages(db: Session, base_url: str, directory: Path) -> SitemapFile:
+    # Последнее изменение товаров по подгруппам — lastmod для разделов и главной
+    changed_by_subcategory = dict(
+        db.execute(
+            select(Product.subcategory_id, func.max(func.coalesce(Product.updated_at, Product.created_at)))
+            .where(Product.is_active.is_(True))
+            .group_by(Product.subcategory_id)
+        ).all()
     )
-    
-    products = (
-        db.query(Product)
-        .filter(Product.is_active.is_(True))
-        .order_by(Product.created_at.desc())
-        .all()
+    promotions_changed = db.execute(
+        select(func.max(Promotion.created_at)).where(Promotion.is_active.is_(True))
+    ).scalar_one()
+    categories = db.query(Category).order_by(Category.sort_order).all()
+    subcategories = db.query(Subcategory).order_by(Subcategory.sort_order).all()
+
+    by_category: dict[int, Optional[datetime]] = {}
+    for sub in subcategories:
+        by_category[sub.category_id] = _latest(by_category.get(sub.category_id), changed_by_subcategory.get(sub.id))
+    category_slugs = {cat.id: cat.slug for cat in categories}
+
+    writer = _UrlsetWriter(directory / "sitemap-pages.xml.gz")
+    try:
+        writer.url(
+            _build_url(base_url, "/"),
+            lastmod=_latest(*changed_by_subcategory.values()),
+            changefreq="daily",
+            priority="1.0",
+        )
+        writer.url(_build_url(base_url, "/promotions"), lastmod=promotions_changed, changefreq="weekly", priority="0.7")
+        writer.url(_build_url(base_url, "/map"), changefreq="monthly", priority="0.6")
+        for cat in categories:
+            writer.url(
+                _build_url(base_url, f"/category/{cat.slug}"),
+                lastmod=by_category.get(cat.id),
+                changefreq="daily",
+                priority="0.9",
+            )
+        for sub in subcategories:
+            category_slug = category_slugs.get(sub.category_id)
+            if category_slug:
+                writer.url(
+                    _build_url(base_url, f"/{category_slug}/{sub.slug}"),
+                    lastmod=changed_by_subcategory.get(sub.id),
+                    changefreq="daily",
+                    priority="0.8",
+                )
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.close()
+
+
+def _write_products(db: Session, base_url: str, directory: Path) -> list[SitemapFile]:
+    rows = db.execute(
+        select(Product.id, Product.slug, Product.updated_at, Product.created_at)
+        .where(Product.is_active.is_(True))
+        .order_by(Product.id)
+        # yield_per включает stream_results: на PostgreSQL это серверный курсор,
+        # в памяти не больше _YIELD_PER строк
+        .execution_options(yield_per=_YIELD_PER)
     )
+    files: list[SitemapFile] = []
+    writer: Optional[_UrlsetWriter] = None
+    try:
+        for product_id, slug, updated_at, created_at in rows:
+            if writer is None:
+                writer = _UrlsetWriter(directory / f"sitemap-products-{len(files) + 1}.xml.gz")
+            writer.url(
+                _build_url(base_url, f"/product/{product_id}-{slug}"),
+                lastmod=updated_at or created_at,
+                changefreq="weekly",
+                priority="0.7",
+            )
+            if writer.count >= URLS_PER_SHARD:
+                files.append(writer.close())
+                writer = None
+        if writer is not None:
+            files.append(writer.close())
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    return files
+
 
-    entries = generate_sitemap_entries(
-        base_url=base_url,
-        categories=categories,
-        subcategories=subcategories,
-        products=products,
+def build_sitemaps(db: Session, base_url: str, directory: Path) -> SitemapSet:
+    """Записать все шарды в directory и манифест со списком файлов."""
+    directory.mkdir(parents=True, exist_ok=True)
+    files = [_write_pages(db, base_url, directory), *_write_products(db, base_url, directory)]
+    manifest = [{"name": f.name, "lastmod": f.lastmod.isoformat() if f.lastmod else None} for f in files]
+    fd, tmp_name = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    with os.fdopen(fd, "w") as tmp:
+        json.dump(manifest, tmp)
+    os.replace(tmp_name, directory / _MANIFEST)
+    return SitemapSet(directory, tuple(files))
+
+
+def _load_manifest(directory: Path) -> Optional[SitemapSet]:
+    try:
+        entries = json.loads((directory / _MANIFEST).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    files = tuple(
+        SitemapFile(e["name"], datetime.fromisoformat(e["lastmod"]) if e["lastmod"] else None) for e in entries
     )
+    if not all((directory / f.name).is_file() for f in files):
+        return None
+    return SitemapSet(directory, files)
+
+
+# =============================================================================
+# КЭШ ПО ПОКОЛЕНИЮ КАТАЛОГА
+# =============================================================================
+
+_lock = threading.Lock()
+_current: Optional[tuple[int, SitemapSet]] = None
+
+
+def get_sitemaps() -> SitemapSet:
+    """Шарды текущего поколения; строятся один раз. Вызывать из threadpool.
+
+    Адреса строятся от settings.site_url, а не от Host запроса: иначе
+    каждый новый Host собирал бы все шарды заново в отдельный каталог.
+    """
+    global _current
+    generation = current_generation()
+    cached = _current
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+
+    with _lock:
+        cached = _current
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        base_url = settings.site_url
+        # Хеш адреса в имени: после смены SITE_URL шарды того же поколения пересобираются
+        directory = SITEMAP_DIR / f"{generation}-{hashlib.sha1(base_url.encode()).hexdigest()[:8]}"
+        # Другой воркер мог уже собрать это поколение
+        sitemaps = _load_manifest(directory)
+        if sitemaps is None:
+            sitemaps = _build_into(directory, base_url)
+            _remove_stale(directory)
+        _current = (generation, sitemaps)
+        return sitemaps
+
+
+def _build_into(directory: Path, base_url: str) -> SitemapSet:
+    """Собрать шарды во временном каталоге и переименовать его в directory.
+
+    Читатели видят либо готовый каталог целиком, либо никакого. Если
+    другой воркер успел первым, берётся его результат.
+    """
+    SITEMAP_DIR.mkdir(parents=True, exist_ok=True)
+    building = Path(tempfile.mkdtemp(dir=SITEMAP_DIR, prefix=".build-"))
+    try:
+        with reader_session() as db:
+            files = build_sitemaps(db, base_url, building).files
+        os.rename(building, directory)
+    except OSError:
+        shutil.rmtree(building, ignore_errors=True)
+        sitemaps = _load_manifest(directory)
+        if sitemaps is None:
+            raise
+        return sitemaps
+    except BaseException:
+        shutil.rmtree(building, ignore_errors=True)
+        raise
+    return SitemapSet(directory, files)
+
+
+def _remove_stale(current: Path) -> None:
+    """Удалить чужие каталоги (и брошенные сборки) старше STALE_GRACE_SECONDS."""
+    cutoff = time.time() - STALE_GRACE_SECONDS
+    for old in SITEMAP_DIR.iterdir():
+        if old == current or not old.is_dir():
+            continue
+        try:
+            if old.stat().st_mtime >= cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        shutil.rmtree(old, ignore_errors=True)
+
 
-    parts: List[str] = []
-    parts.append('<?xml version="1.0" encoding="UTF-8"?>')
-    parts.append('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
-    
-    for item in entries:
-        parts.append("  <url>")
-        parts.append(f"    <loc>{item['loc']}</loc>")
-        if item.get("lastmod"):
-            parts.append(f"    <lastmod>{item['lastmod']}</lastmod>")
-        if item.get("changefreq"):
-            parts.append(f"    <changefreq>{item['changefreq']}</changefreq>")
-        if item.get("priority"):
-            parts.append(f"    <priority>{item['priority']}</priority>")
-        parts.append("  </url>")
-    
-    parts.append("</urlset>")
+def sitemap_index_xml(base_url: str, files: Iterable[SitemapFile]) -> str:
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">',
+    ]
+    for item in files:
+        parts.append("  <sitemap>")
+        parts.append(f"    <loc>{escape(_build_url(base_url, '/' + item.name))}</loc>")
+        if item.lastmod:
+            parts.append(f"    <lastmod>{_format_lastmod(item.lastmod)}</lastmod>")
+        parts.append("  </sitemap>")
+    parts.append("</sitemapindex>")
     return "\n".join(parts)
@@ -0,0 +1,167 @@
+"""Настройки SQLite для прода и метрики блокировок.
+
+Каждое новое соединение получает PRAGMA из SqliteProfile:
+WAL (читатели не ждут записи админки), synchronous=NORMAL (в WAL
+безопасно: при сбое питания теряется только последняя транзакция, а не
+целостность), mmap, кэш страниц, временные таблицы в памяти и
+busy_timeout. Соединения публичной части открываются с query_only — они
+физически не могут ничего записать.
+
+Ожидание блокировки записи видно только по времени. Перед первым
+INSERT/UPDATE/DELETE транзакции пишущее соединение само выполняет
+BEGIN IMMEDIATE: он ждёт busy_timeout, пока пишет другой процесс, и
+ничего больше не делает. LockMetrics считает время этого шага (без
+выполнения самого оператора — долгий массовый UPDATE не выглядит
+ожиданием) и ошибки «database is locked». Счётчики — на воркер.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+_WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+# Границы гистограммы ожидания блокировки, сек.
+WAIT_BUCKETS = (0.001, 0.01, 0.1, 1.0, 5.0)
+SLOW_LOCK_WAIT = 1.0
+
+
+@dataclass(frozen=True)
+class SqliteProfile:
+    journal_mode: str = settings.sqlite_journal_mode
+    synchronous: str = settings.sqlite_synchronous
+    mmap_bytes: int = settings.sqlite_mmap_mb * 1024 * 1024
+    cache_kib: int = settings.sqlite_cache_mb * 1024
+    temp_store: str = settings.sqlite_temp_store
+    busy_timeout_ms: int = settings.sqlite_busy_timeout_ms
+
+    def pragmas(self, *, reader: bool) -> list[str]:
+        statements = [
+            f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}",
+            f"PRAGMA synchronous = {self.synchronous}",
+            f"PRAGMA mmap_size = {int(self.mmap_bytes)}",
+            # Отрицательное значение — размер в КиБ, а не в страницах
+            f"PRAGMA cache_size = -{int(self.cache_kib)}",
+            f"PRAGMA temp_store = {self.temp_store}",
+        ]
+        if reader:
+            statements.append("PRAGMA query_only = ON")
+        else:
+            # Режим журнала хранится в файле БД; меняет его только пишущее соединение
+            statements.insert(0, f"PRAGMA journal_mode = {self.journal_mode}")
+        return statements
+
+
+profile = SqliteProfile()
+
+
+# =============================================================================
+# МЕТРИКИ
+# =============================================================================
+
+@dataclass
+class LockMetrics:
+    write_transactions: int = 0
+    lock_wait_seconds: float = 0.0
+    lock_wait_max: float = 0.0
+    slow_lock_waits: int = 0
+    busy_errors: int = 0
+    buckets: list[int] = field(default_factory=lambda: [0] * (len(WAIT_BUCKETS) + 1))
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.write_transactions += 1
+            self.lock_wait_seconds += seconds
+            self.lock_wait_max = max(self.lock_wait_max, seconds)
+            index = next((i for i, bound in enumerate(WAIT_BUCKETS) if seconds <= bound), len(WAIT_BUCKETS))
+            self.buckets[index] += 1
+            if seconds >= SLOW_LOCK_WAIT:
+                self.slow_lock_waits += 1
+        if seconds >= SLOW_LOCK_WAIT:
+            logger.warning("SQLite: ожидание блокировки записи %.2f с", seconds)
+
+    def record_busy(self) -> None:
+        with self._lock:
+            self.busy_errors += 1
+        logger.warning("SQLite: database is locked (busy_timeout %d мс исчерпан)", profile.busy_timeout_ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f"le_{bound:g}s" for bound in WAIT_BUCKETS] + ["inf"]
+            return {
+                "write_transactions": self.write_transactions,
+                "lock_wait_seconds": round(self.lock_wait_seconds, 6),
+                "lock_wait_max_seconds": round(self.lock_wait_max, 6),
+                "slow_lock_waits": self.slow_lock_waits,
+                "busy_errors": self.busy_errors,
+                "lock_wait_histogram": dict(zip(labels, self.buckets)),
+            }
+
+
+metrics = LockMetrics()
+
+
+# =============================================================================
+# ПОДКЛЮЧЕНИЕ К ENGINE
+# =============================================================================
+
+def _apply_pragmas(dbapi_connection, statements: list[str]) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for statement in statements:
+            cursor.execute(statement)
+    finally:
+        cursor.close()
+
+
+def _is_busy(exception: BaseException) -> bool:
+    message = str(exception).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+def configure_engine(engine: Engine, *, reader: bool) -> None:
+    """Навесить PRAGMA и метрики на синхронный engine (для async — engine.sync_engine)."""
+    statements = profile.pragmas(reader=reader)
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record) -> None:
+        _apply_pragmas(dbapi_connection, statements)
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(context) -> None:
+        if _is_busy(context.original_exception):
+            metrics.record_busy()
+
+    if reader:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        if conn.info.get("sqlite_writing") or not statement.lstrip()[:7].upper().startswith(_WRITE_PREFIXES):
+            return
+        conn.info["sqlite_writing"] = True
+        if conn.connection.dbapi_connection.in_transaction:
+            # Транзакцию уже открыли явно: ожидание не отделить от выполнения
+            return
+        # Блокировку записи берём заранее и меряем только её, без выполнения оператора;
+        # pysqlite видит открытую транзакцию и свой BEGIN не добавляет
+        started = time.perf_counter()
+        cursor.execute("BEGIN IMMEDIATE")
+        metrics.record_wait(time.perf_counter() - started)
+
+    @event.listens_for(engine, "commit")
+    @event.listens_for(engine, "rollback")
+    def _on_end(conn) -> None:
+        conn.info.pop("sqlite_writing", None)
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record) -> None:
+        connection_record.info.pop("sqlite_writing", None)
@@ -0,0 +1,154 @@
+"""Счётчики каталога из таблицы catalog_stats.
+
+Таблицу ведут триггеры БД (миграция 0006): любая запись в products,
+product_sizes или subcategories сразу правит нужные строки, поэтому
+дашборду и публичным страницам не нужны COUNT(*) по товарам. Чтение —
+один SELECT по нескольким десяткам строк, размер каталога на него не
+влияет.
+
+Публичная часть держит снимок счётчиков в памяти до смены поколения
+каталога, как и дерево категорий (app/catalog.py). ensure_catalog_stats()
+после миграций (python -m app.schema upgrade) сверяет таблицу с
+пересчётом и перестраивает её, если они разошлись.
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from sqlalchemy import delete, func, insert, literal, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .cache import current_generation
+from .models import CatalogStat, Product, ProductSize, Subcategory
+
+# Общие счётчики (ref_id = 0) и счётчики по id категории, подгруппы, размеру
+TOTAL_SCOPES = ("active", "new", "sale", "featured")
+SCOPE_CATEGORY = "category"
+SCOPE_SUBCATEGORY = "subcategory"
+SCOPE_SIZE = "size"
+
+@dataclass(frozen=True)
+class CatalogStats:
+    """Число активных товаров: всего, по витринам, категориям, подгруппам и размерам."""
+
+    active: int
+    new: int
+    sale: int
+    featured: int
+    by_category: Mapping[int, int]
+    by_subcategory: Mapping[int, int]
+    by_size: Mapping[int, int]
+
+    def category(self, category_id: int) -> int:
+        return self.by_category.get(category_id, 0)
+
+    def subcategory(self, subcategory_id: int) -> int:
+        return self.by_subcategory.get(subcategory_id, 0)
+
+    @property
+    def sizes(self) -> list[tuple[int, int]]:
+        """(размер, товаров) по возрастанию размера, без нулевых."""
+        return sorted((size, count) for size, count in self.by_size.items() if count)
+
+
+def _stats_from_rows(rows) -> CatalogStats:
+    totals: dict[str, int] = {}
+    grouped: dict[str, dict[int, int]] = defaultdict(dict)
+    for scope, ref_id, total in rows:
+        if scope in TOTAL_SCOPES:
+            totals[scope] = total
+        else:
+            grouped[scope][ref_id] = total
+    return CatalogStats(
+        **{scope: totals.get(scope, 0) for scope in TOTAL_SCOPES},
+        by_category=MappingProxyType(grouped[SCOPE_CATEGORY]),
+        by_subcategory=MappingProxyType(grouped[SCOPE_SUBCATEGORY]),
+        by_size=MappingProxyType(grouped[SCOPE_SIZE]),
+    )
+
+
+_SELECT_STATS = select(CatalogStat.scope, CatalogStat.ref_id, CatalogStat.total)
+
+
+def load_catalog_stats(db: Session) -> CatalogStats:
+    """Счётчики одним запросом (админка, синхронная сессия)."""
+    return _stats_from_rows(db.execute(_SELECT_STATS).all())
+
+
+_snapshot: Optional[tuple[int, CatalogStats]] = None
+
+
+async def get_catalog_stats(db: AsyncSession) -> CatalogStats:
+    """Снимок для текущего поколения каталога; перечитывается после его смены."""
+    global _snapshot
+    generation = current_generation()
+    cached = _snapshot
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+    stats = _stats_from_rows((await db.execute(_SELECT_STATS)).all())
+    _snapshot = (generation, stats)
+    return stats
+
+
+# =============================================================================
+# ПЕРЕСЧЁТ
+# =============================================================================
+
+def _counts_query():
+    """Те же счётчики, посчитанные по products заново (без нулевых)."""
+    active = Product.is_active.is_(True)
+
+    def total(scope: str, *conditions):
+        return select(literal(scope), literal(0), func.count()).where(active, *conditions)
+
+    return union_all(
+        total("active"),
+        total("new", Product.is_new.is_(True)),
+        total("sale", Product.is_on_sale),
+        total("featured", Product.is_featured.is_(True)),
+        select(literal(SCOPE_SUBCATEGORY), Product.subcategory_id, func.count())
+        .where(active, Product.subcategory_id.isnot(None))
+        .group_by(Product.subcategory_id),
+        select(literal(SCOPE_CATEGORY), Subcategory.category_id, func.count())
+        .join_from(Product, Subcategory, Subcategory.id == Product.subcategory_id)
+        .where(active)
+        .group_by(Subcategory.category_id),
+        select(literal(SCOPE_SIZE), ProductSize.size, func.count())
+        .join_from(ProductSize, Product, Product.id == ProductSize.product_id)
+        .where(active, ProductSize.quantity > 0)
+        .group_by(ProductSize.size),
+    )
+
+
+def count_catalog_stats(db: Session) -> dict[tuple[str, int], int]:
+    return {
+        (scope, ref_id): total
+        for scope, ref_id, total in db.execute(_counts_query()).all()
+        if total
+    }
+
+
+def rebuild_catalog_stats(db: Session) -> int:
+    """Пересчитать таблицу заново. Возвращает число строк."""
+    counts = count_catalog_stats(db)
+    db.execute(delete(CatalogStat))
+    if counts:
+        db.execute(
+            insert(CatalogStat),
+            [{"scope": scope, "ref_id": ref_id, "total": total} for (scope, ref_id), total in counts.items()],
+        )
+    db.commit()
+    return len(counts)
+
+
+def ensure_catalog_stats(db: Session) -> None:
+    """Перестроить счётчики, если они разошлись с пересчётом (восстановленный бэкап,
+    правки при отключённых триггерах)."""
+    stored = {(scope, ref_id): total for scope, ref_id, total in db.execute(_SELECT_STATS).all() if total}
+    if stored != count_catalog_stats(db):
+        rebuild_catalog_stats(db)
+    else:
+        db.commit()
@@ -0,0 +1,149 @@
+"""Общее окружение Jinja2 для публичной части и админки.
+
+Одно окружение на процесс: фильтры регистрируются один раз, байткод
+шаблонов кэшируется в instance/jinja-cache (общий для воркеров и
+рестартов, с хешем настроек компиляции в имени файла), в проде (APP_ENV=production) шаблоны не перепроверяются на
+диске. precompile_templates() при старте загружает все шаблоны, чтобы
+первый запрос после деплоя не платил за компиляцию.
+
+Отступы и пустые строки HTML убираются при компиляции
+(HtmlWhitespaceExtension), а не на каждом рендере.
+"""
+
+import hashlib
+import inspect
+import json
+import re
+from pathlib import Path
+from typing import Iterator, List
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from jinja2.ext import Extension
+from jinja2.lexer import Token, TokenStream
+
+from .assets import register_globals
+from .config import settings
+from .database import INSTANCE_DIR
+from .fragments import register_globals as register_fragment_globals
+from .images import register_filters
+from .models import Product
+
+TEMPLATES_DIR = Path(__file__).resolve().parent / "templates"
+BYTECODE_DIR = INSTANCE_DIR / "jinja-cache"
+
+
+class HtmlWhitespaceExtension(Extension):
+    """Схлопнуть перевод строки с отступом в один перевод строки.
+
+    Меняется только текст самих шаблонов, вывод {{ ... }} не трогается.
+    Содержимое <pre> и <textarea> остаётся как есть. Перевод строки
+    сохраняется, поэтому пробелы между inline-элементами и разбор JS
+    в <script> не меняются.
+    """
+
+    _INDENT = re.compile(r"[ \t]*\n\s*")
+    _RAW_TAG = re.compile(r"<(/?)(pre|textarea)\b", re.IGNORECASE)
+
+    def filter_stream(self, stream: TokenStream) -> Iterator[Token]:
+        inside_raw = False
+        for token in stream:
+            if token.type == "data":
+                value, inside_raw = self._collapse(token.value, inside_raw)
+                token = Token(token.lineno, token.type, value)
+            yield token
+
+    def _collapse(self, value: str, inside_raw: bool) -> tuple[str, bool]:
+        out: list[str] = []
+        position = 0
+        for match in self._RAW_TAG.finditer(value):
+            chunk = value[position:match.start()]
+            out.append(chunk if inside_raw else self._INDENT.sub("\n", chunk))
+            out.append(match.group(0))
+            inside_raw = not match.group(1)
+            position = match.end()
+        tail = value[position:]
+        out.append(tail if inside_raw else self._INDENT.sub("\n", tail))
+        return "".join(out), inside_raw
+
+
+# Jinja2 фильтры
+def parse_sizes(value: Product | str | None) -> List[int]:
+    """Размеры в наличии: из product_sizes для товара, из JSON для строки."""
+    if isinstance(value, Product):
+        return value.available_sizes
+    if not value:
+        return []
+    try:
+        return json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return []
+
+
+def from_json(value: str | None) -> list | dict | None:
+    """Универсальный парсинг JSON."""
+    if not value:
+        return []
+    try:
+        return json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return []
+
+
+def plural(count: int, one: str, few: str, many: str) -> str:
+    """Форма слова для числа: 1 модель, 2 модели, 5 моделей."""
+    count = abs(int(count))
+    if count % 10 == 1 and count % 100 != 11:
+        return one
+    if 2 <= count % 10 <= 4 and not 12 <= count % 100 <= 14:
+        return few
+    return many
+
+
+# Всё, что влияет на компиляцию шаблона, кроме его текста
+_ENV_OPTIONS = {"autoescape": True, "lstrip_blocks": True}
+_EXTENSIONS = (HtmlWhitespaceExtension,)
+
+
+def _environment_version() -> str:
+    """Хеш настроек компиляции: ключ байткода в Jinja2 учитывает только текст шаблона."""
+    parts = [repr(sorted(_ENV_OPTIONS.items()))] + [inspect.getsource(ext) for ext in _EXTENSIONS]
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()[:12]
+
+
+def _bytecode_cache() -> FileSystemBytecodeCache:
+    """Кэш байткода текущей версии настроек; файлы прошлых версий удаляются."""
+    BYTECODE_DIR.mkdir(parents=True, exist_ok=True)
+    prefix = f"__jinja2_{_environment_version()}_"
+    for stale in BYTECODE_DIR.glob("__jinja2_*.cache"):
+        if not stale.name.startswith(prefix):
+            stale.unlink(missing_ok=True)
+    return FileSystemBytecodeCache(str(BYTECODE_DIR), pattern=f"{prefix}%s.cache")
+
+
+def _create_environment() -> Environment:
+    env = Environment(
+        loader=FileSystemLoader(str(TEMPLATES_DIR)),
+        auto_reload=not settings.is_production,
+        bytecode_cache=_bytecode_cache(),
+        extensions=list(_EXTENSIONS),
+        **_ENV_OPTIONS,
+    )
+    env.filters["parse_sizes"] = parse_sizes
+    env.filters["from_json"] = from_json
+    env.filters["plural"] = plural
+    register_filters(env)
+    register_globals(env)
+    register_fragment_globals(env)
+    return env
+
+
+templates = Jinja2Templates(env=_create_environment())
+
+
+def precompile_templates() -> int:
+    """Загрузить все шаблоны в кэш окружения. Возвращает их число."""
+    names = templates.env.list_templates(extensions=["html", "xml"])
+    for name in names:
+        templates.env.get_template(name)
+    return len(names)
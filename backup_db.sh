@@ -11,7 +11,8 @@ mkdir -p "$BACKUP_DIR"
 
 # Create backup
 if [ -f "$DB_PATH" ]; then
-    cp "$DB_PATH" "$BACKUP_DIR/shop_$DATE.db"
+    # База в режиме WAL: часть данных лежит в shop.db-wal, поэтому не cp, а онлайн-бэкап
+    sqlite3 "$DB_PATH" ".backup '$BACKUP_DIR/shop_$DATE.db'" || exit 1
     echo "✅ Backup created: shop_$DATE.db"
     
     # Compress old backups (optional)
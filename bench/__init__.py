@@ -0,0 +1,10 @@
+"""Замеры производительности: python -m bench.<модуль>."""
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Перцентиль по ближайшему рангу; 0 для пустого списка."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
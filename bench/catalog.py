@@ -0,0 +1,144 @@
+"""Синтетический каталог для замеров: 10–200 тыс. товаров в отдельной базе.
+
+    python -m bench.catalog --products 50000
+    DATABASE_URL=sqlite:///./instance/bench.db python -m bench.micro
+
+База по умолчанию — instance/bench.db (DATABASE_URL задаётся через --url,
+основная instance/shop.db не принимается). Схема создаётся миграциями,
+категории, подгруппы и акции — сидом (app/seed.py), затем пачками
+добавляются товары: русские названия со slug из той же slugify(), что у
+админки, размеры в product_sizes, фото из демо-каталога, цены со
+скидками и даты за два года. В конце перестраивается поисковый индекс.
+
+Набор товаров задаётся зерном (--seed): замеры на разных коммитах идут
+на одинаковом каталоге (даты отсчитываются от момента генерации).
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Iterator
+
+DEFAULT_URL = "sqlite:///./instance/bench.db"
+CHUNK = 5_000
+
+ADJECTIVES = (
+    "кожаные", "замшевые", "лакированные", "на меху", "на платформе", "на каблуке",
+    "классические", "утеплённые", "с перфорацией", "на шнуровке", "на молнии", "нубуковые",
+)
+MODELS = (
+    "Валери", "Сандра", "Ника", "Алиса", "Вероника", "Марта", "Ева", "Лилия", "Камила",
+    "Дана", "Эльза", "Аврора", "Белла", "Nordic", "Frost", "City", "Soft Line", "Classic",
+)
+COLORS = ("чёрный", "коричневый", "бежевый", "бордовый", "серый", "белый", "рыжий", "синий", "молочный")
+MATERIALS = ("натуральной кожи", "замши", "нубука", "лакированной кожи")
+SIZES = tuple(range(35, 42))
+
+
+def _products(rng: random.Random, count: int, subcategories: list[tuple[int, str]], images: list[str]) -> Iterator[dict]:
+    from app.admin import slugify
+    from app.models import compute_discount
+
+    now = datetime.utcnow()
+    for _ in range(count):
+        subcategory_id, subcategory_name = rng.choice(subcategories)
+        code = f"{rng.choice('ABMKT')}{rng.randint(1, 9)}-{rng.randint(1000, 9999)}"
+        name = f"{subcategory_name} {rng.choice(ADJECTIVES)} «{rng.choice(MODELS)}» {code}"
+        price = float(rng.randrange(3900, 18900, 100))
+        old_price = float(round(price * rng.uniform(1.1, 1.5), -2)) if rng.random() < 0.2 else None
+        first = rng.randint(0, len(SIZES) - 3)
+        sizes = list(SIZES[first:first + rng.randint(3, len(SIZES) - first)])
+        created_at = now - timedelta(seconds=rng.randint(0, 730 * 24 * 3600))
+        yield {
+            "name": name,
+            "slug": slugify(name),
+            "description": f"{subcategory_name} из {rng.choice(MATERIALS)}. Модель {code}, сделано для пермской погоды.",
+            "price": price,
+            "old_price": old_price,
+            "discount_percent": compute_discount(price, old_price),
+            "sizes": sizes,
+            "color": rng.choice(COLORS),
+            "image_url": rng.choice(images),
+            "is_active": rng.random() < 0.95,
+            "is_new": rng.random() < 0.1,
+            "is_featured": rng.random() < 0.05,
+            "created_at": created_at,
+            "updated_at": created_at,
+            "subcategory_id": subcategory_id,
+        }
+
+
+def generate(count: int, *, seed: int, force: bool) -> int:
+    """Залить каталог; возвращает число товаров в базе."""
+    from sqlalchemy import func, insert, select
+
+    from app.database import db_session
+    from app.models import Product, ProductSize, Subcategory
+    from app.search import rebuild_search_index
+    from app.seed import PRODUCTS, seed_catalog
+
+    rng = random.Random(seed)
+    images = sorted({row["image_url"] for row in PRODUCTS if row.get("image_url")})
+
+    with db_session() as db:
+        if not seed_catalog(db, force=force):
+            raise SystemExit("В базе уже есть каталог; --force, чтобы пересоздать")
+        subcategories = [tuple(row) for row in db.execute(select(Subcategory.id, Subcategory.name).order_by(Subcategory.id))]
+
+        def flush(batch: list[dict]) -> None:
+            sizes = [row.pop("sizes") for row in batch]
+            for row, row_sizes in zip(batch, sizes):
+                row["sizes_json"] = json.dumps(row_sizes)
+            ids = db.scalars(insert(Product).returning(Product.id, sort_by_parameter_order=True), batch).all()
+            db.execute(
+                insert(ProductSize),
+                [
+                    {"product_id": product_id, "size": size, "quantity": 1}
+                    for product_id, row_sizes in zip(ids, sizes)
+                    for size in row_sizes
+                ],
+            )
+
+        batch: list[dict] = []
+        for row in _products(rng, count, subcategories, images):
+            batch.append(row)
+            if len(batch) == CHUNK:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+        # Коммитит всю транзакцию вместе с поисковым индексом
+        rebuild_search_index(db)
+        return db.execute(select(func.count()).select_from(Product)).scalar_one()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=10_000, help="сколько товаров добавить (10–200 тыс.)")
+    parser.add_argument("--url", default=DEFAULT_URL, help="DATABASE_URL тестовой базы")
+    parser.add_argument("--seed", type=int, default=1, help="зерно генератора")
+    parser.add_argument("--force", action="store_true", help="удалить каталог, если база уже заполнена")
+    args = parser.parse_args(argv)
+
+    # Engine создаётся при импорте app.database — URL нужно задать до него
+    os.environ["DATABASE_URL"] = args.url
+    from app.cache import bump_generation
+    from app.database import DB_PATH, INSTANCE_DIR
+    from app.schema import upgrade_schema
+
+    if DB_PATH is not None and DB_PATH.resolve() == (INSTANCE_DIR / "shop.db").resolve():
+        parser.error("генератор не пишет в рабочую базу instance/shop.db")
+
+    started = time.perf_counter()
+    upgrade_schema()
+    total = generate(args.products, seed=args.seed, force=args.force)
+    bump_generation()
+    print(f"Товаров в базе: {total} ({args.url}), {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
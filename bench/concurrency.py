@@ -0,0 +1,143 @@
+"""Нагрузочный замер запаса по конкурентности публичных роутов.
+
+Гоняет приложение в процессе через httpx.ASGITransport на нескольких
+уровнях конкурентности и печатает пропускную способность и p50/p95/p99.
+Опционально держит в фоне эксклюзивную блокировку SQLite, имитируя
+медленный commit из админки: так видно, упираются ли читатели в
+threadpool, пока БД занята.
+
+Запуск (нужен httpx: pip install httpx):
+
+    python -m bench.concurrency --levels 10 50 100 200 --lock-hold 0.2
+
+Для сравнения «до/после» запустите скрипт на двух коммитах с одинаковыми
+параметрами. База берётся из DATABASE_URL, так что тот же замер можно
+прогнать на SQLite и на PostgreSQL. Кэш страниц на время замера отключается (--with-page-cache
+включает его обратно).
+"""
+
+import argparse
+import asyncio
+import sqlite3
+import statistics
+import threading
+import time
+
+import anyio.to_thread
+import httpx
+
+from app.cache import page_cache
+from app.database import DB_PATH
+from app.main import app
+from app.schema import check_schema
+from bench import percentile
+
+DEFAULT_PATHS = [
+    "/",
+    "/products",
+    "/products?size=37",
+    "/featured",
+    "/sale",
+    "/category/zimnyaya",
+    "/zimnyaya/botinki",
+    "/hx/products/botinki",
+]
+
+
+def _hold_write_lock(stop: threading.Event, hold: float, pause: float) -> None:
+    """Периодически захватывать эксклюзивную блокировку, как долгий commit."""
+    conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    try:
+        while not stop.is_set():
+            conn.execute("BEGIN EXCLUSIVE")
+            time.sleep(hold)
+            conn.execute("COMMIT")
+            time.sleep(pause)
+    finally:
+        conn.close()
+
+
+async def _run_level(client: httpx.AsyncClient, paths: list[str], total: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    queue: asyncio.Queue[str] = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(paths[i % len(paths)])
+
+    async def worker() -> None:
+        nonlocal errors
+        while True:
+            try:
+                path = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code >= 500:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "rps": total / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": statistics.fmean(latencies) if latencies else 0.0,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    check_schema()
+    if not args.with_page_cache:
+        page_cache.max_entries = 0
+    # Тот же лимит потоков, что у uvicorn по умолчанию (AnyIO: 40)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = args.threads
+
+    stop = threading.Event()
+    locker = None
+    if args.lock_hold > 0:
+        locker = threading.Thread(
+            target=_hold_write_lock, args=(stop, args.lock_hold, args.lock_pause), daemon=True
+        )
+        locker.start()
+
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench.local") as client:
+            await _run_level(client, args.paths, len(args.paths), 1)  # прогрев
+            print(f"{'conc':>6} {'rps':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+            for level in args.levels:
+                row = await _run_level(client, args.paths, args.requests, level)
+                print(
+                    f"{row['concurrency']:>6} {row['rps']:>9.1f} {row['p50_ms']:>7.1f}ms "
+                    f"{row['p95_ms']:>7.1f}ms {row['p99_ms']:>7.1f}ms {row['errors']:>7}"
+                )
+    finally:
+        stop.set()
+        if locker:
+            locker.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--requests", type=int, default=400, help="запросов на уровень")
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+    parser.add_argument("--threads", type=int, default=40, help="лимит потоков AnyIO")
+    parser.add_argument("--lock-hold", type=float, default=0.0, help="сек. держать блокировку записи")
+    parser.add_argument("--lock-pause", type=float, default=0.5, help="сек. между блокировками")
+    parser.add_argument("--with-page-cache", action="store_true")
+    arguments = parser.parse_args()
+    if arguments.lock_hold > 0 and DB_PATH is None:
+        parser.error("--lock-hold имитирует блокировку файла SQLite, с DATABASE_URL на PostgreSQL он не работает")
+    asyncio.run(main(arguments))
@@ -0,0 +1,322 @@
+"""Микро-замеры горячих путей с результатом в JSON.
+
+Каждый замер гоняется отдельно: прогрев, затем --repeat повторов,
+в результат пишутся p50/p90/p99, среднее, минимум и максимум в мс.
+
+  * route:<путь> — роуты app/main.py через httpx.ASGITransport в процессе
+    (кэш страниц выключен, меряется рендер, а не отдача из кэша);
+  * sitemap:build — сборка всех шардов sitemap (app/seo.py);
+  * template:products_list — рендер products_list.html на 24 товара;
+  * slugify — slug из русского названия (app/admin.py);
+  * admin:filters[...] — выборки списка товаров админки.
+
+    python -m bench.catalog --products 50000       # тестовая база
+    DATABASE_URL=sqlite:///./instance/bench.db python -m bench.micro
+    python -m bench.micro --only route: --repeat 200
+    python -m bench.micro --compare instance/bench/1a2b3c4.json
+
+Результат — instance/bench/<коммит>.json (или --output). С --compare
+рядом печатается изменение p50/p90 относительно прошлого файла, и
+замеры, ставшие медленнее на --threshold процентов, помечаются.
+Кэш карточек включён так же, как на сервере: только при APP_ENV=production.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+import httpx
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+
+from app.admin import get_products_with_filters, slugify
+from app.cache import page_cache
+from app.catalog import build_catalog_snapshot
+from app.config import settings
+from app.database import INSTANCE_DIR, SQLALCHEMY_DATABASE_URL, db_session
+from app.main import app
+from app.models import Product, Subcategory
+from app.pagination import PAGE_SIZE, Page, encode_cursor
+from app.schema import check_schema
+from app.seo import build_sitemaps
+from app.templating import templates
+from bench import percentile
+
+RESULTS_DIR = INSTANCE_DIR / "bench"
+
+ROUTES = [
+    "/",
+    "/products",
+    "/products?size=37",
+    "/products?season=zimnyaya&price=5000-10000",
+    "/featured",
+    "/new",
+    "/sale",
+    "/sale?sort=discount",
+    "/search?q=ботинки",
+    "/hx/search?q=сапоги кожа",
+    "/category/zimnyaya",
+    "/zimnyaya/botinki",
+    "/hx/products/botinki",
+    "/hx/products/featured",
+    "/hx/products/new",
+    "/hx/products/sale",
+    "/promotions",
+    "/map",
+    "/sitemap.xml",
+    "/robots.txt",
+    "/health",
+]
+
+SLUG_SAMPLES = [
+    "Ботинки кожаные «Валери» M3-1261",
+    "Сапоги замшевые на каблуке «Сандра»",
+    "Угги из натуральной овчины",
+    "Туфли-лодочки лакированные «Classic»",
+    "Кроссовки и кеды на платформе «Soft Line»",
+]
+
+
+@dataclass
+class Case:
+    name: str
+    run: Callable[[], Optional[Awaitable[None]]]
+    repeat: int
+
+
+def _summary(samples: list[float]) -> dict:
+    return {
+        "n": len(samples),
+        "p50_ms": round(percentile(samples, 50), 4),
+        "p90_ms": round(percentile(samples, 90), 4),
+        "p99_ms": round(percentile(samples, 99), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "min_ms": round(min(samples), 4),
+        "max_ms": round(max(samples), 4),
+    }
+
+
+async def measure(case: Case, warmup: int) -> dict:
+    async def once() -> float:
+        started = time.perf_counter()
+        result = case.run()
+        if result is not None:
+            await result
+        return (time.perf_counter() - started) * 1000
+
+    for _ in range(warmup):
+        await once()
+    return _summary([await once() for _ in range(case.repeat)])
+
+
+# =============================================================================
+# ЗАМЕРЫ
+# =============================================================================
+
+def _sample_paths() -> dict[str, str]:
+    """Пути, зависящие от данных: товар и курсор из середины каталога."""
+    with db_session() as db:
+        active = select(Product).where(Product.is_active.is_(True))
+        total = db.execute(select(func.count()).select_from(active.subquery())).scalar_one()
+        middle = db.scalars(
+            active.order_by(Product.created_at.desc(), Product.id.desc()).offset(total // 2).limit(1)
+        ).first()
+    if middle is None:
+        return {}
+    cursor = encode_cursor(middle.created_at, middle.id, total // 2)
+    return {
+        "route:/product/{id}-{slug}": f"/product/{middle.id}-{middle.slug}",
+        "route:/product-modal/{id}": f"/product-modal/{middle.id}",
+        "route:/products?cursor=middle": f"/products?cursor={cursor}",
+        "route:/featured?cursor=middle": f"/featured?cursor={cursor}",
+        "route:/zimnyaya/botinki?cursor=middle": f"/zimnyaya/botinki?cursor={cursor}",
+    }
+
+
+def route_cases(client: httpx.AsyncClient, repeat: int) -> list[Case]:
+    paths = {f"route:{path}": path for path in ROUTES} | _sample_paths()
+
+    def getter(path: str) -> Callable[[], Awaitable[None]]:
+        async def run() -> None:
+            response = await client.get(path)
+            if response.status_code >= 500:
+                raise RuntimeError(f"{path}: HTTP {response.status_code}")
+        return run
+
+    return [Case(name, getter(path), repeat) for name, path in paths.items()]
+
+
+def sitemap_case(repeat: int) -> Case:
+    directory = Path(tempfile.mkdtemp(prefix="bench-sitemap-"))
+
+    def run() -> None:
+        with db_session() as db:
+            build_sitemaps(db, "https://example.com", directory)
+
+    return Case("sitemap:build", run, max(1, repeat // 10))
+
+
+def template_case(repeat: int) -> Case:
+    with db_session() as db:
+        categories = build_catalog_snapshot(db).categories
+        products = db.scalars(
+            select(Product)
+            .options(joinedload(Product.subcategory).joinedload(Subcategory.category))
+            .where(Product.is_active.is_(True))
+            .order_by(Product.created_at.desc(), Product.id.desc())
+            .limit(PAGE_SIZE)
+        ).unique().all()
+    template = templates.env.get_template("products_list.html")
+    page = Page(items=products, offset=0, next_cursor="bench")
+    context = {
+        "request": None,
+        "categories": categories,
+        "products": products,
+        "page": page,
+        "next_url": "/featured?cursor=bench",
+        "card_style": "catalog",
+        "list_title": "Актуальные модели",
+        "list_subtitle": "Популярные и рекомендуемые модели сезона",
+        "list_icon": "⭐",
+        "page_title": "Актуальные модели",
+        "meta_description": "",
+    }
+
+    def run() -> None:
+        template.render(context)
+
+    return Case("template:products_list", run, repeat)
+
+
+def slugify_case(repeat: int) -> Case:
+    def run() -> None:
+        for name in SLUG_SAMPLES:
+            slugify(name)
+
+    return Case(f"slugify[x{len(SLUG_SAMPLES)}]", run, repeat * 10)
+
+
+def admin_cases(repeat: int) -> list[Case]:
+    with db_session() as db:
+        subcategory = db.scalars(select(Subcategory).order_by(Subcategory.id)).first()
+    variants = {
+        "admin:filters[default]": {},
+        "admin:filters[show_deleted]": {"show_deleted": "1"},
+        "admin:filters[search]": {"search": "ботинки"},
+        "admin:filters[sort_name]": {"sort": "name", "page": 20},
+        "admin:filters[sort_price]": {"sort": "price", "direction": "desc", "show_deleted": "1"},
+    }
+    if subcategory is not None:
+        variants["admin:filters[category]"] = {"category_id": subcategory.category_id}
+        variants["admin:filters[subcategory]"] = {"subcategory_id": subcategory.id}
+
+    def runner(kwargs: dict) -> Callable[[], None]:
+        def run() -> None:
+            with db_session() as db:
+                get_products_with_filters(db, **kwargs)
+        return run
+
+    # Страница по 50 строк, но с подсчётом всего по фильтру
+    return [Case(name, runner(kwargs), max(1, repeat // 2)) for name, kwargs in variants.items()]
+
+
+# =============================================================================
+# РЕЗУЛЬТАТ
+# =============================================================================
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _catalog_size() -> int:
+    with db_session() as db:
+        return db.execute(select(func.count()).select_from(Product)).scalar_one()
+
+
+def print_results(results: dict, baseline: Optional[dict], threshold: float) -> int:
+    """Таблица результатов; возвращает число замедлившихся замеров."""
+    slower = 0
+    print(f"{'замер':<48} {'p50':>9} {'p90':>9} {'p99':>9}" + ("   Δp50    Δp90" if baseline else ""))
+    for name, row in results.items():
+        line = f"{name:<48} {row['p50_ms']:>7.2f}ms {row['p90_ms']:>7.2f}ms {row['p99_ms']:>7.2f}ms"
+        base = (baseline or {}).get(name)
+        if base:
+            deltas = [
+                (row[key] - base[key]) / base[key] * 100 if base[key] else 0.0
+                for key in ("p50_ms", "p90_ms")
+            ]
+            line += "".join(f" {delta:>+6.1f}%" for delta in deltas)
+            if deltas[0] > threshold:
+                slower += 1
+                line += "  ← медленнее"
+        print(line)
+    return slower
+
+
+async def main(args: argparse.Namespace) -> int:
+    check_schema()
+    # Меряется рендер страниц, а не отдача готовых байтов из кэша
+    page_cache.max_entries = 0
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench.local") as client:
+        cases = [
+            *route_cases(client, args.repeat),
+            sitemap_case(args.repeat),
+            template_case(args.repeat),
+            slugify_case(args.repeat),
+            *admin_cases(args.repeat),
+        ]
+        if args.only:
+            cases = [case for case in cases if any(case.name.startswith(prefix) for prefix in args.only)]
+
+        results = {}
+        for case in cases:
+            results[case.name] = await measure(case, args.warmup)
+
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "database": SQLALCHEMY_DATABASE_URL.get_backend_name(),
+        "products": _catalog_size(),
+        "app_env": settings.environment,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+
+    baseline = json.loads(Path(args.compare).read_text())["results"] if args.compare else None
+    slower = print_results(results, baseline, args.threshold)
+    print(f"Товаров: {report['products']}, результат: {output}")
+    return 1 if slower and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50, help="повторов на замер")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="только замеры с этими префиксами имени (route:, admin: ...)")
+    parser.add_argument("--output", help="файл результата (по умолчанию instance/bench/<коммит>.json)")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=10.0, help="порог замедления p50, %%")
+    parser.add_argument("--fail-on-regression", action="store_true", help="код возврата 1, если есть замедления")
+    sys.exit(asyncio.run(main(parser.parse_args())))
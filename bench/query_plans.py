@@ -0,0 +1,178 @@
+"""Регрессия планов запросов: EXPLAIN QUERY PLAN для каждого роута.
+
+Прогоняет роуты публичной части и админки через TestClient, записывает
+каждый SELECT, который они отправили в базу, и строит для него план
+SQLite с теми же параметрами. Запрос к товарам считается регрессией, если
+
+  * таблица читается полным сканом (SCAN products без индекса);
+  * строки сортируются во временном B-дереве (USE TEMP B-TREE FOR ...).
+
+Справочники (категории, подгруппы, акции) — десятки строк, их планы
+только печатаются. Роуты, которым по смыслу нужна вся таблица (sitemap)
+или сортировка по релевантности (поиск), отмечены в ROUTES.
+
+    python -m bench.query_plans        # код возврата 1 при регрессии
+    python -m bench.query_plans -v     # напечатать планы всех запросов
+
+Планы строятся по той базе, что в DATABASE_URL; запускать после
+python -m app.schema upgrade. Для PostgreSQL не работает: его планировщик
+на маленьком каталоге честно выбирает Seq Scan, и проверка была бы шумом.
+"""
+
+import argparse
+import re
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.auth import SESSION_COOKIE_NAME, create_session_token
+from app.cache import page_cache
+from app.database import IS_SQLITE, async_engine, engine
+from app.main import app
+from app.pagination import encode_cursor
+
+# Таблицы, которые растут с каталогом
+HOT_TABLES = ("products", "product_sizes")
+
+# Курсор «далеко в будущем»: включает keyset-условие, не отсекая ни одного товара
+_CURSOR = encode_cursor(datetime(2100, 1, 1), 2**31 - 1, 24)
+_CURSOR_DISCOUNT = encode_cursor(datetime(2100, 1, 1), 2**31 - 1, 24, discount=100)
+
+
+@dataclass(frozen=True)
+class Route:
+    path: str
+    # Таблицы, которые роут по смыслу читает целиком
+    full_scan: tuple[str, ...] = ()
+    allow_sort: bool = False
+    htmx: bool = False
+
+
+ROUTES = [
+    Route("/"),
+    # Фасетный индекс строится по всем остаткам размеров
+    Route("/products", full_scan=("product_sizes",)),
+    Route("/products?size=37&sale=1"),
+    Route(f"/products?cursor={_CURSOR}", htmx=True),
+    Route("/featured"),
+    Route(f"/featured?cursor={_CURSOR}", htmx=True),
+    Route("/new"),
+    Route(f"/new?cursor={_CURSOR}", htmx=True),
+    Route("/sale"),
+    Route(f"/sale?cursor={_CURSOR}", htmx=True),
+    Route("/sale?sort=discount"),
+    Route(f"/sale?sort=discount&cursor={_CURSOR_DISCOUNT}", htmx=True),
+    Route("/hx/products/sale"),
+    Route("/category/zimnyaya"),
+    Route("/zimnyaya/botinki"),
+    Route(f"/zimnyaya/botinki?cursor={_CURSOR}", htmx=True),
+    Route("/hx/products/botinki"),
+    Route("/product/1-x"),
+    Route("/product-modal/1"),
+    Route("/promotions"),
+    # Ранжирование bm25/ts_rank — сортировка найденного неизбежна
+    Route("/search?q=ботинки", allow_sort=True),
+    # Шарды перечисляют все активные товары
+    Route("/sitemap.xml", full_scan=("products",)),
+    Route("/admin"),
+    Route("/admin/products"),
+    Route("/admin/products?show_deleted=1"),
+    Route("/admin/products?subcategory_id=1"),
+    Route("/admin/products?category_id=1"),
+    Route("/admin/products?sort=name&page=2"),
+    Route("/admin/products?sort=price&dir=desc&show_deleted=1"),
+    Route("/admin/products/partial?sort=created&dir=asc&page=3", htmx=True),
+    Route("/admin/products/partial?search=ботинки", allow_sort=True),
+    Route("/admin/products/edit/1"),
+    Route("/admin/promotions"),
+]
+
+_FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+
+@dataclass
+class Statement:
+    route: Route
+    sql: str
+    parameters: tuple
+
+
+def capture(routes: list[Route]) -> list[Statement]:
+    """Выполнить роуты и собрать уникальные SELECT в порядке появления."""
+    current: list[Route] = []
+    seen: set[str] = set()
+    statements: list[Statement] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany) -> None:
+        if current and statement.lstrip().upper().startswith("SELECT") and statement not in seen:
+            seen.add(statement)
+            statements.append(Statement(current[0], statement, tuple(parameters or ())))
+
+    targets = (engine, async_engine.sync_engine)
+    for target in targets:
+        event.listen(target, "before_cursor_execute", record)
+    page_cache.max_entries = 0
+    try:
+        with TestClient(app) as client:
+            client.cookies.set(SESSION_COOKIE_NAME, create_session_token("admin"))
+            for route in routes:
+                current[:] = [route]
+                headers = {"HX-Request": "true"} if route.htmx else {}
+                response = client.get(route.path, headers=headers)
+                if response.status_code >= 500:
+                    raise RuntimeError(f"{route.path}: HTTP {response.status_code}")
+    finally:
+        for target in targets:
+            event.remove(target, "before_cursor_execute", record)
+    return statements
+
+
+def explain(statement: Statement) -> list[str]:
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement.sql}", statement.parameters).all()
+    return [row[-1] for row in rows]
+
+
+def problems(statement: Statement, plan: list[str]) -> list[str]:
+    if not any(re.search(rf"\b{table}\b", statement.sql) for table in HOT_TABLES):
+        return []
+    found = []
+    for detail in plan:
+        scan = _FULL_SCAN.match(detail)
+        if scan and scan.group(1) in HOT_TABLES and scan.group(1) not in statement.route.full_scan:
+            found.append(f"полный скан: {detail}")
+        if "USE TEMP B-TREE" in detail and not statement.route.allow_sort:
+            found.append(f"сортировка во временном B-дереве: {detail}")
+    return found
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-v", "--verbose", action="store_true", help="печатать планы всех запросов")
+    args = parser.parse_args(argv)
+    if not IS_SQLITE:
+        parser.error("проверка планов написана для SQLite (EXPLAIN QUERY PLAN)")
+
+    statements = capture(ROUTES)
+    failures = 0
+    for statement in statements:
+        plan = explain(statement)
+        found = problems(statement, plan)
+        failures += bool(found)
+        if found or args.verbose:
+            print(f"{'FAIL' if found else 'ok  '} {statement.route.path}")
+            print("     " + " ".join(statement.sql.split()))
+            for detail in plan:
+                print(f"       {detail}")
+            for problem in found:
+                print(f"     ! {problem}")
+
+    print(f"Запросов: {len(statements)}, регрессий: {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,374 @@
+"""Нагрузка реальным трафиком: повтор access-лога nginx против приложения.
+
+Лог — формат combined, как пишет deploy/nginx.conf (access_log без имени
+формата). Повторяются GET/HEAD-запросы к приложению с исходными
+интервалами между ними, сжатыми в --speeds раз; каждое ускорение — отдельная
+ступень. Запросы к /admin идут с cookie сессии, POST из лога пропускаются:
+тел запросов в логе нет.
+
+    python -m bench.replay /var/log/nginx/shoeapp_access.log --speeds 1 5 10 20
+    python -m bench.replay access.log --target http://127.0.0.1:8002 --concurrency 200
+    python -m bench.replay access.log --admin-writes 2 --output instance/bench/replay.json
+
+Без --target приложение работает в этом процессе (httpx.ASGITransport,
+один воркер). Чтобы мерить конфигурацию из deploy/systemd.service,
+поднимите её локально на копии базы:
+
+    APP_ENV=production uvicorn app.main:app --workers 2 --port 8002
+
+и передайте --target; DATABASE_URL и SECRET_KEY должны совпадать с
+сервером — по базе выбираются товары для записи, ключом подписывается
+cookie админки.
+
+--admin-writes N — N сохранений товара в секунду через POST
+/admin/products/edit/{id} (без изменений полей): commit в SQLite,
+перестройка поискового индекса и сброс кэшей, как при работе
+администратора. Рабочую instance/shop.db скрипт не трогает.
+
+Задержка считается от момента, когда запрос должен был уйти по логу,
+а не от фактической отправки: очередь перед --concurrency входит в
+замер. По каждой ступени печатаются заданный и фактический RPS,
+p50/p95/p99 и доля ошибок (5xx и сетевые); ступень, на которой ошибок
+больше --max-errors, p99 выше --slo или фактический RPS отстаёт от
+заданного больше чем на 10%, отмечается как предел.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Optional
+
+import anyio.to_thread
+import httpx
+from sqlalchemy import select
+from starlette.routing import Match
+
+from app.auth import SESSION_COOKIE_NAME, create_session_token
+from app.cache import page_cache
+from app.database import DB_PATH, INSTANCE_DIR, IS_SQLITE, db_session
+from app.main import app
+from app.models import Product
+from app.schema import check_schema
+from app.sqlite_profile import metrics as lock_metrics
+from bench import percentile
+
+# $remote_addr - $remote_user [$time_local] "$request" $status $body_bytes_sent "$http_referer" "$http_user_agent"
+_COMBINED = re.compile(
+    r'^\S+ \S+ \S+ \[(?P<time>[^\]]+)\] "(?P<method>[A-Z]+) (?P<path>\S+)[^"]*" (?P<status>\d{3}) '
+)
+_TIME_FORMAT = "%d/%b/%Y:%H:%M:%S %z"
+
+REPLAY_METHODS = ("GET", "HEAD")
+ADMIN_WRITE_ROUTE = "POST /admin/products/edit/{product_id}"
+
+
+@dataclass(frozen=True)
+class LogRequest:
+    offset: float  # секунд от первой строки лога
+    method: str
+    path: str
+
+
+def parse_log(lines: Iterable[str]) -> tuple[list[LogRequest], int]:
+    """Запросы из лога по порядку и число пропущенных строк."""
+    requests: list[LogRequest] = []
+    skipped = 0
+    start: Optional[datetime] = None
+    for line in lines:
+        match = _COMBINED.match(line)
+        if match is None or match["method"] not in REPLAY_METHODS or not match["path"].startswith("/"):
+            skipped += 1
+            continue
+        moment = datetime.strptime(match["time"], _TIME_FORMAT)
+        start = start or moment
+        requests.append(LogRequest((moment - start).total_seconds(), match["method"], match["path"]))
+    # Строки лога пишутся по завершении запроса — порядок может немного плавать
+    requests.sort(key=lambda request: request.offset)
+    return requests, skipped
+
+
+def route_of(method: str, path: str) -> str:
+    """Шаблон роута приложения для группировки: /product/{product_id_slug}."""
+    scope = {"type": "http", "method": method, "path": path.split("?", 1)[0], "root_path": ""}
+    for route in app.router.routes:
+        matched, _ = route.matches(scope)
+        if matched == Match.FULL:
+            return f"{method} {route.path}"
+    return f"{method} (404)"
+
+
+# =============================================================================
+# СТУПЕНЬ НАГРУЗКИ
+# =============================================================================
+
+@dataclass
+class Samples:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    def add(self, latency_ms: float, ok: bool) -> None:
+        self.latencies.append(latency_ms)
+        self.errors += not ok
+
+    def summary(self, elapsed: float) -> dict:
+        count = len(self.latencies)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "rps": round(count / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(self.latencies, 50), 2),
+            "p95_ms": round(percentile(self.latencies, 95), 2),
+            "p99_ms": round(percentile(self.latencies, 99), 2),
+        }
+
+
+async def _send(client: httpx.AsyncClient, method: str, path: str, **kwargs) -> bool:
+    try:
+        response = await client.request(method, path, **kwargs)
+    except httpx.HTTPError:
+        return False
+    return response.status_code < 500
+
+
+def _edit_forms(limit: int) -> list[tuple[int, dict]]:
+    """Формы редактирования активных товаров с их текущими значениями."""
+    with db_session() as db:
+        products = db.scalars(
+            select(Product).where(Product.is_active.is_(True)).order_by(Product.id).limit(limit)
+        ).all()
+    forms = []
+    for product in products:
+        form = {
+            "name": product.name,
+            "subcategory_id": str(product.subcategory_id),
+            "description": product.description or "",
+            "price": str(product.price),
+            "sizes": [str(size) for size in json.loads(product.sizes_json or "[]")],
+            "color": product.color or "",
+        }
+        if product.old_price:
+            form["old_price"] = str(product.old_price)
+        for flag in ("is_new", "is_featured"):
+            if getattr(product, flag):
+                form[flag] = "true"
+        forms.append((product.id, form))
+    return forms
+
+
+async def _admin_writes(
+    client: httpx.AsyncClient, forms: list[tuple[int, dict]], rate: float, samples: Samples, stop: asyncio.Event
+) -> None:
+    """Сохранять случайные товары с частотой rate в секунду до stop."""
+    rng = random.Random(0)
+    interval = 1 / rate
+    next_at = time.perf_counter()
+    pending: set[asyncio.Task] = set()
+
+    async def write(scheduled: float) -> None:
+        product_id, form = rng.choice(forms)
+        ok = await _send(client, "POST", f"/admin/products/edit/{product_id}", data=form)
+        samples.add((time.perf_counter() - scheduled) * 1000, ok)
+
+    while not stop.is_set():
+        task = asyncio.create_task(write(next_at))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        next_at += interval
+        try:
+            await asyncio.wait_for(stop.wait(), max(0.0, next_at - time.perf_counter()))
+        except asyncio.TimeoutError:
+            pass
+    await asyncio.gather(*pending)
+
+
+def _lock_delta(before: dict, after: dict) -> dict:
+    keys = ("write_transactions", "lock_wait_seconds", "slow_lock_waits", "busy_errors")
+    delta = {key: round(after[key] - before[key], 6) for key in keys}
+    delta["lock_wait_max_seconds"] = after["lock_wait_max_seconds"]
+    return delta
+
+
+async def run_step(
+    client: httpx.AsyncClient,
+    requests: list[LogRequest],
+    speed: float,
+    concurrency: int,
+    forms: list[tuple[int, dict]],
+    write_rate: float,
+) -> dict:
+    routes: dict[str, Samples] = defaultdict(Samples)
+    limit = asyncio.Semaphore(concurrency)
+    stop = asyncio.Event()
+    writer = None
+    if write_rate > 0 and forms:
+        writer = asyncio.create_task(_admin_writes(client, forms, write_rate, routes[ADMIN_WRITE_ROUTE], stop))
+
+    async def replay(request: LogRequest, scheduled: float) -> None:
+        async with limit:
+            ok = await _send(client, request.method, request.path)
+        routes[route_of(request.method, request.path)].add((time.perf_counter() - scheduled) * 1000, ok)
+
+    started = time.perf_counter()
+    tasks = []
+    for request in requests:
+        scheduled = started + request.offset / speed
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(replay(request, scheduled)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    if writer:
+        await writer
+
+    total = Samples()
+    for samples in routes.values():
+        total.latencies.extend(samples.latencies)
+        total.errors += samples.errors
+    span = requests[-1].offset / speed if requests else 0.0
+    return {
+        "speed": speed,
+        "offered_rps": round(len(requests) / span, 2) if span else None,
+        "elapsed_seconds": round(elapsed, 3),
+        **total.summary(elapsed),
+        "routes": {name: routes[name].summary(elapsed) for name in sorted(routes)},
+    }
+
+
+# =============================================================================
+# ОТЧЁТ
+# =============================================================================
+
+def overloaded(step: dict, slo_ms: float, max_errors: float) -> bool:
+    lagging = step["offered_rps"] is not None and step["rps"] < step["offered_rps"] * 0.9
+    return step["error_rate"] > max_errors or step["p99_ms"] > slo_ms or lagging
+
+
+def print_step(step: dict, verbose: bool) -> None:
+    offered = f"{step['offered_rps']:.1f}" if step["offered_rps"] is not None else "—"
+    print(
+        f"x{step['speed']:<6g} {offered:>9} {step['rps']:>9.1f} {step['p50_ms']:>8.1f}ms "
+        f"{step['p95_ms']:>8.1f}ms {step['p99_ms']:>8.1f}ms {step['error_rate'] * 100:>6.2f}%"
+    )
+    locks = step.get("locks")
+    if locks:
+        print(
+            f"        SQLite: транзакций записи {locks['write_transactions']}, ожидание "
+            f"{locks['lock_wait_seconds']:.3f} с (макс. {locks['lock_wait_max_seconds']:.3f}), "
+            f"database is locked: {locks['busy_errors']}"
+        )
+    if verbose:
+        for name, row in step["routes"].items():
+            print(
+                f"        {name:<48} {row['requests']:>6} {row['p50_ms']:>8.1f}ms "
+                f"{row['p95_ms']:>8.1f}ms {row['p99_ms']:>8.1f}ms {row['error_rate'] * 100:>6.2f}%"
+            )
+
+
+async def main(args: argparse.Namespace) -> int:
+    with open(args.log, encoding="utf-8", errors="replace") as log:
+        requests, skipped = parse_log(log)
+    if args.limit:
+        requests = requests[:args.limit]
+    if not requests:
+        print(f"В {args.log} нет GET-запросов в формате combined (пропущено строк: {skipped})")
+        return 1
+    print(f"Запросов: {len(requests)} за {requests[-1].offset:.0f} с лога, пропущено строк: {skipped}")
+
+    forms: list[tuple[int, dict]] = []
+    if args.admin_writes > 0:
+        if DB_PATH is not None and DB_PATH.resolve() == (INSTANCE_DIR / "shop.db").resolve():
+            raise SystemExit("--admin-writes не пишет в рабочую базу instance/shop.db")
+        forms = _edit_forms(args.write_products)
+
+    if args.target:
+        transport = None
+        base_url = args.target
+    else:
+        check_schema()
+        if args.no_page_cache:
+            page_cache.max_entries = 0
+        anyio.to_thread.current_default_thread_limiter().total_tokens = args.threads
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://replay.local"
+
+    steps = []
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        transport=transport, base_url=base_url, limits=limits, timeout=args.timeout
+    ) as client:
+        client.cookies.set(SESSION_COOKIE_NAME, create_session_token("admin"))
+        if not await _send(client, "GET", "/health"):
+            raise SystemExit(f"{base_url} не отвечает на /health")
+        # Прогрев: по запросу на роут, чтобы первая ступень не мерила холодный старт
+        warmup = {route_of(request.method, request.path): request for request in reversed(requests)}
+        for _ in range(args.warmup):
+            await asyncio.gather(*(_send(client, request.method, request.path) for request in warmup.values()))
+        print(f"{'ускор.':<7} {'зад. RPS':>9} {'факт RPS':>9} {'p50':>10} {'p95':>10} {'p99':>10} {'ошибки':>7}")
+        for speed in args.speeds:
+            before = lock_metrics.snapshot()
+            step = await run_step(client, requests, speed, args.concurrency, forms, args.admin_writes)
+            if args.target:
+                # Счётчики одного из воркеров — какой ответит на запрос
+                try:
+                    response = await client.get("/admin/api/metrics/db")
+                    if response.status_code == 200:
+                        step["server_db_metrics"] = response.json()
+                except httpx.HTTPError:
+                    pass
+            elif IS_SQLITE:
+                step["locks"] = _lock_delta(before, lock_metrics.snapshot())
+            step["overloaded"] = overloaded(step, args.slo, args.max_errors)
+            steps.append(step)
+            print_step(step, args.verbose)
+
+    limit_step = next((step for step in steps if step["overloaded"]), None)
+    if limit_step is None:
+        print("Предел не достигнут — увеличьте --speeds")
+    else:
+        print(f"Предел: ускорение x{limit_step['speed']:g}, фактически {limit_step['rps']:.1f} RPS")
+
+    if args.output:
+        report = {
+            "log": str(args.log),
+            "target": args.target or "in-process",
+            "requests": len(requests),
+            "concurrency": args.concurrency,
+            "admin_writes_per_second": args.admin_writes,
+            "steps": steps,
+        }
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+        print(f"Результат: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="access-лог nginx в формате combined")
+    parser.add_argument("--target", help="адрес запущенного uvicorn; без него — приложение в процессе")
+    parser.add_argument("--speeds", type=float, nargs="+", default=[1, 2, 5, 10, 20], help="ускорения лога по ступеням")
+    parser.add_argument("--concurrency", type=int, default=100, help="запросов одновременно в работе")
+    parser.add_argument("--limit", type=int, help="повторить только первые N запросов лога")
+    parser.add_argument("--admin-writes", type=float, default=0.0, help="сохранений товара в секунду")
+    parser.add_argument("--write-products", type=int, default=200, help="из скольких товаров выбирать запись")
+    parser.add_argument("--warmup", type=int, default=3, help="кругов прогрева по роутам лога")
+    parser.add_argument("--timeout",type=float, default=30.0, help="таймаут запроса, сек.")
+    parser.add_argument("--threads", type=int, default=40, help="лимит потоков AnyIO (в процессе)")
+    parser.add_argument("--no-page-cache", action="store_true", help="выключить кэш страниц (в процессе)")
+    parser.add_argument("--slo", type=float, default=1000.0, help="порог p99, мс")
+    parser.add_argument("--max-errors", type=float, default=0.01, help="допустимая доля ошибок")
+    parser.add_argument("--output", help="записать результат в JSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="печатать роуты каждой ступени")
+    sys.exit(asyncio.run(main(parser.parse_args())))
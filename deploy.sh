@@ -20,6 +20,14 @@ echo "📦 Installing dependencies..."
 pip install --upgrade pip
 pip install -r requirements.txt
 
+# Build static assets (hashed CSS/JS + .gz/.br)
+echo "🎨 Building static assets..."
+python -m app.assets build
+
+# Apply database migrations (workers only check the revision on startup)
+echo "🗄️  Applying database migrations..."
+python -m app.schema upgrade
+
 # Restart service
 echo "🔄 Restarting service..."
 sudo systemctl restart shoeapp
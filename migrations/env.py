@@ -0,0 +1,57 @@
+"""Окружение Alembic: engine и метаданные берутся из приложения."""
+
+from logging.config import fileConfig
+
+from alembic import context
+
+from app import models  # noqa: F401 — регистрирует таблицы в Base.metadata
+from app.database import IS_SQLITE, Base, engine
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def include_object(obj, name, type_, reflected, compare_to) -> bool:
+    """Поисковый индекс (FTS5 и его служебные таблицы) ведёт app.search, не autogenerate."""
+    table = name if type_ == "table" else getattr(getattr(obj, "table", None), "name", "")
+    return not (table or "").startswith("product_search")
+
+
+def _configure(**options) -> None:
+    context.configure(
+        target_metadata=target_metadata,
+        include_object=include_object,
+        # SQLite не умеет большинство ALTER TABLE: Alembic пересоздаёт таблицу копированием
+        render_as_batch=IS_SQLITE,
+        compare_type=True,
+        **options,
+    )
+
+
+def run_migrations_offline() -> None:
+    _configure(url=engine.url.render_as_string(hide_password=False), literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
+    with engine.connect() as connection:
+        _configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,122 @@
+"""Исходная схема: каталог, размеры, акции и поисковый индекс
+
+Базы, созданные до Alembic через create_all(), доводятся до этой ревизии
+и помечаются ею командой python -m app.schema upgrade (см. app/schema.py).
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "categories",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("slug", sa.String(length=255), nullable=False),
+        sa.Column("icon", sa.String(length=32), nullable=True),
+        sa.Column("sort_order", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_categories_id", "categories", ["id"])
+    op.create_index("ix_categories_slug", "categories", ["slug"], unique=True)
+
+    op.create_table(
+        "subcategories",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("slug", sa.String(length=255), nullable=False),
+        sa.Column("sort_order", sa.Integer(), nullable=False),
+        sa.Column("category_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["category_id"], ["categories.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_subcategories_id", "subcategories", ["id"])
+    op.create_index("ix_subcategories_slug", "subcategories", ["slug"])
+
+    op.create_table(
+        "products",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("slug", sa.String(length=255), nullable=False),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("old_price", sa.Float(), nullable=True),
+        sa.Column("sizes_json", sa.String(length=255), nullable=True),
+        sa.Column("color", sa.String(length=64), nullable=True),
+        sa.Column("image_url", sa.String(length=512), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=False),
+        sa.Column("is_new", sa.Boolean(), nullable=False),
+        sa.Column("is_featured", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("subcategory_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["subcategory_id"], ["subcategories.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_products_id", "products", ["id"])
+    op.create_index("ix_products_slug", "products", ["slug"])
+
+    op.create_table(
+        "product_sizes",
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["product_id"], ["products.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("product_id", "size"),
+    )
+    op.create_index("ix_product_sizes_size_quantity", "product_sizes", ["size", "quantity", "product_id"])
+
+    op.create_table(
+        "promotions",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("title", sa.String(length=255), nullable=False),
+        sa.Column("slug", sa.String(length=255), nullable=False),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("discount_text", sa.String(length=255), nullable=True),
+        sa.Column("start_date", sa.Date(), nullable=True),
+        sa.Column("end_date", sa.Date(), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_promotions_id", "promotions", ["id"])
+    op.create_index("ix_promotions_slug", "promotions", ["slug"], unique=True)
+
+    # Поисковый индекс — см. app/search.py
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(
+            "CREATE TABLE product_search ("
+            "rowid integer PRIMARY KEY, name text, description text, color text, subcategory text, "
+            "document tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(subcategory, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(color, '')), 'C') || "
+            "setweight(to_tsvector('simple', coalesce(description, '')), 'D')"
+            ") STORED)"
+        )
+        op.execute("CREATE INDEX ix_product_search_document ON product_search USING gin (document)")
+    else:
+        op.execute(
+            "CREATE VIRTUAL TABLE product_search USING fts5("
+            "name, description, color, subcategory, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS product_search")
+    op.drop_table("promotions")
+    op.drop_table("product_sizes")
+    op.drop_table("products")
+    op.drop_table("subcategories")
+    op.drop_table("categories")
@@ -0,0 +1,41 @@
+"""Составные и частичные индексы списков товаров
+
+Каждый список сортируется по (created_at, id) DESC, поэтому эти колонки
+идут последними: запрос читает индекс по порядку и останавливается на
+LIMIT, без временного B-дерева. Планы проверяет bench/query_plans.py.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# Условия — те же выражения, что в запросах (см. app/models.py)
+_active = sa.column("is_active").is_(sa.true())
+_PARTIAL = {
+    "ix_products_active_created": _active,
+    "ix_products_featured_created": _active & sa.column("is_featured").is_(sa.true()),
+    "ix_products_new_created": _active & sa.column("is_new").is_(sa.true()),
+    "ix_products_sale_created": _active & sa.column("old_price").isnot(None),
+}
+
+
+def upgrade() -> None:
+    op.create_index("ix_products_created", "products", ["created_at", "id"])
+    op.create_index("ix_products_subcategory_created", "products", ["subcategory_id", "created_at", "id"])
+    for name, where in _PARTIAL.items():
+        op.create_index(name, "products", ["created_at", "id"], sqlite_where=where, postgresql_where=where)
+
+
+def downgrade() -> None:
+    for name in reversed(list(_PARTIAL)):
+        op.drop_index(name, table_name="products")
+    op.drop_index("ix_products_subcategory_created", table_name="products")
+    op.drop_index("ix_products_created", table_name="products")
@@ -0,0 +1,63 @@
+"""Хранимая скидка товара и индексы распродажи
+
+products.discount_percent — скидка в целых процентах (0 — без скидки),
+её пишет Product.set_prices(). Частичный индекс «на распродаже» теперь
+строится по ней, а не по old_price IS NOT NULL, и добавлен индекс для
+сортировки /sale?sort=discount.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+_active = sa.column("is_active").is_(sa.true())
+_on_sale = _active & (sa.column("discount_percent") > sa.literal_column("0"))
+
+
+def _discount(price: float, old_price: float) -> int:
+    # Формула app.models.compute_discount на момент миграции
+    return int((old_price - price) / old_price * 100)
+
+
+def upgrade() -> None:
+    op.add_column(
+        "products",
+        sa.Column("discount_percent", sa.Integer(), server_default="0", nullable=False),
+    )
+    bind = op.get_bind()
+    rows = bind.execute(sa.text("SELECT id, price, old_price FROM products WHERE old_price > price")).all()
+    if rows:
+        bind.execute(
+            sa.text("UPDATE products SET discount_percent = :discount WHERE id = :id"),
+            [{"id": row.id, "discount": _discount(row.price, row.old_price)} for row in rows],
+        )
+
+    op.drop_index("ix_products_sale_created", table_name="products")
+    op.create_index(
+        "ix_products_sale_created", "products", ["created_at", "id"],
+        sqlite_where=_on_sale, postgresql_where=_on_sale,
+    )
+    op.create_index(
+        "ix_products_sale_discount", "products", ["discount_percent", "created_at", "id"],
+        sqlite_where=_on_sale, postgresql_where=_on_sale,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_products_sale_discount", table_name="products")
+    op.drop_index("ix_products_sale_created", table_name="products")
+    old_sale = _active & sa.column("old_price").isnot(None)
+    op.create_index(
+        "ix_products_sale_created", "products", ["created_at", "id"],
+        sqlite_where=old_sale, postgresql_where=old_sale,
+    )
+    with op.batch_alter_table("products") as batch:
+        batch.drop_column("discount_percent")
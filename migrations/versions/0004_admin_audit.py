@@ -0,0 +1,37 @@
+"""Журнал массовых операций админки
+
+Одна строка на операцию над выборкой товаров (скидка, снятие с продажи,
+перенос в подгруппу): администратор, действие, число товаров и параметры
+в JSON.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "admin_audit",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("admin", sa.String(length=255), nullable=False),
+        sa.Column("action", sa.String(length=64), nullable=False),
+        sa.Column("product_count", sa.Integer(), nullable=False),
+        sa.Column("details", sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_admin_audit_created_at", "admin_audit", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_admin_audit_created_at", table_name="admin_audit")
+    op.drop_table("admin_audit")
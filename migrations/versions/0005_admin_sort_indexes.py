@@ -0,0 +1,28 @@
+"""Индексы сортировок таблицы товаров в админке
+
+Таблица листается страницами (LIMIT/OFFSET) и сортируется по дате,
+названию или цене; id — второй ключ сортировки. По дате уже есть
+ix_products_created, здесь — (name, id) и (price, id): страница читается
+по индексу без сортировки всей выборки.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_products_name", "products", ["name", "id"])
+    op.create_index("ix_products_price", "products", ["price", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_products_price", table_name="products")
+    op.drop_index("ix_products_name", table_name="products")
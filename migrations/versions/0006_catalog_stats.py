@@ -0,0 +1,158 @@
+"""Счётчики каталога catalog_stats, которые ведут триггеры
+
+Строка — (scope, ref_id, total): активные товары, новинки, со скидкой,
+актуальные (ref_id = 0), товары по категориям и подгруппам (ref_id — их
+id) и по размерам в наличии (ref_id — размер). Считаются только активные
+товары.
+
+Счётчики меняют триггеры на products, product_sizes и subcategories, а не
+код админки: так их не обходят ни импорт, ни массовые UPDATE, ни правки
+SQL-клиентом. Каждый триггер собирает изменения строки со знаком (-1 для
+старой версии, +1 для новой), складывает их по (scope, ref_id) и пишет
+одним upsert, пропуская нулевые суммы — правка цены без смены скидки
+счётчики не трогает.
+
+Удаление товара вычитается в BEFORE DELETE вместе с его размерами, а
+триггер product_sizes учитывает размер, только пока товар ещё в таблице:
+при удалении через ORM (сначала размеры) и через каскад FK (сначала
+товар) каждый размер вычитается ровно один раз.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+# Колонки, от которых зависят счётчики: UPDATE без их изменения триггер пропускает
+_PRODUCT_COLUMNS = ("is_active", "is_new", "is_featured", "discount_percent", "subcategory_id")
+_SIZE_COLUMNS = ("product_id", "size", "quantity")
+
+
+def _product_delta(row: str, sign: int) -> str:
+    """Вклад строки товара (NEW или OLD) в счётчики со знаком sign."""
+    return f"""
+        SELECT 'active' AS scope, 0 AS ref_id, {sign} AS delta WHERE {row}.is_active
+        UNION ALL SELECT 'new', 0, {sign} WHERE {row}.is_active AND {row}.is_new
+        UNION ALL SELECT 'sale', 0, {sign} WHERE {row}.is_active AND {row}.discount_percent > 0
+        UNION ALL SELECT 'featured', 0, {sign} WHERE {row}.is_active AND {row}.is_featured
+        UNION ALL SELECT 'subcategory', {row}.subcategory_id, {sign}
+            WHERE {row}.is_active AND {row}.subcategory_id IS NOT NULL
+        UNION ALL SELECT 'category', category_id, {sign} FROM subcategories
+            WHERE id = {row}.subcategory_id AND {row}.is_active
+        UNION ALL SELECT 'size', size, {sign} FROM product_sizes
+            WHERE product_id = {row}.id AND quantity > 0 AND {row}.is_active"""
+
+
+def _size_delta(row: str, sign: int) -> str:
+    """Вклад строки product_sizes: размер в наличии у активного товара."""
+    return f"""
+        SELECT 'size' AS scope, {row}.size AS ref_id, {sign} AS delta FROM products
+            WHERE id = {row}.product_id AND is_active AND {row}.quantity > 0"""
+
+
+def _subcategory_delta(row: str, sign: int) -> str:
+    """Перенос подгруппы в другую категорию: её товары переходят вместе с ней."""
+    return f"""
+        SELECT 'category' AS scope, {row}.category_id AS ref_id, {sign} * total AS delta FROM catalog_stats
+            WHERE scope = 'subcategory' AND ref_id = {row}.id"""
+
+
+def _apply(*deltas: str) -> str:
+    return f"""
+    INSERT INTO catalog_stats (scope, ref_id, total)
+    SELECT scope, ref_id, SUM(delta) FROM ({' UNION ALL '.join(deltas)}) AS deltas
+    WHERE true
+    GROUP BY scope, ref_id
+    HAVING SUM(delta) <> 0
+    ON CONFLICT (scope, ref_id) DO UPDATE SET total = catalog_stats.total + excluded.total"""
+
+
+# (имя, момент, событие, таблица, колонки UPDATE, тело) — одинаково для обоих диалектов
+_TRIGGERS = (
+    ("catalog_stats_product_insert", "AFTER", "INSERT", "products", (), _apply(_product_delta("NEW", 1))),
+    (
+        "catalog_stats_product_update", "AFTER", "UPDATE", "products", _PRODUCT_COLUMNS,
+        _apply(_product_delta("OLD", -1), _product_delta("NEW", 1)),
+    ),
+    ("catalog_stats_product_delete", "BEFORE", "DELETE", "products", (), _apply(_product_delta("OLD", -1))),
+    ("catalog_stats_size_insert", "AFTER", "INSERT", "product_sizes", (), _apply(_size_delta("NEW", 1))),
+    (
+        "catalog_stats_size_update", "AFTER", "UPDATE", "product_sizes", _SIZE_COLUMNS,
+        _apply(_size_delta("OLD", -1), _size_delta("NEW", 1)),
+    ),
+    ("catalog_stats_size_delete", "AFTER", "DELETE", "product_sizes", (), _apply(_size_delta("OLD", -1))),
+    (
+        "catalog_stats_subcategory_update", "AFTER", "UPDATE", "subcategories", ("category_id",),
+        _apply(_subcategory_delta("OLD", -1), _subcategory_delta("NEW", 1)),
+    ),
+)
+
+
+def _when(columns: tuple[str, ...], postgres: bool) -> str:
+    """Условие UPDATE-триггера: массовый UPDATE, не меняющий колонок, тело не выполняет."""
+    if not columns:
+        return ""
+    # IS NOT в SQLite и IS DISTINCT FROM в PostgreSQL сравнивают и NULL
+    differs = "IS DISTINCT FROM" if postgres else "IS NOT"
+    return " WHEN (" + " OR ".join(f"OLD.{column} {differs} NEW.{column}" for column in columns) + ")"
+
+
+_BACKFILL = """
+    INSERT INTO catalog_stats (scope, ref_id, total)
+    SELECT 'active', 0, COUNT(*) FROM products WHERE is_active
+    UNION ALL SELECT 'new', 0, COUNT(*) FROM products WHERE is_active AND is_new
+    UNION ALL SELECT 'sale', 0, COUNT(*) FROM products WHERE is_active AND discount_percent > 0
+    UNION ALL SELECT 'featured', 0, COUNT(*) FROM products WHERE is_active AND is_featured
+    UNION ALL SELECT 'subcategory', subcategory_id, COUNT(*) FROM products
+        WHERE is_active AND subcategory_id IS NOT NULL GROUP BY subcategory_id
+    UNION ALL SELECT 'category', s.category_id, COUNT(*) FROM products p
+        JOIN subcategories s ON s.id = p.subcategory_id WHERE p.is_active GROUP BY s.category_id
+    UNION ALL SELECT 'size', ps.size, COUNT(*) FROM product_sizes ps
+        JOIN products p ON p.id = ps.product_id WHERE p.is_active AND ps.quantity > 0 GROUP BY ps.size
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        "catalog_stats",
+        sa.Column("scope", sa.String(length=16), nullable=False),
+        sa.Column("ref_id", sa.Integer(), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("scope", "ref_id"),
+    )
+    op.execute(_BACKFILL)
+
+    postgres = op.get_bind().dialect.name == "postgresql"
+    for name, timing, event, table, columns, body in _TRIGGERS:
+        trigger = f"CREATE TRIGGER {name} {timing} {event}"
+        if columns:
+            trigger += f" OF {', '.join(columns)}"
+        trigger += f" ON {table} FOR EACH ROW{_when(columns, postgres)}"
+        if not postgres:
+            op.execute(f"{trigger} BEGIN {body}; END")
+            continue
+        # BEFORE DELETE должен вернуть OLD, иначе строка не удалится
+        result = "OLD" if timing == "BEFORE" else "NULL"
+        op.execute(
+            f"CREATE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$ "
+            f"BEGIN {body}; RETURN {result}; END $$"
+        )
+        op.execute(f"{trigger} EXECUTE FUNCTION {name}()")
+
+
+def downgrade() -> None:
+    postgres = op.get_bind().dialect.name == "postgresql"
+    for name, _timing, _event, table, _columns, _body in reversed(_TRIGGERS):
+        if postgres:
+            op.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+            op.execute(f"DROP FUNCTION IF EXISTS {name}()")
+        else:
+            op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    op.drop_table("catalog_stats")
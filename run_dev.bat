@@ -12,6 +12,9 @@ IF EXIST ".venv\Scripts\activate.bat" (
     pip install -r requirements.txt
 )
 
+echo Применение миграций БД...
+python -m app.schema upgrade || goto :eof
+
 echo Запуск сервера Uvicorn на порту 8002...
 start "" http://127.0.0.1:8002/
 uvicorn app.main:app --reload --port 8002
@@ -0,0 +1,64 @@
+"""Общие фикстуры: отдельная тестовая база на SQLite или PostgreSQL.
+
+Бэкенд выбирается переменной TEST_DATABASE_URL (движки приложения
+создаются при импорте, поэтому один запуск pytest — один бэкенд):
+
+    python -m pytest                                                    # SQLite во временном файле
+    TEST_DATABASE_URL=postgresql://postgres@127.0.0.1/shop_test python -m pytest
+
+CI прогоняет оба варианта матрицей (.github/workflows/tests.yml).
+Тестовая PostgreSQL-база очищается целиком (DROP SCHEMA public), поэтому
+для неё нужна отдельная база, не рабочая.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+_TMP_DIR = tempfile.mkdtemp(prefix="shop-tests-")
+_url = os.environ.get("TEST_DATABASE_URL") or f"sqlite:///{Path(_TMP_DIR) / 'shop.db'}"
+# До импорта app: иначе config подставит DATABASE_URL из .env (рабочую базу)
+os.environ["DATABASE_URL"] = _url
+
+import pytest  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+from app import cache  # noqa: E402
+from app.database import IS_POSTGRES, SessionLocal, engine  # noqa: E402
+from app.schema import upgrade_schema  # noqa: E402
+from app.seed import seed_catalog  # noqa: E402
+
+# Поколение каталога — во временном каталоге, не в instance/
+cache.GENERATION_FILE = Path(_TMP_DIR) / "catalog.generation"
+cache.GENERATION_LOCK = Path(_TMP_DIR) / "catalog.generation.lock"
+
+
+def _reset_database() -> None:
+    if not IS_POSTGRES:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+
+
+@pytest.fixture(scope="session")
+def database() -> str:
+    """Пустая база, доведённая миграциями до последней ревизии и заполненная сидом."""
+    _reset_database()
+    upgrade_schema()
+    db = SessionLocal()
+    try:
+        seed_catalog(db)
+    finally:
+        db.close()
+    return engine.dialect.name
+
+
+@pytest.fixture
+def db(database):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
@@ -0,0 +1,24 @@
+"""Список товаров админки: фильтры из GET-формы."""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.auth import require_admin
+from app.main import app
+
+
+@pytest.fixture
+def client(database):
+    app.dependency_overrides[require_admin] = lambda: "admin"
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.pop(require_admin, None)
+
+
+@pytest.mark.parametrize("path", ["/admin/products", "/admin/products/partial"])
+def test_empty_filters_are_ignored(client, path):
+    # «Все категории» и пустой поиск форма отправляет пустыми строками
+    response = client.get(path, params={"category_id": "", "subcategory_id": "", "search": ""})
+
+    assert response.status_code == 200
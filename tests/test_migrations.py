@@ -0,0 +1,22 @@
+"""Миграции на обоих бэкендах: до head и обратно через триггеры 0006."""
+
+from alembic import command
+
+from app.schema import alembic_config, current_revision, head_revision
+from app.stats import _SELECT_STATS, count_catalog_stats, load_catalog_stats
+
+
+def test_upgrade_reaches_head(database):
+    assert current_revision() == head_revision()
+
+
+def test_catalog_stats_survive_downgrade_and_upgrade(db):
+    config = alembic_config()
+    config.attributes["configure_logger"] = False
+    command.downgrade(config, "0005")
+    command.upgrade(config, "head")
+
+    assert current_revision() == head_revision()
+    assert load_catalog_stats(db).active > 0
+    stored = {(scope, ref_id): total for scope, ref_id, total in db.execute(_SELECT_STATS).all() if total}
+    assert stored == count_catalog_stats(db)
@@ -0,0 +1,31 @@
+"""Соединения публичной части не могут писать: query_only / read-only транзакции."""
+
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app.database import AsyncSessionLocal, async_engine, reader_session
+
+_WRITE = text("UPDATE products SET name = name WHERE id = -1")
+
+
+def test_sync_reader_rejects_writes(database):
+    with reader_session() as db:
+        assert db.execute(text("SELECT count(*) FROM products")).scalar_one() > 0
+        with pytest.raises(DBAPIError):
+            db.execute(_WRITE)
+
+
+def test_async_reader_rejects_writes(database):
+    async def write() -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(_WRITE)
+        finally:
+            # Соединения asyncpg привязаны к этому event loop
+            await async_engine.dispose()
+
+    with pytest.raises(DBAPIError):
+        asyncio.run(write())
@@ -0,0 +1,45 @@
+"""Полнотекстовый поиск: FTS5 на SQLite и tsvector на PostgreSQL."""
+
+from sqlalchemy import select, text
+
+from app.models import Product, Subcategory
+from app.search import build_match_query, ensure_search_index, index_product, matching_ids, ranked_products
+
+
+def _add(db, name: str, **fields) -> Product:
+    subcategory = db.scalars(select(Subcategory).order_by(Subcategory.id)).first()
+    product = Product(name=name, slug="test", price=5000, subcategory_id=subcategory.id, **fields)
+    db.add(product)
+    index_product(db, product, subcategory.name)
+    db.commit()
+    return product
+
+
+def _found(db, query: str) -> list[int]:
+    return list(db.scalars(matching_ids(build_match_query(query))))
+
+
+def test_stemmed_prefix_match(db):
+    product = _add(db, "Чёрный сапог Тестовый")
+
+    assert product.id in _found(db, "черные сапоги тестов")
+    assert product.id not in _found(db, "белые сапоги тестов")
+
+
+def test_name_ranks_above_description(db):
+    in_name = _add(db, "Ботфорты Ранжир", description="кожа")
+    in_description = _add(db, "Ботинки", description="почти ботфорты ранжир")
+
+    ranked = [p.id for p in db.scalars(ranked_products(build_match_query("ботфорты ранжир")))]
+    assert ranked.index(in_name.id) < ranked.index(in_description.id)
+
+
+def test_ensure_search_index_catches_edits_outside_admin(db):
+    product = _add(db, "Старое Имя Обход")
+    db.execute(text("UPDATE products SET name = 'Новое Имя Обход' WHERE id = :id"), {"id": product.id})
+    db.commit()
+    assert product.id not in _found(db, "новое имя обход")
+
+    ensure_search_index(db)
+    assert product.id in _found(db, "новое имя обход")
+    assert product.id not in _found(db, "старое имя обход")
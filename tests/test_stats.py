@@ -0,0 +1,90 @@
+"""Триггеры catalog_stats (миграция 0006): SQLite и PostgreSQL.
+
+После каждой записи таблица должна совпадать с пересчётом по products.
+"""
+
+import pytest
+from sqlalchemy import delete, select, text, update
+
+from app.models import Product, ProductSize, Subcategory
+from app.stats import _SELECT_STATS, count_catalog_stats
+
+
+def _stored(db) -> dict:
+    return {(scope, ref_id): total for scope, ref_id, total in db.execute(_SELECT_STATS).all() if total}
+
+
+def _assert_in_sync(db) -> None:
+    db.commit()
+    assert _stored(db) == count_catalog_stats(db)
+
+
+@pytest.fixture
+def subcategories(db) -> list[Subcategory]:
+    return db.scalars(select(Subcategory).order_by(Subcategory.id)).all()
+
+
+def _new_product(db, subcategory: Subcategory, **fields) -> Product:
+    product = Product(
+        name=fields.pop("name", "Тестовые ботинки"),
+        slug="testovye-botinki",
+        price=fields.pop("price", 5000),
+        subcategory_id=subcategory.id,
+        **fields,
+    )
+    product.sizes = [ProductSize(size=37, quantity=1), ProductSize(size=38, quantity=0)]
+    db.add(product)
+    db.flush()
+    return product
+
+
+def test_insert_update_delete_through_orm(db, subcategories):
+    product = _new_product(db, subcategories[0], is_new=True)
+    _assert_in_sync(db)
+
+    product.set_prices(4000, 5000)
+    product.is_featured = True
+    product.subcategory_id = subcategories[-1].id
+    _assert_in_sync(db)
+
+    product.sizes[1].quantity = 2
+    product.sizes.append(ProductSize(size=39, quantity=1))
+    _assert_in_sync(db)
+
+    product.is_active = False
+    _assert_in_sync(db)
+    product.is_active = True
+    _assert_in_sync(db)
+
+    db.delete(product)
+    _assert_in_sync(db)
+
+
+def test_bulk_sql_writes(db, subcategories):
+    product = _new_product(db, subcategories[1])
+    _assert_in_sync(db)
+
+    # Массовые UPDATE в обход ORM, в том числе без изменения счётных колонок
+    db.execute(update(Product).values(is_new=True))
+    _assert_in_sync(db)
+    db.execute(update(Product).values(price=Product.price))
+    _assert_in_sync(db)
+    db.execute(text("UPDATE products SET is_active = NOT is_active WHERE id = :id"), {"id": product.id})
+    _assert_in_sync(db)
+    db.execute(update(ProductSize).where(ProductSize.product_id == product.id).values(quantity=0))
+    _assert_in_sync(db)
+
+    # Удаление как в SQL-клиенте: сначала размеры, потом товар
+    db.execute(delete(ProductSize).where(ProductSize.product_id == product.id))
+    db.execute(delete(Product).where(Product.id == product.id))
+    _assert_in_sync(db)
+
+
+def test_subcategory_moved_to_another_category(db, subcategories):
+    moved = next(s for s in subcategories if s.category_id != subcategories[-1].category_id)
+    previous = moved.category_id
+    moved.category_id = subcategories[-1].category_id
+    _assert_in_sync(db)
+
+    moved.category_id = previous
+    _assert_in_sync(db)